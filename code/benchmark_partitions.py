@@ -0,0 +1,174 @@
+import argparse
+import json
+import os
+import time
+from collections import Counter
+from datetime import datetime
+
+from benchmark_queries import QUERY_DIR, _normalize, load_queries, time_query
+from db import INSTALL_SQL, Database, add_connection_arguments, connect_from_args, install_phases
+from generate_data import build_dataset, scaled_counts
+from partitioning import PARTITIONED_COLUMNS, PARTITIONED_SQL, generator_years, partitioned_values, row_years
+from skew import parse_skew
+from writers import row_values
+
+# Measures what partitioning by festival year (sql/install_partitioned.sql)
+# gains on the queries that filter or group by year or date. For every scale
+# the same dataset is loaded into install.sql and into the partitioned
+# install, and every query is timed three ways:
+#
+#   original     install.sql, sql/query/Qxx.sql
+#   partitioned  the partitioned install, the same query
+#   rewritten    the partitioned install, sql/query/partitioned/Qxx.sql (the
+#                query with the year also given on the partitioning columns)
+#
+# On MariaDB the plans record the partitions each table reads (EXPLAIN
+# PARTITIONS); both installs are created in turn, which drops the
+# music_festival schema. SQLite has no partitions: it stores each partitioned
+# table clustered on its partitioning column instead (see
+# db.sqlite_partitioned_table), which is what pruning buys, a year's rows
+# read without touching the others.
+
+QUERIES = ['Q01', 'Q02', 'Q08', 'Q09', 'Q12', 'Q14']
+PARTITIONED_QUERY_DIR = os.path.join(QUERY_DIR, 'partitioned')
+
+
+def _rows(rows):
+    return Counter(tuple(map(_normalize, row)) for row in rows)
+
+
+def install(database, install_sql):
+    """(Re)create the tables and indexes of 'install_sql', without the
+    triggers, procedures and events"""
+    if database.engine == 'sqlite':
+        database.close()
+        return Database.sqlite(install_sql=install_sql)
+    phases = install_phases(install_sql)
+    cursor = database.connection.cursor()
+    for statement in phases['pre_data'] + phases['post_data']:
+        cursor.execute(statement)
+    cursor.close()
+    database.connection.commit()
+    return database
+
+
+def load(database, generator, partitioned):
+    """Insert the generator's rows, with the partitioning columns the
+    partitioned install needs"""
+    start = time.perf_counter()
+    if database.engine == 'mariadb':
+        database.execute('SET foreign_key_checks = 0')
+    event_years, performance_years = generator_years(generator)
+    for table, rows in generator.tables():
+        if partitioned and table in PARTITIONED_COLUMNS:
+            years = row_years(table, rows, event_years, performance_years)
+            database.insert_rows(table, partitioned_values(table, rows, years), columns=PARTITIONED_COLUMNS[table])
+        else:
+            database.insert_rows(table, row_values(table, rows))
+        database.connection.commit()
+    if database.engine == 'mariadb':
+        database.execute('SET foreign_key_checks = 1')
+    return round(time.perf_counter() - start, 3)
+
+
+def read_partitions(database, sql):
+    """{table alias: partitions read} from EXPLAIN PARTITIONS (MariaDB)"""
+    if database.engine != 'mariadb':
+        return None
+    cursor = database.connection.cursor()
+    try:
+        cursor.execute('EXPLAIN PARTITIONS ' + sql)
+        names = [column[0] for column in cursor.description]
+        rows = [dict(zip(names, row)) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+    return {row['table']: row['partitions'] for row in rows if row.get('partitions')}
+
+
+def run_queries(database, queries, runs):
+    results = {}
+    for name, sql in queries.items():
+        result = time_query(database, sql, runs)
+        if 'error' not in result:
+            result['result'] = _rows(database.execute(sql))
+            result['partitions'] = read_partitions(database, sql)
+        results[name] = result
+    return results
+
+
+def benchmark(args):
+    original_sql = {name: sql for name, sql in load_queries(args.queries).items() if name in QUERIES}
+    rewritten_sql = load_queries(args.partitioned_queries)
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'engine': args.engine,
+        'seed': args.seed,
+        'skew': args.skew,
+        'runs': args.runs,
+        'rewritten': sorted(rewritten_sql),
+        'scales': [],
+    }
+    database = connect_from_args(args)
+    report['version'] = database.version
+    for scale in args.scales:
+        print(f'Scale {scale:g}: generating')
+        generator = build_dataset(scaled_counts(scale), seed=args.seed, workers=args.workers, skew=args.skew)
+        entry = {'scale': scale, 'queries': {name: {} for name in original_sql}}
+
+        database = install(database, INSTALL_SQL)
+        entry['load_seconds'] = {'original': load(database, generator, partitioned=False)}
+        for name, result in run_queries(database, original_sql, args.runs).items():
+            entry['queries'][name]['original'] = result
+
+        database = install(database, PARTITIONED_SQL)
+        entry['load_seconds']['partitioned'] = load(database, generator, partitioned=True)
+        for name, result in run_queries(database, original_sql, args.runs).items():
+            entry['queries'][name]['partitioned'] = result
+        for name, result in run_queries(database, {n: rewritten_sql[n] for n in original_sql
+                                                   if n in rewritten_sql}, args.runs).items():
+            entry['queries'][name]['rewritten'] = result
+        print(f"  load: install.sql {entry['load_seconds']['original']:.2f}s, "
+              f"partitioned {entry['load_seconds']['partitioned']:.2f}s")
+
+        for name, variants in entry['queries'].items():
+            results = {variant: result.pop('result', None) for variant, result in variants.items()}
+            failed = [f'{variant}: {result["error"]}' for variant, result in variants.items() if 'error' in result]
+            if failed:
+                print(f"  {name}: error ({'; '.join(failed)})")
+                continue
+            # the same rows as on install.sql, and the speedup over it
+            original = variants['original']
+            line = f"  {name}: {original['rows']:>7} rows  original p50 {original['p50_ms']:8.2f} ms"
+            for variant in ('partitioned', 'rewritten'):
+                if variant in variants:
+                    result = variants[variant]
+                    result['same_rows'] = results[variant] == results['original']
+                    result['speedup'] = round(original['p50_ms'] / max(result['p50_ms'], 1e-3), 2)
+                    line += f"  {variant} {result['p50_ms']:8.2f} ms ({result['speedup']:g}x)"
+                    if not result['same_rows']:
+                        line += ' DIFFERENT ROWS'
+            print(line)
+        report['scales'].append(entry)
+    database.close()
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the year-partitioned install on the date-filtered queries')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10],
+                        help='dataset scale factors to benchmark (default: 1 10)')
+    parser.add_argument('--runs', type=int, default=10, help='timed runs per query (default 10)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--skew', type=parse_skew, help='skewed popularity, as in generate_data.py --skew')
+    parser.add_argument('--queries', default=QUERY_DIR, help='directory with the Q*.sql files')
+    parser.add_argument('--partitioned-queries', default=PARTITIONED_QUERY_DIR,
+                        help='directory with the queries rewritten for the partitioned install')
+    parser.add_argument('--output', default='partition_report.json')
+    add_connection_arguments(parser)
+    args = parser.parse_args()
+
+    report = benchmark(args)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Report written to {args.output}')
@@ -0,0 +1,218 @@
+import argparse
+import csv
+import glob
+import json
+import os
+import time
+from collections import Counter
+from datetime import datetime
+
+from db import SQL_DIR, add_connection_arguments, connect_from_args
+from generate_data import build_dataset, scaled_counts
+from skew import parse_skew
+
+# Runs the queries of sql/query against generated datasets of several sizes
+# and writes the timings, row counts and query plans to a JSON report, so
+# two runs (before and after a schema or query change) can be compared with
+# --baseline.
+#
+# The expected results in sql/query/query_out were produced from the shipped
+# sql/load.sql, so that dataset is also loaded once and every query's result
+# is checked against its Q*_out.txt.
+
+QUERY_DIR = os.path.join(SQL_DIR, 'query')
+LOAD_SQL = os.path.join(SQL_DIR, 'load.sql')
+
+
+def load_queries(directory=QUERY_DIR):
+    """{'Q01': sql, ...} for every Q*.sql file of the directory"""
+    queries = {}
+    for path in sorted(glob.glob(os.path.join(directory, 'Q*.sql'))):
+        with open(path, encoding='utf-8') as f:
+            queries[os.path.basename(path)[:-4]] = f.read()
+    return queries
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+def time_query(database, sql, runs):
+    """Run a query 'runs' times (after one warm-up run) and time each run"""
+    try:
+        rows = database.execute(sql)
+        plan = database.explain(sql)
+    except Exception as e:
+        return {'error': str(e)}
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        database.execute(sql)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        'rows': len(rows),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'min_ms': round(min(timings), 3),
+        'plan': plan,
+    }
+
+
+def _normalize(value):
+    # query_out holds the values as the client printed them: compare numbers
+    # by their value at 2 decimals and everything else as text
+    text = str(value)
+    try:
+        return f'{float(text):.2f}'
+    except ValueError:
+        return text
+
+
+def read_expected(path):
+    """(columns, rows) of a query_out/Q*_out.txt file"""
+    with open(path, encoding='utf-8', newline='') as f:
+        lines = [line for line in f.read().splitlines() if line.strip()]
+    columns = [name.strip() for name in lines[0].lstrip('#').split(',')]
+    rows = [tuple(row) for row in csv.reader(lines[1:], quotechar="'", skipinitialspace=True)]
+    return columns, rows
+
+
+def check_results(database, queries, expected_dir):
+    """Compare every query with its expected output, ignoring row order"""
+    results = {}
+    for name, sql in queries.items():
+        path = os.path.join(expected_dir, f'{name}_out.txt')
+        if not os.path.exists(path):
+            continue
+        _, expected = read_expected(path)
+        try:
+            rows = database.execute(sql)
+        except Exception as e:
+            results[name] = {'match': False, 'error': str(e)}
+            continue
+        got = Counter(tuple(map(_normalize, row)) for row in rows)
+        want = Counter(tuple(map(_normalize, row)) for row in expected)
+        results[name] = {
+            'match': got == want,
+            'rows': len(rows),
+            'expected_rows': len(expected),
+            'missing': [list(row) for row in (want - got)][:5],
+            'unexpected': [list(row) for row in (got - want)][:5],
+        }
+    return results
+
+
+def benchmark(args, queries):
+    if args.summaries:
+        # summary_tables imports this module
+        from summary_tables import add_summaries
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'engine': args.engine,
+        'seed': args.seed,
+        'skew': args.skew,
+        'runs': args.runs,
+        'scales': [],
+    }
+    database = connect_from_args(args)
+    report['version'] = database.version
+
+    if args.check:
+        print(f'Checking results on {LOAD_SQL} against {args.expected}')
+        database.clear()
+        database.run_script(LOAD_SQL)
+        if args.summaries:
+            add_summaries(database)
+        report['check'] = check_results(database, queries, args.expected)
+        for name, result in report['check'].items():
+            status = 'ok' if result['match'] else f"DIFFERS {result.get('error', '')}"
+            print(f'  {name}: {status}')
+
+    for scale in args.scales:
+        counts = scaled_counts(scale)
+        print(f'Scale {scale:g}: generating and loading')
+        generator = build_dataset(counts, seed=args.seed, workers=args.workers, skew=args.skew)
+        database.clear()
+        start = time.perf_counter()
+        database.load_tables(generator.tables())
+        if args.summaries:
+            add_summaries(database)
+        entry = {
+            'scale': scale,
+            'counts': counts,
+            'load_seconds': round(time.perf_counter() - start, 3),
+            'queries': {},
+        }
+        for name, sql in queries.items():
+            result = time_query(database, sql, args.runs)
+            entry['queries'][name] = result
+            if 'error' in result:
+                print(f"  {name}: error: {result['error']}")
+            else:
+                print(f"  {name}: {result['rows']:>7} rows  p50 {result['p50_ms']:9.2f} ms"
+                      f"  p95 {result['p95_ms']:9.2f} ms")
+        report['scales'].append(entry)
+    database.close()
+    return report
+
+
+def compare(report, baseline, threshold, min_ms=0.5):
+    """Print the p50 change of every query against an earlier report.
+
+    Slowdowns of less than min_ms are timer noise, not regressions.
+    """
+    old = {(s['scale'], name): q for s in baseline['scales'] for name, q in s['queries'].items()}
+    regressions = 0
+    for entry in report['scales']:
+        for name, result in entry['queries'].items():
+            before = old.get((entry['scale'], name))
+            if not before or 'p50_ms' not in before or 'p50_ms' not in result:
+                continue
+            ratio = result['p50_ms'] / before['p50_ms'] if before['p50_ms'] else float('inf')
+            flag = ''
+            if ratio > threshold and result['p50_ms'] - before['p50_ms'] >= min_ms:
+                flag = '  REGRESSION'
+                regressions += 1
+            print(f"scale {entry['scale']:g} {name}: {before['p50_ms']:.2f} -> "
+                  f"{result['p50_ms']:.2f} ms ({ratio:.2f}x){flag}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the queries of sql/query on generated datasets')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10],
+                        help='dataset scale factors to benchmark (default: 1 10)')
+    parser.add_argument('--runs', type=int, default=10, help='timed runs per query (default 10)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--skew', type=parse_skew,
+                        help='generate with skewed popularity, e.g. 1.1 or events=1.2,visitors=0.8 (see generate_data.py)')
+    parser.add_argument('--queries', default=QUERY_DIR, help='directory with the Q*.sql files')
+    parser.add_argument('--expected', default=os.path.join(QUERY_DIR, 'query_out'),
+                        help='directory with the expected Q*_out.txt results')
+    parser.add_argument('--no-check', dest='check', action='store_false',
+                        help='skip checking the results on sql/load.sql')
+    parser.add_argument('--summaries', action='store_true',
+                        help='create and fill the tables of sql/summary.sql, for the queries of sql/query/summary')
+    parser.add_argument('--output', default='benchmark_report.json')
+    parser.add_argument('--baseline', help='earlier report to compare the p50 latencies with')
+    parser.add_argument('--threshold', type=float, default=1.5,
+                        help='p50 slowdown reported as a regression (default 1.5x)')
+    parser.add_argument('--min-ms', type=float, default=0.5,
+                        help='ignore slowdowns smaller than this many ms (default 0.5)')
+    add_connection_arguments(parser)
+    args = parser.parse_args()
+
+    report = benchmark(args, load_queries(args.queries))
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f'Report written to {args.output}')
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold, args.min_ms)
+        print(f'{regressions} regression(s) over {args.threshold}x')
@@ -0,0 +1,145 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+
+from benchmark_queries import LOAD_SQL, QUERY_DIR, _normalize, load_queries, percentile, read_expected, time_query
+from columnar import QUERIES, ColumnarData, ReportingEngine, database_source, export, table_source
+from db import add_connection_arguments, connect_from_args
+from generate_data import build_dataset, scaled_counts
+
+# Compares the reporting queries (columnar.QUERIES) run as SQL on the
+# database with the same questions answered by columnar.ReportingEngine from
+# a columnar export. For every scale it records the export time and size,
+# the time to read the export back, the p50/p95 latency of both versions
+# and whether they return the same rows.
+#
+# The engine is first checked against sql/query/query_out on a snapshot of
+# sql/load.sql, like benchmark_queries.py checks the SQL.
+
+
+def _rows(rows):
+    return Counter(tuple(map(_normalize, row)) for row in rows)
+
+
+def time_engine(engine, name, runs):
+    engine.run(name)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        rows = engine.run(name)
+        timings.append((time.perf_counter() - start) * 1000)
+    return rows, {
+        'rows': len(rows),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'min_ms': round(min(timings), 3),
+    }
+
+
+def _directory_bytes(directory):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(directory) for name in names)
+
+
+def check_engine(database, expected_dir, workdir, fmt):
+    """Snapshot sql/load.sql and compare the engine with every Q*_out.txt"""
+    database.clear()
+    database.run_script(LOAD_SQL)
+    directory = os.path.join(workdir, 'check')
+    export(database_source(database), directory, fmt)
+    engine = ReportingEngine(ColumnarData.read(directory))
+    results = {}
+    for name in QUERIES:
+        _, expected = read_expected(os.path.join(expected_dir, f'{name}_out.txt'))
+        rows = engine.run(name)
+        results[name] = {'match': _rows(rows) == _rows(expected), 'rows': len(rows), 'expected_rows': len(expected)}
+    return results
+
+
+def benchmark(args):
+    sql = load_queries(args.queries)
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'engine': args.engine,
+        'seed': args.seed,
+        'runs': args.runs,
+        'scales': [],
+    }
+    database = connect_from_args(args)
+    workdir = tempfile.mkdtemp(prefix='columnar_')
+    try:
+        if args.check:
+            print(f'Checking the columnar engine on {LOAD_SQL} against {args.expected}')
+            report['check'] = check_engine(database, args.expected, workdir, args.format)
+            for name, result in report['check'].items():
+                print(f"  {name}: {'ok' if result['match'] else 'DIFFERS'}")
+
+        for scale in args.scales:
+            print(f'Scale {scale:g}: generating and loading')
+            generator = build_dataset(scaled_counts(scale), seed=args.seed, workers=args.workers)
+            database.clear()
+            database.load_tables(generator.tables())
+
+            directory = os.path.join(workdir, f'scale_{scale:g}')
+            start = time.perf_counter()
+            manifest = export(table_source(generator.tables()), directory, args.format)
+            export_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            data = ColumnarData.read(directory)
+            engine = ReportingEngine(data)
+            entry = {
+                'scale': scale,
+                'format': data.format,
+                'export_seconds': round(export_seconds, 3),
+                'read_seconds': round(time.perf_counter() - start, 3),
+                'bytes': _directory_bytes(directory),
+                'queries': {},
+            }
+            print(f"  columnar export: {entry['format']}, {entry['bytes'] / 2 ** 20:.1f} MB "
+                  f"in {entry['export_seconds']:.2f}s, read in {entry['read_seconds']:.2f}s ({manifest})")
+            for name in QUERIES:
+                result = {'sql': time_query(database, sql[name], args.runs)}
+                rows, result['columnar'] = time_engine(engine, name, args.runs)
+                if 'error' in result['sql']:
+                    print(f"  {name}: sql error: {result['sql']['error']}")
+                else:
+                    result['same_rows'] = _rows(database.execute(sql[name])) == _rows(rows)
+                    result['speedup'] = round(result['sql']['p50_ms'] / max(result['columnar']['p50_ms'], 1e-3), 1)
+                    print(f"  {name}: {result['columnar']['rows']:>7} rows  sql p50 {result['sql']['p50_ms']:9.2f} ms"
+                          f"  columnar p50 {result['columnar']['p50_ms']:8.2f} ms  ({result['speedup']:g}x)"
+                          + ('' if result['same_rows'] else '  DIFFERENT ROWS'))
+                entry['queries'][name] = result
+            report['scales'].append(entry)
+    finally:
+        database.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the reporting queries in SQL with the columnar engine')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10],
+                        help='dataset scale factors to benchmark (default: 1 10)')
+    parser.add_argument('--runs', type=int, default=10, help='timed runs per query (default 10)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--format', choices=['parquet', 'npy'],
+                        help='columnar file format (default parquet if pyarrow is installed, else npy)')
+    parser.add_argument('--queries', default=QUERY_DIR, help='directory with the Q*.sql files')
+    parser.add_argument('--expected', default=os.path.join(QUERY_DIR, 'query_out'),
+                        help='directory with the expected Q*_out.txt results')
+    parser.add_argument('--no-check', dest='check', action='store_false',
+                        help='skip checking the engine on sql/load.sql')
+    parser.add_argument('--output', default='reporting_report.json')
+    add_connection_arguments(parser)
+    args = parser.parse_args()
+
+    report = benchmark(args)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Report written to {args.output}')
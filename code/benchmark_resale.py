@@ -0,0 +1,200 @@
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from db import connect
+from generate_data import build_dataset, scaled_counts
+from resale_engine import ResaleEngine, SqlResaleStore
+
+# Replays the same stream of resale listings and interest against
+#  - the install.sql approach: the application marks tickets is_resale and
+#    inserts resale_interest rows, and the two procedures run every
+#    --interval seconds (emulated in SQLite below), and
+#  - ResaleEngine, matching on arrival and writing in batches,
+# and reports the wall time of each and how long matched buyers waited.
+
+# check_resale_ticket() and match_all_interested_to_resale_tickets() of
+# install.sql in SQLite syntax, with NOW() as a parameter
+CHECK_RESALE_TICKET = [
+    """INSERT INTO resale_queue (ticket_id, listed_by, event_id, ticket_category, listed_on)
+       SELECT t.ticket_id, t.visitor_id, t.event_id, t.ticket_category, :now
+       FROM ticket t
+       WHERE t.activated = FALSE AND t.is_resale = TRUE""",
+    """UPDATE ticket
+       SET visitor_id = NULL, purchase_date = NULL, is_resale = FALSE
+       WHERE activated = FALSE AND is_resale = TRUE""",
+]
+
+MATCH_ALL_INTERESTED = [
+    """CREATE TEMP TABLE temp_all_matches (
+           ticket_id INT, interest_id INT, event_id INT,
+           PRIMARY KEY (ticket_id, interest_id))""",
+    """INSERT INTO temp_all_matches (ticket_id, interest_id, event_id)
+       SELECT rq.ticket_id, ri.interest_id, rq.event_id
+       FROM (
+           SELECT rq.ticket_id, rq.event_id, rq.listed_on, t.ticket_category,
+                  ROW_NUMBER() OVER (PARTITION BY rq.event_id, t.ticket_category
+                                     ORDER BY rq.listed_on DESC) AS ticket_rank
+           FROM resale_queue rq
+           JOIN ticket t ON rq.ticket_id = t.ticket_id
+           WHERE t.activated = FALSE
+       ) rq
+       JOIN (
+           SELECT ri.interest_id, ri.event_id, ri.expressed_on, ri.ticket_category,
+                  ROW_NUMBER() OVER (PARTITION BY ri.event_id, ri.ticket_category
+                                     ORDER BY ri.expressed_on ASC) AS interest_rank
+           FROM resale_interest ri
+       ) ri ON rq.event_id = ri.event_id AND rq.ticket_category = ri.ticket_category
+       WHERE rq.ticket_rank = ri.interest_rank""",
+    """UPDATE ticket
+       SET visitor_id = ri.interested_visitor_id, purchase_date = :today, is_resale = FALSE
+       FROM temp_all_matches tm
+       JOIN resale_interest ri ON tm.interest_id = ri.interest_id
+       WHERE ticket.ticket_id = tm.ticket_id""",
+    """DELETE FROM resale_queue WHERE ticket_id IN (SELECT ticket_id FROM temp_all_matches)""",
+]
+
+MATCH_CLEANUP = [
+    """DELETE FROM resale_interest WHERE interest_id IN (SELECT interest_id FROM temp_all_matches)""",
+    """DROP TABLE temp_all_matches""",
+]
+
+
+def _timestamp(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def make_stream(generator, operations, rate, start, seed):
+    """Resale operations in time order: ('list', ticket_id, seller, event_id,
+    category, at) and ('interest', interest_id, visitor, event_id, category, at).
+
+    Listed tickets are not activated (and run out when they are all listed);
+    interested visitors hold no ticket and
+    no other interest for the event, so that a match never breaks
+    UNIQUE(visitor_id, event_id).
+    """
+    rng = random.Random(seed)
+    tickets = [t for t in generator.tickets.rows(['ticket_id', 'visitor_id', 'event_id',
+                                                  'ticket_category', 'activated'])
+               if not t[4]]
+    rng.shuffle(tickets)
+    # demand follows the sales: interest in a sold ticket's event and category
+    demand = list(generator.tickets.rows(['event_id', 'ticket_category']))
+    visitor_ids = list(generator.visitors.values('visitor_id'))
+    taken = {(visitor_id, event_id) for visitor_id, event_id in
+             generator.tickets.rows(['visitor_id', 'event_id'])}
+    taken.update(generator.resale_interest.rows(['interested_visitor_id', 'event_id']))
+
+    stream = []
+    interest_id = len(generator.resale_interest) + 1
+    at = start
+    for _ in range(operations):
+        at += timedelta(seconds=rng.expovariate(rate))
+        if rng.random() < 0.5 and tickets:
+            ticket_id, seller, event_id, category, _ = tickets.pop()
+            stream.append(('list', ticket_id, seller, event_id, category, _timestamp(at)))
+        else:
+            event_id, category = rng.choice(demand)
+            for _ in range(20):
+                visitor_id = rng.choice(visitor_ids)
+                if (visitor_id, event_id) not in taken:
+                    taken.add((visitor_id, event_id))
+                    stream.append(('interest', interest_id, visitor_id, event_id, category,
+                                   _timestamp(at)))
+                    interest_id += 1
+                    break
+    return stream
+
+
+def _fresh_database(generator):
+    database = connect('sqlite')
+    database.load_tables(generator.tables())
+    return database
+
+
+def run_procedures(generator, stream, interval):
+    """The application writes, the procedures run every 'interval' seconds"""
+    database = _fresh_database(generator)
+    connection = database.connection
+    arrived = {}          # ticket id / interest id -> arrival
+    waits = []
+    matches = 0
+
+    def tick(now):
+        nonlocal matches
+        params = {'now': _timestamp(now), 'today': _timestamp(now)[:10]}
+        for statement in CHECK_RESALE_TICKET + MATCH_ALL_INTERESTED:
+            connection.execute(statement, params if ':' in statement else ())
+        for ticket_id, interest_id in connection.execute(
+                'SELECT ticket_id, interest_id FROM temp_all_matches').fetchall():
+            matches += 1
+            later = max(arrived.get(('list', ticket_id), now), arrived.get(('interest', interest_id), now))
+            waits.append((now - later).total_seconds())
+        for statement in MATCH_CLEANUP:
+            connection.execute(statement)
+        connection.commit()
+
+    start = time.perf_counter()
+    next_tick = datetime.fromisoformat(stream[0][5]) + timedelta(seconds=interval)
+    for kind, row_id, person, event_id, category, at in stream:
+        at = datetime.fromisoformat(at)
+        while at >= next_tick:
+            tick(next_tick)
+            next_tick += timedelta(seconds=interval)
+        arrived[(kind, row_id)] = at
+        if kind == 'list':
+            connection.execute('UPDATE ticket SET is_resale = TRUE WHERE ticket_id = ?', (row_id,))
+        else:
+            connection.execute('INSERT INTO resale_interest (interest_id, interested_visitor_id, event_id, '
+                               'ticket_category, expressed_on) VALUES (?, ?, ?, ?, ?)',
+                               (row_id, person, event_id, category, _timestamp(at)))
+        connection.commit()
+    tick(next_tick)
+    elapsed = time.perf_counter() - start
+    database.close()
+    return elapsed, matches, waits
+
+
+def run_engine(generator, stream, batch_size):
+    """ResaleEngine matching on arrival"""
+    database = _fresh_database(generator)
+    engine = ResaleEngine(SqlResaleStore(database), batch_size=batch_size)
+    start = time.perf_counter()
+    engine.restore()
+    waits = []
+    for kind, row_id, person, event_id, category, at in stream:
+        if kind == 'list':
+            match = engine.list_ticket(row_id, person, event_id, category, at)
+        else:
+            match = engine.express_interest(row_id, person, event_id, category, at)
+        if match is not None:
+            # matched the moment the second of the pair arrived
+            waits.append(0.0)
+    engine.flush()
+    elapsed = time.perf_counter() - start
+    database.close()
+    return elapsed, engine.match_count, waits
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Resale matching: 30 second procedures vs ResaleEngine')
+    parser.add_argument('--scale', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--operations', type=int, default=20000, help='listings + interests to replay')
+    parser.add_argument('--rate', type=float, default=5, help='operations per second of simulated time')
+    parser.add_argument('--interval', type=float, default=30, help='seconds between procedure runs')
+    parser.add_argument('--batch-size', type=int, default=500, help='engine changes per database write')
+    args = parser.parse_args()
+
+    generator = build_dataset(scaled_counts(args.scale), seed=args.seed)
+    stream = make_stream(generator, args.operations, args.rate, generator.now, args.seed)
+    print(f'{len(stream)} resale operations over '
+          f'{(datetime.fromisoformat(stream[-1][5]) - generator.now).total_seconds():.0f}s of simulated time')
+
+    for name, (elapsed, matches, waits) in [
+            (f'procedures every {args.interval:g}s', run_procedures(generator, stream, args.interval)),
+            (f'engine (batches of {args.batch_size})', run_engine(generator, stream, args.batch_size))]:
+        mean_wait = sum(waits) / len(waits) if waits else 0.0
+        print(f'{name:<28} {elapsed:8.3f}s  {len(stream) / elapsed:10,.0f} ops/sec  '
+              f'{matches:6} matches  buyers wait {mean_wait:5.1f}s on average after the pair is complete')
@@ -0,0 +1,428 @@
+import argparse
+import json
+import os
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from db import INSTALL_SQL, Database, add_connection_arguments, connect_from_args, install_phases
+from generate_data import build_dataset, scaled_counts
+from partitioning import generator_years
+from skew import parse_skew
+from writers import row_values
+
+# Measures what the performance rule triggers cost an insert, before and
+# after they were moved onto the helper tables of install.sql
+# (artist_participation, group_participation, stage_schedule,
+# artist_schedule). For every scale the festival history is loaded without
+# triggers, except for the performances of the newest year and their
+# members; then the triggers are created and the held-out rows are inserted
+# one statement at a time, the way a festival's line-up is entered. Three
+# variants are timed:
+#
+#   none        no rule triggers, the cost of the inserts themselves
+#   correlated  the triggers as they were: joins over performance_members,
+#               performance and event, TIME_TO_SEC comparisons
+#   helper      the triggers of install.sql: index lookups on the helper
+#               tables, which their own triggers keep up to date
+#
+# Both rule variants must reject the same rows. The only intended difference
+# is an overlap across midnight, which the TIME_TO_SEC comparison missed.
+#
+# On SQLite the triggers are the translations below (RAISE(ABORT) for
+# SIGNAL, subqueries for the variables). On MariaDB the helper variant is
+# install.sql and the correlated one the install file given with
+# --baseline, e.g. git show <commit>:sql/install.sql > install_before.sql
+
+VARIANTS = ['none', 'correlated', 'helper']
+
+_BREAK = 'Break between performances must be between 5 and 30 minutes'
+
+# Unchanged by the helper tables: the neighbours come from idx_performance_event
+BREAK_TRIGGERS = [
+    f"""CREATE TRIGGER trg_performance_break_insert
+       BEFORE INSERT ON performance
+       FOR EACH ROW
+       BEGIN
+         SELECT RAISE(ABORT, '{_BREAK}')
+         WHERE (SELECT TIMESTAMPDIFF('MINUTE', ADDTIME(start_time, duration), NEW.start_time)
+                FROM performance
+                WHERE event_id = NEW.event_id AND stage_id = NEW.stage_id
+                  AND start_time < NEW.start_time
+                ORDER BY start_time DESC LIMIT 1) NOT BETWEEN 5 AND 30;
+         SELECT RAISE(ABORT, '{_BREAK}')
+         WHERE (SELECT TIMESTAMPDIFF('MINUTE', ADDTIME(NEW.start_time, NEW.duration), start_time)
+                FROM performance
+                WHERE event_id = NEW.event_id AND stage_id = NEW.stage_id
+                  AND start_time > NEW.start_time
+                ORDER BY start_time ASC LIMIT 1) NOT BETWEEN 5 AND 30;
+       END""",
+]
+
+# The year of the new performance_members row
+_YEAR = """(SELECT YEAR(e.event_date) FROM performance p JOIN event e ON p.event_id = e.event_id
+            WHERE p.performance_id = NEW.performance_id)"""
+
+CORRELATED_TRIGGERS = [
+    """CREATE TRIGGER chk_performance_no_overlap_insert
+       BEFORE INSERT ON performance
+       FOR EACH ROW
+       BEGIN
+         SELECT RAISE(ABORT, 'Overlapping performance on the same stage and date')
+         WHERE (SELECT COUNT(*)
+                FROM performance p
+                JOIN event ev ON p.event_id = ev.event_id
+                JOIN event e ON e.event_id = NEW.event_id
+                WHERE ev.stage_id = e.stage_id AND ev.event_date = e.event_date
+                  AND TIME_TO_SEC(NEW.start_time) < TIME_TO_SEC(p.start_time) + TIME_TO_SEC(p.duration)
+                  AND TIME_TO_SEC(p.start_time) < TIME_TO_SEC(NEW.start_time) + TIME_TO_SEC(NEW.duration)) > 0;
+       END""",
+    f"""CREATE TRIGGER chk_no_4yrs_in_row_insert
+       BEFORE INSERT ON performance_members
+       FOR EACH ROW
+       BEGIN
+         SELECT RAISE(ABORT, 'An artist has already participated for 3 years in a row')
+         WHERE NEW.artist_id IS NOT NULL
+           AND (SELECT COUNT(DISTINCT YEAR(e2.event_date))
+                FROM performance_members pm2
+                JOIN performance p2 ON pm2.performance_id = p2.performance_id
+                JOIN event e2 ON p2.event_id = e2.event_id
+                WHERE pm2.artist_id = NEW.artist_id
+                  AND {_YEAR} - YEAR(e2.event_date) BETWEEN 1 AND 3) = 3;
+         SELECT RAISE(ABORT, 'A group has already participated for 3 years in a row')
+         WHERE NEW.artist_id IS NULL AND NEW.group_id IS NOT NULL
+           AND (SELECT COUNT(DISTINCT YEAR(e2.event_date))
+                FROM performance_members pm2
+                JOIN performance p2 ON pm2.performance_id = p2.performance_id
+                JOIN event e2 ON p2.event_id = e2.event_id
+                WHERE pm2.group_id = NEW.group_id
+                  AND {_YEAR} - YEAR(e2.event_date) BETWEEN 1 AND 3) = 3;
+       END""",
+    """CREATE TRIGGER chk_no_artist_overlap_insert
+       BEFORE INSERT ON performance_members
+       FOR EACH ROW
+       BEGIN
+         SELECT RAISE(ABORT, 'An artist has two overlapping performances')
+         WHERE (SELECT COUNT(*)
+                FROM performance p
+                JOIN performance_members pm2 ON pm2.artist_id = NEW.artist_id
+                JOIN performance p2 ON pm2.performance_id = p2.performance_id
+                WHERE p.performance_id = NEW.performance_id
+                  AND pm2.performance_id <> NEW.performance_id
+                  AND p2.start_time < ADDTIME(p.start_time, p.duration)
+                  AND ADDTIME(p2.start_time, p2.duration) > p.start_time) > 0;
+       END""",
+] + BREAK_TRIGGERS
+
+HELPER_TRIGGERS = [
+    """CREATE TRIGGER chk_performance_no_overlap_insert
+       BEFORE INSERT ON performance
+       FOR EACH ROW
+       BEGIN
+         SELECT RAISE(ABORT, 'Overlapping performance on the same stage and date')
+         WHERE (SELECT COUNT(*)
+                FROM stage_schedule s
+                JOIN event e ON e.event_id = NEW.event_id
+                WHERE s.stage_id = e.stage_id AND s.event_date = e.event_date
+                  AND s.start_time > datetime(NEW.start_time, '-3 hours')
+                  AND s.start_time < ADDTIME(NEW.start_time, NEW.duration)
+                  AND s.end_time > NEW.start_time) > 0;
+       END""",
+    """CREATE TRIGGER chk_no_4yrs_in_row_insert
+       BEFORE INSERT ON performance_members
+       FOR EACH ROW
+       BEGIN
+         SELECT RAISE(ABORT, 'An artist has already participated for 3 years in a row')
+         WHERE NEW.artist_id IS NOT NULL
+           AND (SELECT COUNT(*)
+                FROM performance p
+                JOIN event e ON p.event_id = e.event_id
+                JOIN artist_participation ap ON ap.artist_id = NEW.artist_id
+                WHERE p.performance_id = NEW.performance_id
+                  AND ap.year BETWEEN YEAR(e.event_date) - 3 AND YEAR(e.event_date) - 1) = 3;
+         SELECT RAISE(ABORT, 'A group has already participated for 3 years in a row')
+         WHERE NEW.artist_id IS NULL AND NEW.group_id IS NOT NULL
+           AND (SELECT COUNT(*)
+                FROM performance p
+                JOIN event e ON p.event_id = e.event_id
+                JOIN group_participation gp ON gp.group_id = NEW.group_id
+                WHERE p.performance_id = NEW.performance_id
+                  AND gp.year BETWEEN YEAR(e.event_date) - 3 AND YEAR(e.event_date) - 1) = 3;
+       END""",
+    """CREATE TRIGGER chk_no_artist_overlap_insert
+       BEFORE INSERT ON performance_members
+       FOR EACH ROW
+       BEGIN
+         SELECT RAISE(ABORT, 'An artist has two overlapping performances')
+         WHERE (SELECT COUNT(*)
+                FROM performance p
+                JOIN artist_schedule a ON a.artist_id = NEW.artist_id
+                WHERE p.performance_id = NEW.performance_id
+                  AND a.start_time > datetime(p.start_time, '-3 hours')
+                  AND a.start_time < ADDTIME(p.start_time, p.duration)
+                  AND a.end_time > p.start_time
+                  AND a.performance_id <> NEW.performance_id) > 0;
+       END""",
+] + BREAK_TRIGGERS + [
+    # The AFTER INSERT triggers that keep the helper tables up to date
+    """CREATE TRIGGER trg_performance_helpers_insert
+       AFTER INSERT ON performance
+       FOR EACH ROW
+       BEGIN
+         INSERT INTO stage_schedule (performance_id, event_id, stage_id, event_date, start_time, end_time)
+         SELECT NEW.performance_id, e.event_id, e.stage_id, e.event_date,
+                NEW.start_time, ADDTIME(NEW.start_time, NEW.duration)
+         FROM event e WHERE e.event_id = NEW.event_id;
+       END""",
+    """CREATE TRIGGER trg_performance_members_helpers_insert
+       AFTER INSERT ON performance_members
+       FOR EACH ROW
+       BEGIN
+         INSERT INTO artist_participation (artist_id, year, performances)
+         SELECT NEW.artist_id, YEAR(e.event_date), 1
+         FROM performance p JOIN event e ON p.event_id = e.event_id
+         WHERE p.performance_id = NEW.performance_id
+           AND NEW.artist_id IS NOT NULL AND e.event_date IS NOT NULL
+         ON CONFLICT (artist_id, year) DO UPDATE SET performances = performances + 1;
+         INSERT INTO group_participation (group_id, year, performances)
+         SELECT NEW.group_id, YEAR(e.event_date), 1
+         FROM performance p JOIN event e ON p.event_id = e.event_id
+         WHERE p.performance_id = NEW.performance_id
+           AND NEW.group_id IS NOT NULL AND e.event_date IS NOT NULL
+         ON CONFLICT (group_id, year) DO UPDATE SET performances = performances + 1;
+         INSERT INTO artist_schedule (performance_members_id, artist_id, performance_id, start_time, end_time)
+         SELECT NEW.performance_members_id, NEW.artist_id, NEW.performance_id,
+                p.start_time, ADDTIME(p.start_time, p.duration)
+         FROM performance p
+         WHERE p.performance_id = NEW.performance_id AND NEW.artist_id IS NOT NULL;
+       END""",
+]
+
+
+
+def past_midnight(performance, event_dates):
+    """Whether a Performance value tuple ends on a later day than its event"""
+    if performance is None:
+        return False
+    start = datetime.fromisoformat(performance[2])
+    hours, minutes, seconds = map(int, performance[4].split(':'))
+    end = start + timedelta(hours=hours, minutes=minutes, seconds=seconds)
+    return end.date().isoformat() > str(event_dates[performance[1]])
+
+
+def split_history(generator):
+    """(history, held_out, year): the generator's tables as (table, value
+    tuples) pairs without the newest year's performances and members, those
+    performances and members, and that year"""
+    _, performance_years = generator_years(generator)
+    year = max(performance_years.values())
+    history, held_out = [], []
+    for table, rows in generator.tables():
+        values = list(row_values(table, rows))
+        if table in ('Performance', 'performance_members'):
+            # both start with performance_id
+            held_out.append((table, [row for row in values if performance_years[row[0]] == year]))
+            values = [row for row in values if performance_years[row[0]] != year]
+        history.append((table, values))
+    return history, held_out, year
+
+
+def probe_rows(history, held_out, shifts=(-20, 10)):
+    """Rows that put the rules to work, inserted after the held-out ones.
+
+    For every shift each held-out performance is added again that many
+    minutes earlier or later, to a new event on the same stage and date (on
+    the event itself the break rule would reject it first), and its artists
+    and groups are added to the copy.
+    """
+    events = {row[0]: row for row in dict(history)['Event']}
+    held_out = dict(held_out)
+    next_event = max(events) + 1
+    next_performance = max(row[0] for row in dict(history)['Performance'] + held_out['Performance']) + 1
+    probes = {'Event': [], 'Performance': [], 'performance_members': []}
+    for minutes in shifts:
+        copies, event_copies = {}, {}
+        for row in held_out['Performance']:
+            if row[1] not in event_copies:
+                event_copies[row[1]] = next_event
+                probes['Event'].append((next_event,) + events[row[1]][1:])
+                next_event += 1
+            start = datetime.fromisoformat(row[2]) + timedelta(minutes=minutes)
+            copies[row[0]] = next_performance
+            probes['Performance'].append((next_performance, event_copies[row[1]],
+                                          start.strftime('%Y-%m-%d %H:%M:%S')) + row[3:])
+            next_performance += 1
+        probes['performance_members'].extend((copies[row[0]],) + row[1:]
+                                             for row in held_out['performance_members'])
+    return probes
+
+
+def install(database, variant, baseline):
+    """A database with the tables of install.sql (of 'baseline' for the
+    correlated variant on MariaDB), without triggers"""
+    if database.engine == 'sqlite':
+        database.close()
+        database = Database.sqlite()
+        if variant == 'correlated':
+            # idx_performance_event as it was, on event_id alone
+            database.execute('DROP INDEX idx_performance_event')
+            database.execute('CREATE INDEX idx_performance_event ON performance(event_id)')
+        return database
+    phases = install_phases(baseline if variant == 'correlated' else INSTALL_SQL)
+    for statement in phases['pre_data'] + phases['post_data']:
+        database.execute(statement)
+    database.connection.commit()
+    return database
+
+
+def add_rule_triggers(database, variant, baseline):
+    """Create the variant's triggers and fill its helper tables"""
+    if variant == 'none':
+        return
+    if database.engine == 'sqlite':
+        for statement in HELPER_TRIGGERS if variant == 'helper' else CORRELATED_TRIGGERS:
+            database.execute(statement)
+    else:
+        statements = install_phases(baseline if variant == 'correlated' else INSTALL_SQL)['constraints']
+        # the resale events would run during the inserts
+        statements = [s for s in statements if not s.upper().startswith(('CREATE EVENT', 'SET GLOBAL'))]
+        for statement in statements:
+            database.execute(statement)
+    database.connection.commit()
+    if variant == 'helper':
+        database.fill_rule_helpers()
+
+
+def insert_one_by_one(database, table, rows):
+    """Insert 'rows' one statement and commit each; returns (seconds,
+    {row: rejection message})"""
+    rejected = {}
+    start = time.perf_counter()
+    for row in rows:
+        try:
+            database.insert_rows(table, [row])
+            database.connection.commit()
+        except Exception as e:
+            database.connection.rollback()
+            rejected[row] = str(e)
+    return time.perf_counter() - start, rejected
+
+
+def run_variant(database, variant, history, held_out, baseline):
+    database = install(database, variant, baseline)
+    if database.engine == 'mariadb':
+        database.execute('SET foreign_key_checks = 0')
+    for table, values in history:
+        database.insert_rows(table, values)
+        database.connection.commit()
+    if database.engine == 'mariadb':
+        database.execute('SET foreign_key_checks = 1')
+    add_rule_triggers(database, variant, baseline)
+
+    result, rejected = {}, {}
+    performances = dict(held_out)['Performance']
+    members = dict(held_out)['performance_members']
+    seconds, rejected['Performance'] = insert_one_by_one(database, 'Performance', performances)
+    result['performance'] = {'rows': len(performances), 'seconds': round(seconds, 3),
+                             'rows_per_sec': round(len(performances) / max(seconds, 1e-9))}
+    # the members of a rejected performance have nothing to join
+    dropped = {row[0] for row in rejected['Performance']}
+    members = [row for row in members if row[0] not in dropped]
+    seconds, rejected['performance_members'] = insert_one_by_one(database, 'performance_members', members)
+    result['performance_members'] = {'rows': len(members), 'seconds': round(seconds, 3),
+                                     'rows_per_sec': round(len(members) / max(seconds, 1e-9))}
+    result['rejected'] = dict(Counter(message for by_row in rejected.values() for message in by_row.values()))
+
+    probes = probe_rows(history, held_out)
+    for table in ('Event', 'Performance', 'performance_members'):
+        rows = probes[table]
+        if table == 'performance_members':
+            dropped = {row[0] for row in rejected['probe Performance']}
+            rows = [row for row in rows if row[0] not in dropped]
+        _, rejected['probe ' + table] = insert_one_by_one(database, table, rows)
+    result['probes'] = {'rows': sum(map(len, probes.values())),
+                        'rejected': dict(Counter(message for table, by_row in rejected.items()
+                                                 if table.startswith('probe') for message in by_row.values()))}
+    return database, result, rejected
+
+
+def benchmark(args):
+    if args.engine == 'mariadb' and not args.baseline:
+        raise SystemExit('--engine mariadb needs --baseline, the install file with the correlated triggers')
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'engine': args.engine,
+        'seed': args.seed,
+        'skew': args.skew,
+        'scales': [],
+    }
+    database = connect_from_args(args)
+    report['version'] = database.version
+    for scale in args.scales:
+        print(f'Scale {scale:g}: generating')
+        generator = build_dataset(scaled_counts(scale), seed=args.seed, workers=args.workers, skew=args.skew)
+        history, held_out, year = split_history(generator)
+        entry = {'scale': scale, 'year': year, 'history_rows': sum(len(values) for _, values in history),
+                 'variants': {}}
+        rejections = {}
+        for variant in args.variants:
+            database, result, rejections[variant] = run_variant(database, variant, history, held_out, args.baseline)
+            entry['variants'][variant] = result
+            print(f"  {variant:<11} performance {result['performance']['rows_per_sec']:>8,} rows/sec  "
+                  f"performance_members {result['performance_members']['rows_per_sec']:>8,} rows/sec  "
+                  f"rejected {sum(result['rejected'].values())}, "
+                  f"probes rejected {sum(result['probes']['rejected'].values())} of {result['probes']['rows']}")
+
+        if 'correlated' in rejections and 'helper' in rejections:
+            # The rows only one of the rule variants rejects. A performance
+            # that runs past the midnight of its event's day (and its
+            # members) is the intended difference; any other is a mismatch.
+            probes = probe_rows(history, held_out)
+            performances = {row[0]: row for row in dict(held_out)['Performance'] + probes['Performance']}
+            event_dates = {row[0]: row[3] for row in dict(history)['Event'] + probes['Event']}
+            differences, mismatches = {}, 0
+            for table in rejections['helper']:
+                before, after = rejections['correlated'][table], rejections['helper'][table]
+                rows = sorted(set(before) ^ set(after))
+                if rows and table.endswith(('Performance', 'performance_members')):
+                    differences[table] = []
+                    for row in rows:
+                        midnight = past_midnight(performances.get(row[0]), event_dates)
+                        mismatches += not midnight
+                        differences[table].append({'row': list(row), 'correlated': before.get(row),
+                                                   'helper': after.get(row), 'past_midnight': midnight})
+                elif rows:
+                    mismatches += len(rows)
+            entry['same_rejections'] = not mismatches
+            entry['differences'] = differences
+            for variant in ('performance', 'performance_members'):
+                before = entry['variants']['correlated'][variant]['rows_per_sec']
+                after = entry['variants']['helper'][variant]['rows_per_sec']
+                entry.setdefault('speedup', {})[variant] = round(after / max(before, 1), 2)
+            print(f"  helper over correlated: performance {entry['speedup']['performance']:g}x, "
+                  f"performance_members {entry['speedup']['performance_members']:g}x; "
+                  f"{sum(map(len, differences.values())) - mismatches} row(s) past midnight rejected "
+                  f"by one variant only, {mismatches} other difference(s)")
+        report['scales'].append(entry)
+    database.close()
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the performance rule triggers on inserts, '
+                                                 'with and without the helper tables')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10, 100],
+                        help='dataset scale factors to benchmark (default: 1 10 100)')
+    parser.add_argument('--variants', nargs='+', choices=VARIANTS, default=VARIANTS)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--skew', type=parse_skew, help='skewed popularity, as in generate_data.py --skew')
+    parser.add_argument('--baseline', help='MariaDB: the install file with the correlated triggers')
+    parser.add_argument('--output', default='trigger_report.json')
+    add_connection_arguments(parser)
+    args = parser.parse_args()
+
+    report = benchmark(args)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Report written to {args.output}')
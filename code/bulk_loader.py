@@ -0,0 +1,300 @@
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from db import Database, add_connection_arguments, install_phases, sqlite_statement
+from validate_data import Validator, print_report
+from writers import TABLE_COLUMNS, dependency_levels, open_compressed, read_directory, read_file, read_manifest, row_values
+
+# Rebuild the database from generated data in the order a bulk load wants:
+#
+#  1. validate:    the install.sql trigger rules, checked offline (validate_data.py),
+#                  since the triggers only exist once the data is in
+#  2. pre_data:    the schema and the tables of install.sql, without secondary indexes
+#  3. data:        the rows, one foreign key level at a time; within a level every
+#                  table, or every shard of a table, is loaded by its own task on a
+#                  pool of connections with batched executemany()
+#  4. post_data:   the secondary indexes, built once over the loaded rows
+#  5. constraints: the triggers, procedures and events, and the helper tables
+#                  of the performance rule triggers filled from the rows
+#
+# The data comes from a dataset generated in memory, a tsv/csv output
+# directory or a generate_data.py --shards directory. On SQLite (the offline
+# stand-in) the connections take turns on the database's single write lock,
+# and only the triggers of db.SQLITE_TRIGGERS exist in SQLite syntax.
+
+# Rows per executemany() call. On SQLite (scale 100) 1000 to 20000 rows per
+# call load equally fast, and more than one connection is slower: the
+# writers queue for the same lock and share one interpreter.
+DEFAULT_BATCH_SIZE = {'sqlite': 1000, 'mariadb': 2000}
+DEFAULT_CONNECTIONS = {'sqlite': 1, 'mariadb': 4}
+
+
+def _slices(table, rows, shards):
+    # Split the rows of one table into up to 'shards' tasks of consecutive rows
+    values = list(row_values(table, rows))
+    count = min(shards, len(values))
+    for shard in range(count):
+        start, stop = len(values) * shard // count, len(values) * (shard + 1) // count
+        yield {'table': table, 'label': f'{table}[{start}:{stop}]', 'rows': stop - start,
+               'load': lambda database, batch_size, chunk=values[start:stop]:
+                   database.insert_rows(table, chunk, batch_size)}
+
+
+def memory_tasks(data, shards=1):
+    """Load tasks of {table: rows} per foreign key level, every table split
+    into up to 'shards' tasks"""
+    return [[task for table in level if len(data[table]) for task in _slices(table, data[table], shards)]
+            for level in dependency_levels(data)]
+
+
+def _run_sql_file(database, path):
+    # INSERT statements of a sql shard; strings never hold a raw newline
+    cursor = database.connection.cursor()
+    with open_compressed(path) as f:
+        for statement in re.split(r';\s*\n', f.read()):
+            if statement.strip():
+                cursor.execute(statement)
+    cursor.close()
+
+
+def manifest_tasks(directory, manifest):
+    """Load tasks of a generate_data.py --shards output, one per file, per foreign key level"""
+    levels = []
+    for level in manifest['levels']:
+        tasks = []
+        for table in level:
+            for entry in manifest['tables'][table]['files']:
+                path = os.path.join(directory, entry['file'])
+                if manifest['format'] == 'sql':
+                    load = lambda database, batch_size, path=path: _run_sql_file(database, path)
+                else:
+                    load = (lambda database, batch_size, path=path, table=table:
+                            database.insert_rows(table, row_values(table, read_file(path, table, manifest['format'])),
+                                                 batch_size))
+                tasks.append({'table': table, 'label': entry['file'], 'rows': entry['rows'], 'load': load})
+        levels.append(tasks)
+    return levels
+
+
+class BulkLoader:
+    """Runs the load phases, the tasks of a phase on a pool of connections
+    (one per thread)"""
+
+    def __init__(self, open_database, engine, connections=None, batch_size=None):
+        self.open_database = open_database
+        self.engine = engine
+        self.connections = connections or DEFAULT_CONNECTIONS[engine]
+        self.batch_size = batch_size or DEFAULT_BATCH_SIZE[engine]
+        self.local = threading.local()
+        self.databases = []
+        self.lock = threading.Lock()
+        self.timings = {}
+        self.tables = defaultdict(lambda: {'rows': 0, 'seconds': 0.0, 'tasks': 0})
+
+    def _database(self):
+        database = getattr(self.local, 'database', None)
+        if database is None:
+            database = self.local.database = self.open_database()
+            if self.engine == 'sqlite':
+                # nothing to recover from if a bulk load is cut short: start over
+                database.execute('PRAGMA synchronous = OFF')
+            else:
+                database.execute('SET foreign_key_checks = 0')
+                database.execute('SET unique_checks = 0')
+            with self.lock:
+                self.databases.append(database)
+        return database
+
+    def _timed(self, phase, run):
+        started = time.perf_counter()
+        result = run()
+        self.timings[phase] = self.timings.get(phase, 0.0) + time.perf_counter() - started
+        return result
+
+    def pre_data(self, setup_database, statements):
+        """Create the schema and tables on 'setup_database' (then closed)"""
+        def run():
+            for statement in statements:
+                setup_database.execute(statement)
+            setup_database.connection.commit()
+            setup_database.close()
+        self._timed('pre_data', run)
+
+    def load(self, levels):
+        """Run the load tasks level by level, the tasks of a level in parallel"""
+        def run():
+            with ThreadPoolExecutor(max_workers=self.connections) as pool:
+                for number, tasks in enumerate(levels):
+                    started = time.perf_counter()
+                    results = list(pool.map(self._load_task, tasks))
+                    tables = sorted({task['table'] for task in tasks}, key=list(TABLE_COLUMNS).index)
+                    print(f"level {number}: {sum(results):,} rows of {', '.join(tables)} in "
+                          f"{len(tasks)} task(s), {time.perf_counter() - started:.2f}s")
+        self._timed('data', run)
+
+    def _load_task(self, task):
+        database = self._database()
+        started = time.perf_counter()
+        result = task['load'](database, self.batch_size)
+        database.connection.commit()
+        rows = result if result is not None else task['rows']
+        with self.lock:
+            stats = self.tables[task['table']]
+            stats['rows'] += rows
+            stats['seconds'] += time.perf_counter() - started
+            stats['tasks'] += 1
+        return rows
+
+    def post_data(self, statements):
+        """Create the secondary indexes, the indexes of a table in one task"""
+        by_table = defaultdict(list)
+        for statement in statements:
+            by_table[re.search(r'\bON\s+(\w+)', statement, re.IGNORECASE).group(1).lower()].append(statement)
+
+        def create(statements):
+            database = self._database()
+            for statement in statements:
+                database.execute(statement)
+            database.connection.commit()
+
+        def run():
+            with ThreadPoolExecutor(max_workers=self.connections) as pool:
+                list(pool.map(create, by_table.values()))
+        self._timed('post_data', run)
+
+    def constraints(self, statements):
+        """Create the triggers, procedures and events (db.SQLITE_TRIGGERS on SQLite)
+        and fill the rule helper tables"""
+        def run():
+            database = self._database()
+            if self.engine == 'sqlite':
+                database.add_triggers()
+            else:
+                for statement in statements:
+                    database.execute(statement)
+                database.connection.commit()
+            # The triggers that keep the rule helper tables up to date did
+            # not see the rows
+            database.fill_rule_helpers()
+        self._timed('constraints', run)
+
+    def close(self):
+        for database in self.databases:
+            database.close()
+        self.databases = []
+
+    def report(self):
+        return {
+            'engine': self.engine,
+            'connections': self.connections,
+            'batch_size': self.batch_size,
+            'phases': {phase: round(seconds, 3) for phase, seconds in self.timings.items()},
+            'tables': {table: dict(stats, seconds=round(stats['seconds'], 3))
+                       for table, stats in self.tables.items()},
+        }
+
+
+def print_timings(report):
+    rows = sum(stats['rows'] for stats in report['tables'].values())
+    print(f"\n{'table':<22}{'tasks':>6}{'rows':>11}{'task s':>9}{'rows/sec':>12}")
+    for table, stats in sorted(report['tables'].items(), key=lambda item: list(TABLE_COLUMNS).index(item[0])):
+        rate = f"{stats['rows'] / stats['seconds']:,.0f}" if stats['seconds'] else '-'
+        print(f"{table:<22}{stats['tasks']:>6}{stats['rows']:>11,}{stats['seconds']:>9.3f}{rate:>12}")
+    print(f"\n{'phase':<14}{'seconds':>9}")
+    for phase, seconds in report['phases'].items():
+        print(f'{phase:<14}{seconds:>9.3f}')
+    total = sum(report['phases'].values())
+    print(f"{'total':<14}{total:>9.3f}  ({rows:,} rows, {rows / report['phases']['data']:,.0f} rows/sec loading)"
+          if report['phases'].get('data') else f"{'total':<14}{total:>9.3f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load generated data: tables, then rows in parallel per '
+                                                 'foreign key level, then indexes, then triggers')
+    parser.add_argument('source', nargs='?',
+                        help='directory written by generate_data.py --format tsv/csv or --shards; '
+                             'without it a dataset is generated in memory')
+    parser.add_argument('--format', choices=['tsv', 'csv'], default='tsv', help='format of a tsv/csv directory')
+    parser.add_argument('--scale', type=float, default=1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--connections', type=int,
+                        help='parallel connections (default 1 on SQLite, 4 on MariaDB)')
+    parser.add_argument('--shards', type=int,
+                        help='split every table into up to N tasks (default: --connections); '
+                             'a --shards directory is loaded one task per file')
+    parser.add_argument('--batch-size', type=int,
+                        help='rows per executemany() call (default 1000 on SQLite, 2000 on MariaDB)')
+    parser.add_argument('--path', default='music_festival.db', help='SQLite database file (replaced)')
+    parser.add_argument('--no-validate', action='store_true', help='skip the offline check of the trigger rules')
+    parser.add_argument('--force', action='store_true', help='load even if the check finds violations')
+    parser.add_argument('--output', help='write the phase and table timings as JSON')
+    add_connection_arguments(parser)
+    args = parser.parse_args()
+
+    manifest = read_manifest(args.source) if args.source else None
+    if manifest is not None and manifest['format'] == 'sql' and args.engine == 'sqlite':
+        parser.error('sql shards use MariaDB string escapes; write them with --format tsv to load into SQLite')
+
+    data = None
+    if manifest is None or manifest['format'] != 'sql':
+        if args.source:
+            data = read_directory(args.source, args.format)
+        else:
+            from generate_data import build_dataset, scaled_counts
+            data = dict(build_dataset(scaled_counts(args.scale), seed=args.seed).tables())
+    validate_seconds = 0.0
+    if args.no_validate or data is None:
+        print('Not validated' + (' (sql shards cannot be read back)' if data is None else ''))
+    else:
+        started = time.perf_counter()
+        validator = Validator(data)
+        print_report(validator.check_all())
+        validate_seconds = time.perf_counter() - started
+        if validator.violations and not args.force:
+            print('Not loading data that breaks the trigger rules (use --force to load it anyway)')
+            sys.exit(1)
+
+    phases = install_phases()
+    if args.engine == 'sqlite':
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(args.path + suffix):
+                os.remove(args.path + suffix)
+        setup = Database.sqlite(args.path, install_sql=None)
+        setup.execute('PRAGMA journal_mode = WAL')
+        pre_data = [sqlite_statement(s) for s in phases['pre_data'] if re.match(r'CREATE\s+TABLE', s, re.I)]
+        post_data = [sqlite_statement(s) for s in phases['post_data']]
+        open_database = lambda: Database.sqlite(args.path, install_sql=None, timeout=600)
+    else:
+        # install.sql drops and creates the schema itself
+        connect_args = dict(host=args.host, port=args.port, user=args.user, password=args.password)
+        setup = Database.mariadb(**connect_args)
+        pre_data, post_data = phases['pre_data'], phases['post_data']
+        open_database = lambda: Database.mariadb(database=args.database, **connect_args)
+
+    loader = BulkLoader(open_database, args.engine, connections=args.connections, batch_size=args.batch_size)
+    loader.timings['validate'] = validate_seconds
+    try:
+        loader.pre_data(setup, pre_data)
+        if manifest is not None:
+            levels = manifest_tasks(args.source, manifest)
+        else:
+            levels = memory_tasks(data, args.shards or loader.connections)
+        loader.load(levels)
+        loader.post_data(post_data)
+        loader.constraints(phases['constraints'])
+    finally:
+        loader.close()
+
+    report = loader.report()
+    print_timings(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'\nTimings written to {args.output}')
@@ -0,0 +1,426 @@
+import argparse
+import json
+import os
+import time
+from datetime import date
+
+try:
+    import numpy as np
+except ImportError:
+    raise ImportError('the columnar export needs numpy (pip install numpy)') from None
+
+# Columnar copy of the data the reporting queries read, and a local engine
+# that answers them from it.
+#
+# Q01, Q03, Q05, Q10, Q11 and Q14 scan performance_members or ticket joined
+# with performance, event and festival, i.e. every row, and would compete
+# with ticket sales on the transactional database. export() writes the rows
+# they need once, prejoined:
+#
+#   performance_fact  one row per performance_members row, with its
+#                     performance's type, event, festival and year
+#   ticket_fact       one row per ticket, with its festival and year and the
+#                     price in cents
+#   artist, genre, artist_genres
+#
+# Low-cardinality strings (performance type, payment method) are dictionary
+# encoded: the column holds int codes into a sorted dictionary, so codes
+# compare like the strings. The files are Parquet when pyarrow is installed,
+# and one .npy file per column otherwise; columnar.json describes either.
+
+MANIFEST = 'columnar.json'
+
+# Columns read from the source tables
+SOURCE_COLUMNS = {
+    'Festival': ['festival_id', 'year'],
+    'Event': ['event_id', 'festival_id'],
+    'Performance': ['performance_id', 'event_id', 'type'],
+    'performance_members': ['performance_id', 'artist_id', 'group_id'],
+    'Ticket': ['event_id', 'payment_method', 'price'],
+    'Artist': ['artist_id', 'name', 'stage_name', 'dob'],
+    'Genre': ['genre_id', 'name'],
+    'Artist_Genres': ['artist_id', 'genre_id'],
+}
+
+# Queries of sql/query the engine answers, by engine method
+QUERIES = {'Q01': 'q01', 'Q03': 'q03', 'Q05': 'q05', 'Q10': 'q10', 'Q11': 'q11', 'Q14': 'q14'}
+
+
+def have_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def table_source(tables):
+    """fetch(table, columns) over generated or read rows ({table: rows})"""
+    tables = dict(tables)
+
+    def fetch(table, columns):
+        rows = tables[table]
+        if hasattr(rows, 'values') and not isinstance(rows, list):
+            return [list(rows.values(column)) for column in columns]  # record_store.Table
+        return [[row[column] for row in rows] for column in columns]
+    return fetch
+
+
+def database_source(database):
+    """fetch(table, columns) over a live database (db.Database)"""
+    def fetch(table, columns):
+        rows = database.execute(f"SELECT {', '.join(columns)} FROM {table}")
+        return [list(values) for values in zip(*rows)] if rows else [[] for _ in columns]
+    return fetch
+
+
+def _ids(values):
+    return np.array(values, dtype=np.int64)
+
+
+def _encode(values):
+    """Dictionary encoding: (int32 codes, sorted dictionary)"""
+    dictionary = sorted(set(values))
+    index = {value: code for code, value in enumerate(dictionary)}
+    return np.array([index[value] for value in values], dtype=np.int32), dictionary
+
+
+def build_columns(fetch):
+    """{table: {column: array}} and {table: {column: dictionary}} of the
+    columnar tables, read through 'fetch'"""
+    source = {table: dict(zip(columns, fetch(table, columns))) for table, columns in SOURCE_COLUMNS.items()}
+
+    # event id -> festival id -> year, as dense lookup arrays
+    festival_ids = _ids(source['Festival']['festival_id'])
+    festival_year = np.zeros(festival_ids.max(initial=0) + 1, dtype=np.int32)
+    festival_year[festival_ids] = source['Festival']['year']
+    event_ids = _ids(source['Event']['event_id'])
+    event_festival = np.zeros(event_ids.max(initial=0) + 1, dtype=np.int64)
+    event_festival[event_ids] = source['Event']['festival_id']
+
+    performance_ids = _ids(source['Performance']['performance_id'])
+    types, type_dictionary = _encode(source['Performance']['type'])
+    performance_event = np.zeros(performance_ids.max(initial=0) + 1, dtype=np.int64)
+    performance_event[performance_ids] = source['Performance']['event_id']
+    performance_type = np.zeros(len(performance_event), dtype=np.int32)
+    performance_type[performance_ids] = types
+
+    members = source['performance_members']
+    member_performance = _ids(members['performance_id'])
+    member_event = performance_event[member_performance]
+    member_festival = event_festival[member_event]
+
+    tickets = source['Ticket']
+    ticket_event = _ids(tickets['event_id'])
+    ticket_festival = event_festival[ticket_event]
+    payment, payment_dictionary = _encode(tickets['payment_method'])
+
+    artists = source['Artist']
+    columns = {
+        'performance_fact': {
+            'artist_id': _ids(members['artist_id']),
+            'group_id': np.array([-1 if g is None else g for g in members['group_id']], dtype=np.int64),
+            'performance_id': member_performance,
+            'type': performance_type[member_performance],
+            'event_id': member_event,
+            'festival_id': member_festival,
+            'year': festival_year[member_festival],
+        },
+        'ticket_fact': {
+            'event_id': ticket_event,
+            'festival_id': ticket_festival,
+            'year': festival_year[ticket_festival],
+            'payment_method': payment,
+            'price_cents': np.array([round(float(p) * 100) for p in tickets['price']], dtype=np.int64),
+        },
+        'artist': {
+            'artist_id': _ids(artists['artist_id']),
+            'name': np.array(artists['name'], dtype=str),
+            'stage_name': np.array(artists['stage_name'], dtype=str),
+            'dob': np.array([str(d) for d in artists['dob']], dtype='datetime64[D]'),
+        },
+        'genre': {
+            'genre_id': _ids(source['Genre']['genre_id']),
+            'name': np.array(source['Genre']['name'], dtype=str),
+        },
+        'artist_genres': {
+            'artist_id': _ids(source['Artist_Genres']['artist_id']),
+            'genre_id': _ids(source['Artist_Genres']['genre_id']),
+        },
+    }
+    dictionaries = {
+        'performance_fact': {'type': type_dictionary},
+        'ticket_fact': {'payment_method': payment_dictionary},
+    }
+    return columns, dictionaries
+
+
+def export(fetch, directory, fmt=None):
+    """Write the columnar tables read through 'fetch' to 'directory' as
+    'parquet' or 'npy' (parquet if pyarrow is installed); returns the manifest path"""
+    fmt = fmt or ('parquet' if have_pyarrow() else 'npy')
+    columns, dictionaries = build_columns(fetch)
+    os.makedirs(directory, exist_ok=True)
+    manifest = {'format': fmt, 'tables': {}}
+    for table, data in columns.items():
+        encoded = dictionaries.get(table, {})
+        if fmt == 'parquet':
+            _write_parquet(os.path.join(directory, f'{table}.parquet'), data, encoded)
+        else:
+            os.makedirs(os.path.join(directory, table), exist_ok=True)
+            for column, values in data.items():
+                np.save(os.path.join(directory, table, f'{column}.npy'), values, allow_pickle=False)
+        described = {}
+        for column, values in data.items():
+            described[column] = {'dtype': str(values.dtype)}
+            if column in encoded:
+                described[column]['dictionary'] = encoded[column]
+        manifest['tables'][table] = {'rows': len(next(iter(data.values()))), 'columns': described}
+    path = os.path.join(directory, MANIFEST)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+    return path
+
+
+def _write_parquet(path, data, encoded):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError('Parquet files need the pyarrow package (pip install pyarrow)') from None
+    arrays = {}
+    for column, values in data.items():
+        if column in encoded:
+            arrays[column] = pa.DictionaryArray.from_arrays(pa.array(values), pa.array(encoded[column]))
+        else:
+            arrays[column] = pa.array(values)
+    pq.write_table(pa.table(arrays), path)
+
+
+class ColumnarData:
+    """The tables of a columnar export: 'tables' {table: {column: array}},
+    with dictionary encoded columns as codes into 'dictionaries'"""
+
+    def __init__(self, tables, dictionaries, fmt=None):
+        self.tables = tables
+        self.dictionaries = dictionaries
+        self.format = fmt
+
+    @classmethod
+    def read(cls, directory):
+        with open(os.path.join(directory, MANIFEST), encoding='utf-8') as f:
+            manifest = json.load(f)
+        tables, dictionaries = {}, {}
+        for table, entry in manifest['tables'].items():
+            dictionaries[table] = {column: spec['dictionary']
+                                   for column, spec in entry['columns'].items() if 'dictionary' in spec}
+            if manifest['format'] == 'parquet':
+                tables[table] = _read_parquet(os.path.join(directory, f'{table}.parquet'), dictionaries[table])
+            else:
+                tables[table] = {column: np.load(os.path.join(directory, table, f'{column}.npy'),
+                                                 allow_pickle=False)
+                                 for column in entry['columns']}
+        return cls(tables, dictionaries, manifest['format'])
+
+    @classmethod
+    def build(cls, fetch):
+        """Build the tables in memory, without writing them"""
+        return cls(*build_columns(fetch))
+
+
+def _read_parquet(path, dictionaries):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError('Parquet files need the pyarrow package (pip install pyarrow)') from None
+    table = pq.read_table(path)
+    columns = {}
+    for name, column in zip(table.column_names, table.columns):
+        column = column.combine_chunks()
+        if pa.types.is_dictionary(column.type):
+            # codes into the manifest's dictionary, whatever order was stored
+            index = {value: code for code, value in enumerate(dictionaries[name])}
+            stored = np.array([index[value] for value in column.dictionary.to_pylist()], dtype=np.int32)
+            columns[name] = stored[column.indices.to_numpy(zero_copy_only=False)]
+        elif pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+            columns[name] = np.array(column.to_pylist(), dtype=str)
+        else:
+            columns[name] = column.to_numpy(zero_copy_only=False)
+    return columns
+
+
+class ReportingEngine:
+    """Answers the reporting queries of QUERIES from a ColumnarData.
+
+    Every method returns the rows of its query, with the columns of the SQL
+    version; ties of an ORDER BY come in the order of the GROUP BY columns,
+    as they do from the SQL.
+    """
+
+    def __init__(self, data, today=None):
+        self.data = data
+        self.today = today or date.today()
+        facts = data.tables['performance_fact']
+        artists = data.tables['artist']
+        genres = data.tables['genre']
+
+        # Dense row numbers of the artists, festivals and genres, so that
+        # grouping by them is a bincount or a matrix product
+        self.artist_order = np.argsort(artists['artist_id'], kind='stable')
+        self.artist_ids = artists['artist_id'][self.artist_order]
+        self.fact_artist = self.artist_order[np.searchsorted(self.artist_ids, facts['artist_id'])]
+        self.festival_ids, self.fact_festival = np.unique(facts['festival_id'], return_inverse=True)
+        self.festival_years = np.zeros(len(self.festival_ids), dtype=np.int64)
+        self.festival_years[self.fact_festival] = facts['year']
+        self.genre_order = np.argsort(genres['genre_id'], kind='stable')
+        self.genre_ids = genres['genre_id'][self.genre_order]
+
+        artist_genres = data.tables['artist_genres']
+        self.artist_genre = np.zeros((len(self.artist_ids), len(self.genre_ids)), dtype=bool)
+        self.artist_genre[self.artist_order[np.searchsorted(self.artist_ids, artist_genres['artist_id'])],
+                          np.searchsorted(self.genre_ids, artist_genres['genre_id'])] = True
+        # artist x festival: did the artist perform there
+        self.artist_festival = np.zeros((len(self.artist_ids), len(self.festival_ids)), dtype=bool)
+        self.artist_festival[self.fact_artist, self.fact_festival] = True
+
+    def run(self, name):
+        return getattr(self, QUERIES[name])()
+
+    def _artist(self, row, column):
+        return self.data.tables['artist'][column][row]
+
+    def _genre_name(self, index):
+        return str(self.data.tables['genre']['name'][self.genre_order[index]])
+
+    def q01(self):
+        """Revenue per festival year and payment method"""
+        tickets = self.data.tables['ticket_fact']
+        methods = self.data.dictionaries['ticket_fact']['payment_method']
+        if not len(tickets['year']):
+            return []
+        first = tickets['year'].min()
+        key = (tickets['year'] - first) * len(methods) + tickets['payment_method']
+        sold = np.bincount(key)
+        cents = np.bincount(key, weights=tickets['price_cents'])
+        return [(int(first + k // len(methods)), methods[k % len(methods)], cents[k] / 100)
+                for k in np.flatnonzero(sold)]
+
+    def q03(self):
+        """Artists with more than 2 warm up performances in one festival"""
+        facts = self.data.tables['performance_fact']
+        types = self.data.dictionaries['performance_fact']['type']
+        if 'warm up' not in types:
+            return []
+        warm_up = facts['type'] == types.index('warm up')
+        key = self.fact_artist[warm_up] * len(self.festival_ids) + self.fact_festival[warm_up]
+        keys, counts = np.unique(key, return_counts=True)
+        keep = counts > 2
+        keys, counts = keys[keep], counts[keep]
+        order = np.argsort(-counts, kind='stable')
+        rows = []
+        for k, count in zip(keys[order], counts[order]):
+            artist, festival = divmod(int(k), len(self.festival_ids))
+            rows.append((int(self.artist_ids[artist]), str(self._artist(self.artist_order[artist], 'name')),
+                         str(self._artist(self.artist_order[artist], 'stage_name')),
+                         int(self.festival_ids[festival]), int(self.festival_years[festival]), int(count)))
+        return rows
+
+    def q05(self):
+        """The 10 artists under 30 with the most performances"""
+        dob = self.data.tables['artist']['dob'][self.artist_order]
+        years = dob.astype('datetime64[Y]').astype(np.int64) + 1970
+        month_day = ((dob.astype('datetime64[M]').astype(np.int64) % 12 + 1) * 100
+                     + (dob - dob.astype('datetime64[M]')).astype(np.int64) + 1)
+        # whole years, as TIMESTAMPDIFF(YEAR, dob, CURDATE())
+        ages = self.today.year - years - (month_day > self.today.month * 100 + self.today.day)
+        counts = np.bincount(self.fact_artist, minlength=len(self.artist_ids))
+        young = np.flatnonzero((ages < 30) & (counts > 0))
+        top = young[np.argsort(-counts[young], kind='stable')][:10]
+        return [(int(self.artist_ids[a]), str(self._artist(self.artist_order[a], 'name')),
+                 str(self._artist(self.artist_order[a], 'stage_name')), int(ages[a]), int(counts[a]))
+                for a in top]
+
+    def q10(self):
+        """The 3 genre pairs whose artists played in the most festivals"""
+        genres = len(self.genre_ids)
+        # (artist, genre 1, genre 2) -> artist has both, times artist x festival
+        pairs = (self.artist_genre[:, :, None] & self.artist_genre[:, None, :]).reshape(-1, genres * genres)
+        festivals = (pairs.T.astype(np.int64) @ self.artist_festival.astype(np.int64) > 0).sum(axis=1)
+        first, second = np.triu_indices(genres, k=1)
+        counts = festivals.reshape(genres, genres)[first, second]
+        pairs = [(self._genre_name(first[k]), self._genre_name(second[k]), int(counts[k]))
+                 for k in np.flatnonzero(counts)]
+        # ties in the order of the GROUP BY g1.name, g2.name
+        return sorted(pairs, key=lambda pair: (-pair[2], pair[0], pair[1]))[:3]
+
+    def q11(self):
+        """Artists with at least 5 festival participations fewer than the most"""
+        participations = self.artist_festival.sum(axis=1)
+        played = np.flatnonzero(participations)
+        if not len(played):
+            return []
+        limit = participations.max() - 5
+        return [(int(self.artist_ids[a]), str(self._artist(self.artist_order[a], 'name')), int(participations[a]))
+                for a in played[participations[played] <= limit]]
+
+    def q14(self):
+        """Genres with the same number (at least 3) of performances in two consecutive years"""
+        years, fact_year = np.unique(self.festival_years[self.fact_festival], return_inverse=True)
+        per_artist = np.zeros((len(self.artist_ids), len(years)), dtype=np.int64)
+        np.add.at(per_artist, (self.fact_artist, fact_year), 1)
+        counts = self.artist_genre.T.astype(np.int64) @ per_artist       # genre x year
+        rows = []
+        for k in range(len(years) - 1):
+            if years[k + 1] != years[k] + 1:
+                continue
+            same = np.flatnonzero((counts[:, k] >= 3) & (counts[:, k] == counts[:, k + 1]))
+            rows.extend((self._genre_name(g), int(years[k]), int(years[k + 1]), int(counts[g, k])) for g in same)
+        return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Columnar export of the reporting data and a local '
+                                                 'engine for the reporting queries')
+    parser.add_argument('command', choices=['export', 'snapshot', 'query'],
+                        help='export: generated or tsv/csv data; snapshot: a live database (--engine); '
+                             'query: run the reporting queries on an export')
+    parser.add_argument('directory', help='directory of the columnar files')
+    parser.add_argument('queries', nargs='*', help='query: the queries to run (default all of '
+                                                   + ', '.join(QUERIES) + ')')
+    parser.add_argument('--format', choices=['parquet', 'npy'],
+                        help='file format (default parquet if pyarrow is installed, else npy)')
+    parser.add_argument('--source', help='export: directory written by generate_data.py --format tsv/csv '
+                                         '(default: generate in memory)')
+    parser.add_argument('--scale', type=float, default=1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--path', default='music_festival.db', help='snapshot: SQLite database file')
+    from db import add_connection_arguments, connect_from_args
+    add_connection_arguments(parser)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.command == 'export':
+        if args.source:
+            from writers import read_directory
+            fmt = 'csv' if os.path.exists(os.path.join(args.source, 'festival.csv')) else 'tsv'
+            fetch = table_source(read_directory(args.source, fmt))
+        else:
+            from generate_data import build_dataset, scaled_counts
+            fetch = table_source(build_dataset(scaled_counts(args.scale), seed=args.seed).tables())
+        print(f'Written {export(fetch, args.directory, args.format)} in {time.perf_counter() - started:.2f}s')
+    elif args.command == 'snapshot':
+        database = connect_from_args(args, path=args.path)
+        try:
+            print(f'Written {export(database_source(database), args.directory, args.format)} '
+                  f'in {time.perf_counter() - started:.2f}s')
+        finally:
+            database.close()
+    else:
+        engine = ReportingEngine(ColumnarData.read(args.directory))
+        for name in args.queries or QUERIES:
+            query_started = time.perf_counter()
+            rows = engine.run(name)
+            print(f'{name}: {len(rows)} rows in {(time.perf_counter() - query_started) * 1000:.2f} ms')
+            for row in rows:
+                print('  ' + ', '.join(str(value) for value in row))
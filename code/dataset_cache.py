@@ -0,0 +1,264 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date
+
+# A local cache of generate_data.py outputs.
+#
+# The output depends only on the seed, the counts, the format, the earlier
+# outputs a yearly delta is built on, the generator's code (and Faker's
+# version) and today's date (ages, purchase dates and festival years are
+# relative to it). Their hash is the cache key; an entry holds a copy of the
+# output and a manifest with the size and sha256 of every file. The least
+# recently used entries are evicted once the cache outgrows its size limit.
+#
+#   python3 dataset_cache.py list
+#   python3 dataset_cache.py verify [--remove]
+#   python3 dataset_cache.py evict --max-size 2G
+#   python3 dataset_cache.py clear
+
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+# The modules whose code decides what is generated and how it is written
+CODE_FILES = ['generate_data.py', 'partitioning.py', 'record_store.py', 'skew.py', 'ticket_allocator.py',
+              'value_pool.py', 'writers.py']
+DEFAULT_DIR = os.environ.get('FESTIVAL_DATA_CACHE',
+                             os.path.join(os.path.expanduser('~'), '.cache', 'festival_data'))
+DEFAULT_MAX_SIZE = '5G'
+MANIFEST = 'manifest.json'
+
+_UNITS = {'': 1, 'K': 2 ** 10, 'M': 2 ** 20, 'G': 2 ** 30, 'T': 2 ** 40}
+
+
+def parse_size(text):
+    """'500M', '2G', '1048576' -> bytes"""
+    text = str(text).strip().upper().rstrip('B')
+    unit = text[-1] if text and text[-1] in _UNITS else ''
+    return int(float(text[:len(text) - len(unit)]) * _UNITS[unit])
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def checksums(path):
+    """{relative path: {'size', 'sha256'}} of a file or of a directory's files"""
+    if os.path.isfile(path):
+        return {os.path.basename(path): {'size': os.path.getsize(path), 'sha256': _sha256(path)}}
+    result = {}
+    for root, _, files in os.walk(path):
+        for name in sorted(files):
+            full = os.path.join(root, name)
+            result[os.path.relpath(full, path)] = {'size': os.path.getsize(full), 'sha256': _sha256(full)}
+    return result
+
+
+def code_version():
+    """Hash of the generator modules, the Faker version and the Python version"""
+    from faker import VERSION as faker_version
+    digest = hashlib.sha256()
+    for name in CODE_FILES:
+        with open(os.path.join(CODE_DIR, name), 'rb') as f:
+            digest.update(f.read())
+    digest.update(f'faker {faker_version} python {sys.version_info[0]}.{sys.version_info[1]}'.encode())
+    return digest.hexdigest()
+
+
+def cache_key(seed, counts, fmt, previous=None, today=None, shards=None, compression=None, skew=None,
+              partitioned=False):
+    """The key of an output: everything that decides its contents"""
+    params = {
+        'seed': seed,
+        'counts': counts,
+        'format': fmt,
+        'shards': shards,
+        'compression': compression,
+        'skew': skew,
+        'partitioned': partitioned,
+        # an earlier output counts by its contents, not its path
+        'previous': [checksums(directory) for directory in previous or []],
+        'today': (today or date.today()).isoformat(),
+        'code': code_version(),
+    }
+    text = json.dumps(params, sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest(), params
+
+
+class DatasetCache:
+    """Outputs stored by key under 'directory', at most 'max_bytes' in total"""
+
+    def __init__(self, directory=DEFAULT_DIR, max_bytes=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _entry(self, key):
+        return os.path.join(self.directory, key)
+
+    def _manifest(self, key):
+        try:
+            with open(os.path.join(self._entry(key), MANIFEST), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_manifest(self, entry, manifest):
+        path = os.path.join(entry, MANIFEST)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(path + '.tmp', path)
+
+    def get(self, key, destination):
+        """Copy the output of 'key' to 'destination'; False if it is not cached.
+
+        Only the file sizes are checked here (verify() checks the contents);
+        an entry with missing or truncated files is dropped.
+        """
+        manifest = self._manifest(key)
+        if manifest is None:
+            return False
+        data = os.path.join(self._entry(key), 'data')
+        for name, info in manifest['files'].items():
+            path = os.path.join(data, name)
+            if not os.path.isfile(path) or os.path.getsize(path) != info['size']:
+                self.remove(key)
+                return False
+        if manifest['kind'] == 'file':
+            shutil.copyfile(os.path.join(data, next(iter(manifest['files']))), destination)
+        else:
+            shutil.copytree(data, destination, dirs_exist_ok=True)
+        manifest['last_used'] = time.time()
+        self._write_manifest(self._entry(key), manifest)
+        return True
+
+    def put(self, key, source, params=None):
+        """Store the output file or directory 'source' under 'key', then
+        evict the least recently used entries over the size limit"""
+        staging = tempfile.mkdtemp(prefix='.staging-', dir=self.directory)
+        try:
+            data = os.path.join(staging, 'data')
+            if os.path.isfile(source):
+                os.makedirs(data)
+                shutil.copyfile(source, os.path.join(data, os.path.basename(source)))
+            else:
+                shutil.copytree(source, data)
+            files = checksums(data)
+            now = time.time()
+            self._write_manifest(staging, {
+                'key': key,
+                'kind': 'file' if os.path.isfile(source) else 'directory',
+                'params': params,
+                'files': files,
+                'bytes': sum(info['size'] for info in files.values()),
+                'created': now,
+                'last_used': now,
+            })
+            # the rename makes the entry appear complete or not at all
+            if os.path.exists(self._entry(key)):
+                self.remove(key)
+            os.rename(staging, self._entry(key))
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        if self.max_bytes is not None:
+            self.evict(self.max_bytes, keep=key)
+
+    def entries(self):
+        """Manifests of the stored entries, least recently used first"""
+        manifests = []
+        for key in os.listdir(self.directory):
+            if key.startswith('.'):
+                continue
+            manifest = self._manifest(key)
+            if manifest is not None:
+                manifests.append(manifest)
+        return sorted(manifests, key=lambda m: m['last_used'])
+
+    def remove(self, key):
+        shutil.rmtree(self._entry(key), ignore_errors=True)
+
+    def evict(self, max_bytes, keep=None):
+        """Remove the least recently used entries until at most max_bytes are
+        stored; returns the removed keys"""
+        entries = self.entries()
+        total = sum(m['bytes'] for m in entries)
+        removed = []
+        for manifest in entries:
+            if total <= max_bytes:
+                break
+            if manifest['key'] == keep:
+                continue
+            self.remove(manifest['key'])
+            total -= manifest['bytes']
+            removed.append(manifest['key'])
+        return removed
+
+    def verify(self):
+        """{key: [problems]} of the entries whose files do not match their checksums"""
+        problems = {}
+        for manifest in self.entries():
+            data = os.path.join(self._entry(manifest['key']), 'data')
+            stored = checksums(data) if os.path.isdir(data) else {}
+            found = []
+            for name, info in manifest['files'].items():
+                if name not in stored:
+                    found.append(f'{name}: missing')
+                elif stored[name] != info:
+                    found.append(f'{name}: checksum mismatch')
+            found.extend(f'{name}: not in the manifest' for name in stored if name not in manifest['files'])
+            if found:
+                problems[manifest['key']] = found
+        return problems
+
+    def clear(self):
+        for manifest in self.entries():
+            self.remove(manifest['key'])
+
+
+def _describe(manifest):
+    params = manifest.get('params') or {}
+    counts = params.get('counts') or {}
+    used = time.strftime('%Y-%m-%d %H:%M', time.localtime(manifest['last_used']))
+    return (f"{manifest['key'][:12]}  {manifest['bytes'] / 2 ** 20:9.1f} MB  last used {used}  "
+            f"seed {params.get('seed')} {params.get('format')} {counts.get('visitors')} visitors "
+            f"{counts.get('tickets')} tickets" + ('  (yearly delta)' if params.get('previous') else ''))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Manage the cache of generate_data.py outputs')
+    parser.add_argument('command', choices=['list', 'verify', 'evict', 'clear'])
+    parser.add_argument('--cache-dir', default=DEFAULT_DIR,
+                        help=f'cache directory (default {DEFAULT_DIR}, or $FESTIVAL_DATA_CACHE)')
+    parser.add_argument('--max-size', default=DEFAULT_MAX_SIZE, help='evict: size to shrink the cache to')
+    parser.add_argument('--remove', action='store_true', help='verify: remove the corrupt entries')
+    args = parser.parse_args()
+
+    cache = DatasetCache(args.cache_dir)
+    if args.command == 'list':
+        entries = cache.entries()
+        for manifest in reversed(entries):
+            print(_describe(manifest))
+        print(f"{len(entries)} entries, {sum(m['bytes'] for m in entries) / 2 ** 20:.1f} MB in {cache.directory}")
+    elif args.command == 'verify':
+        checked = len(cache.entries())
+        problems = cache.verify()
+        for key, found in problems.items():
+            print(f"{key[:12]}: {'; '.join(found)}")
+            if args.remove:
+                cache.remove(key)
+        print(f"{checked} entries checked, {len(problems)} corrupt"
+              + (' (removed)' if args.remove and problems else ''))
+        sys.exit(1 if problems and not args.remove else 0)
+    elif args.command == 'evict':
+        removed = cache.evict(parse_size(args.max_size))
+        print(f'Evicted {len(removed)} entries')
+    else:
+        cache.clear()
+        print(f'Cleared {cache.directory}')
@@ -0,0 +1,456 @@
+import os
+import re
+import sqlite3
+from datetime import date, datetime, timedelta
+
+from writers import TABLE_COLUMNS, row_values
+
+# Database connections for the tools that run the generated data through SQL
+# (query benchmarks, load tests).
+#
+# MariaDB is the real target, but a server is not always at hand, so the
+# schema of install.sql can also be created in SQLite: the tables, keys,
+# CHECK constraints and indexes are translated, the triggers, procedures and
+# events (MariaDB procedural SQL) are not. The MariaDB functions the queries
+# use are registered on the SQLite connection, and the few spellings SQLite
+# does not accept are rewritten by to_sqlite().
+
+SQL_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sql'))
+INSTALL_SQL = os.path.join(SQL_DIR, 'install.sql')
+
+
+def _time_to_sec(value):
+    if value is None:
+        return None
+    clock = str(value).split(' ')[-1]
+    sign = -1 if clock.startswith('-') else 1
+    hours, minutes, seconds = clock.lstrip('-').split(':')
+    return sign * (int(hours) * 3600 + int(minutes) * 60 + float(seconds))
+
+
+def _parse_datetime(value):
+    value = str(value)
+    if len(value) == 10:
+        return datetime.fromisoformat(value + ' 00:00:00')
+    return datetime.fromisoformat(value)
+
+
+_UNIT_SECONDS = {'SECOND': 1, 'MINUTE': 60, 'HOUR': 3600, 'DAY': 86400, 'WEEK': 604800}
+
+
+def _timestampdiff(unit, start, end):
+    """TIMESTAMPDIFF(unit, start, end): whole units from start to end"""
+    if start is None or end is None:
+        return None
+    start, end = _parse_datetime(start), _parse_datetime(end)
+    unit = unit.upper()
+    if unit in ('MONTH', 'QUARTER', 'YEAR'):
+        months = (end.year - start.year) * 12 + end.month - start.month
+        # a month only counts once its day and time have been reached
+        if months > 0 and (end.day, end.time()) < (start.day, start.time()):
+            months -= 1
+        elif months < 0 and (end.day, end.time()) > (start.day, start.time()):
+            months += 1
+        return int(months / {'MONTH': 1, 'QUARTER': 3, 'YEAR': 12}[unit])
+    return int((end - start).total_seconds() / _UNIT_SECONDS[unit])
+
+
+def _addtime(value, amount):
+    """ADDTIME(datetime, time)"""
+    if value is None or amount is None:
+        return None
+    result = _parse_datetime(value) + timedelta(seconds=_time_to_sec(amount))
+    return result.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _sqlite_functions(today):
+    now = datetime.combine(today, datetime.min.time())
+    return [
+        ('ADDTIME', 2, _addtime),
+        ('CURDATE', 0, lambda: today.isoformat()),
+        ('CURRENT_DATE', 0, lambda: today.isoformat()),
+        ('NOW', 0, lambda: now.strftime('%Y-%m-%d %H:%M:%S')),
+        ('TIME_TO_SEC', 1, _time_to_sec),
+        ('TIMESTAMPDIFF', 3, _timestampdiff),
+        ('YEAR', 1, lambda v: None if v is None else int(str(v)[:4])),
+    ]
+
+
+_UNIT_ARGUMENT = re.compile(
+    r'\b(TIMESTAMPDIFF|TIMESTAMPADD)\s*\(\s*(MICROSECOND|SECOND|MINUTE|HOUR|DAY|WEEK|MONTH|QUARTER|YEAR)\s*,',
+    re.IGNORECASE)
+
+
+def to_sqlite(sql):
+    """Rewrite MariaDB spellings SQLite does not parse"""
+    # The unit of TIMESTAMPDIFF is a keyword in MariaDB, a string here
+    return _UNIT_ARGUMENT.sub(lambda m: f"{m.group(1)}('{m.group(2).upper()}',", sql)
+
+
+def sqlite_statement(statement):
+    """A CREATE TABLE / CREATE INDEX statement of install.sql in SQLite syntax"""
+    statement = re.sub(r'\bINT\s+AUTO_INCREMENT\s+PRIMARY\s+KEY', 'INTEGER PRIMARY KEY',
+                       statement, flags=re.IGNORECASE)
+    statement = re.sub(r'\bUNIQUE\s+KEY\s+\w+\s*\(', 'UNIQUE (', statement, flags=re.IGNORECASE)
+    # TIME values compare as strings in SQLite ('4:00:00' > '12:00:00')
+    return re.sub(r"CHECK\s*\(\s*(\w+)\s*(<=|>=|<|>)\s*('\d+:\d\d:\d\d')\s*\)",
+                  r'CHECK (TIME_TO_SEC(\1) \2 TIME_TO_SEC(\3))', statement)
+
+
+_PARTITION_BY = re.compile(r'\s*PARTITION\s+BY\s+RANGE\s*\((?:YEAR\s*\()?\s*(\w+)\s*\)?\s*\).*',
+                           re.IGNORECASE | re.DOTALL)
+
+
+def sqlite_partitioned_table(statement):
+    """A CREATE TABLE ... PARTITION BY RANGE of install_partitioned.sql in
+    SQLite syntax, with an index on its id.
+
+    SQLite has no partitions. The table becomes a WITHOUT ROWID table whose
+    primary key leads with the partitioning column, so the rows of a year
+    are stored together and a year filter reads only them, like partition
+    pruning does.
+    """
+    key = _PARTITION_BY.search(statement).group(1)
+    statement = _PARTITION_BY.sub('', statement)
+    table = re.match(r'CREATE\s+TABLE\s+(\w+)', statement, re.IGNORECASE).group(1)
+    primary = re.search(rf'PRIMARY\s+KEY\s*\(\s*(\w+)\s*,\s*{key}\s*\)', statement, re.IGNORECASE)
+    row_id = primary.group(1)
+    statement = statement[:primary.start()] + f'PRIMARY KEY ({key}, {row_id})' + statement[primary.end():]
+    statement = re.sub(r'\s+AUTO_INCREMENT\b', '', statement, flags=re.IGNORECASE)
+    return [sqlite_statement(statement) + ' WITHOUT ROWID',
+            f'CREATE INDEX idx_{table}_{row_id} ON {table}({row_id})']
+
+
+def sqlite_schema(install_sql=INSTALL_SQL):
+    """CREATE TABLE / CREATE INDEX statements of install.sql, in SQLite syntax
+    (or of install_partitioned.sql, see sqlite_partitioned_table())"""
+    with open(install_sql, encoding='utf-8') as f:
+        text = f.read()
+    # Everything after DELIMITER is triggers, procedures and events
+    text = text.split('DELIMITER', 1)[0]
+    text = re.sub(r'--[^\n]*', '', text)
+
+    statements = []
+    for statement in text.split(';'):
+        statement = statement.strip()
+        if re.match(r'CREATE\s+TABLE', statement, re.IGNORECASE) and _PARTITION_BY.search(statement):
+            statements.extend(sqlite_partitioned_table(statement))
+        elif re.match(r'CREATE\s+(TABLE|INDEX)', statement, re.IGNORECASE):
+            statements.append(sqlite_statement(statement))
+    return statements
+
+
+def _split_statements(text, delimiter):
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.DOTALL)
+    text = re.sub(r'--[^\n]*', '', text)
+    return [statement.strip() for statement in text.split(delimiter) if statement.strip()]
+
+
+def install_phases(install_sql=INSTALL_SQL):
+    """The statements of install.sql (MariaDB syntax) in the phases of a bulk load.
+
+    'pre_data' creates the schema and the tables, 'post_data' the secondary
+    indexes, 'constraints' the triggers, procedures and events.
+    """
+    with open(install_sql, encoding='utf-8') as f:
+        text = f.read()
+    head, _, rest = text.partition('DELIMITER $$')
+    body, _, tail = rest.partition('DELIMITER ;')
+    phases = {'pre_data': [], 'post_data': [], 'constraints': []}
+    for statement in _split_statements(head, ';'):
+        index = re.match(r'CREATE\s+(UNIQUE\s+)?INDEX', statement, re.IGNORECASE)
+        phases['post_data' if index else 'pre_data'].append(statement)
+    # Some trigger bodies end in 'END;' before the $$ delimiter
+    phases['constraints'] = [statement.rstrip(';').rstrip()
+                             for statement in _split_statements(body, '$$')]
+    phases['constraints'].extend(_split_statements(tail, ';'))
+    return phases
+
+
+# The triggers of install.sql that guard ticket sales and reviews, in SQLite
+# syntax (SIGNAL becomes RAISE(ABORT)). Created by Database.add_triggers()
+# for tools that exercise them, after the data is loaded.
+SQLITE_TRIGGERS = [
+    """CREATE TRIGGER trg_ticket_vip_insert
+       BEFORE INSERT ON ticket
+       FOR EACH ROW WHEN NEW.ticket_category = 'VIP'
+       BEGIN
+         SELECT RAISE(ABORT, 'Cannot issue VIP ticket: would exceed 10% of stage capacity.')
+         WHERE (SELECT COUNT(*) FROM ticket t
+                WHERE t.event_id = NEW.event_id AND t.ticket_category = 'VIP') + 1
+             > (SELECT CAST(s.capacity * 0.10 AS INTEGER)
+                FROM event ev JOIN stage s ON ev.stage_id = s.stage_id
+                WHERE ev.event_id = NEW.event_id);
+       END""",
+    """CREATE TRIGGER check_ticket_review
+       BEFORE INSERT ON review
+       FOR EACH ROW
+       BEGIN
+         SELECT RAISE(ABORT, 'Ticket not activated, visitor cannot review')
+         WHERE (SELECT t.activated FROM ticket t
+                JOIN performance p ON p.event_id = t.event_id
+                WHERE p.performance_id = NEW.performance_id AND t.visitor_id = NEW.visitor_id
+                LIMIT 1) = FALSE;
+       END""",
+]
+
+# The helper tables of the performance rule triggers (install.sql), filled
+# by their maintenance triggers or CALL rebuild_rule_helpers()
+RULE_HELPER_TABLES = ['artist_participation', 'group_participation', 'stage_schedule', 'artist_schedule']
+
+# rebuild_rule_helpers() of install.sql in SQLite syntax, run by
+# Database.fill_rule_helpers()
+SQLITE_RULE_HELPERS = [
+    """INSERT INTO artist_participation (artist_id, year, performances)
+       SELECT pm.artist_id, YEAR(e.event_date), COUNT(*)
+       FROM performance_members pm
+       JOIN performance p ON pm.performance_id = p.performance_id
+       JOIN event e ON p.event_id = e.event_id
+       WHERE pm.artist_id IS NOT NULL AND e.event_date IS NOT NULL
+       GROUP BY pm.artist_id, YEAR(e.event_date)""",
+    """INSERT INTO group_participation (group_id, year, performances)
+       SELECT pm.group_id, YEAR(e.event_date), COUNT(*)
+       FROM performance_members pm
+       JOIN performance p ON pm.performance_id = p.performance_id
+       JOIN event e ON p.event_id = e.event_id
+       WHERE pm.group_id IS NOT NULL AND e.event_date IS NOT NULL
+       GROUP BY pm.group_id, YEAR(e.event_date)""",
+    """INSERT INTO stage_schedule (performance_id, event_id, stage_id, event_date, start_time, end_time)
+       SELECT p.performance_id, e.event_id, e.stage_id, e.event_date,
+              p.start_time, ADDTIME(p.start_time, p.duration)
+       FROM performance p JOIN event e ON p.event_id = e.event_id""",
+    """INSERT INTO artist_schedule (performance_members_id, artist_id, performance_id, start_time, end_time)
+       SELECT pm.performance_members_id, pm.artist_id, pm.performance_id,
+              p.start_time, ADDTIME(p.start_time, p.duration)
+       FROM performance_members pm JOIN performance p ON pm.performance_id = p.performance_id
+       WHERE pm.artist_id IS NOT NULL""",
+]
+
+
+class Database:
+    """A connection to SQLite (the default stand-in) or MariaDB.
+
+    Queries are written for MariaDB; execute() and explain() translate them
+    when running on SQLite.
+    """
+
+    def __init__(self, connection, engine, placeholder):
+        self.connection = connection
+        self.engine = engine
+        self.placeholder = placeholder
+
+    @classmethod
+    def sqlite(cls, path=':memory:', install_sql=INSTALL_SQL, today=None, timeout=5.0):
+        """Open a SQLite database; a new one gets the install.sql tables
+        (none if 'install_sql' is None).
+
+        'timeout' is how long a statement waits for another connection's lock.
+        """
+        connection = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+        for name, args, function in _sqlite_functions(today or date.today()):
+            connection.create_function(name, args, function, deterministic=True)
+        database = cls(connection, 'sqlite', '?')
+        exists = connection.execute("SELECT count(*) FROM sqlite_master WHERE type = 'table'").fetchone()[0]
+        if not exists and install_sql:
+            for statement in sqlite_schema(install_sql):
+                connection.execute(statement)
+            connection.commit()
+        return database
+
+    @classmethod
+    def mariadb(cls, **connect_args):
+        """Connect to a MariaDB server whose database already has install.sql"""
+        try:
+            import mariadb
+        except ImportError:
+            try:
+                import pymysql as mariadb
+            except ImportError:
+                raise ImportError('--engine mariadb needs the mariadb or pymysql package '
+                                  '(pip install mariadb)') from None
+        connection = mariadb.connect(**connect_args)
+        return cls(connection, 'mariadb', '%s')
+
+    @property
+    def version(self):
+        if self.engine == 'sqlite':
+            return sqlite3.sqlite_version
+        return self.execute('SELECT VERSION()')[0][0]
+
+    def add_triggers(self):
+        """Create the ticket and review triggers (SQLite; MariaDB has install.sql's)"""
+        if self.engine == 'sqlite':
+            for statement in SQLITE_TRIGGERS:
+                self.connection.execute(statement)
+            self.connection.commit()
+
+    def fill_rule_helpers(self):
+        """Fill the helper tables of the performance rule triggers from the
+        loaded rows (CALL rebuild_rule_helpers() on MariaDB)"""
+        if self.engine == 'sqlite':
+            for table in RULE_HELPER_TABLES:
+                self.connection.execute(f'DELETE FROM {table}')
+            for statement in SQLITE_RULE_HELPERS:
+                self.connection.execute(statement)
+        else:
+            self.execute('CALL rebuild_rule_helpers()')
+        self.connection.commit()
+
+    def _translate(self, sql):
+        return to_sqlite(sql) if self.engine == 'sqlite' else sql
+
+    def execute(self, sql, params=()):
+        """Run one statement and return all of its rows"""
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(self._translate(sql), params)
+            return cursor.fetchall() if cursor.description else []
+        finally:
+            cursor.close()
+
+    def explain(self, sql):
+        """The query plan, one line per row of EXPLAIN"""
+        if self.engine == 'sqlite':
+            rows = self.execute('EXPLAIN QUERY PLAN ' + sql)
+            depth = {0: -1}
+            lines = []
+            for node, parent, _, detail in rows:
+                depth[node] = depth.get(parent, -1) + 1
+                lines.append('  ' * depth[node] + detail)
+            return lines
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute('EXPLAIN ' + sql)
+            names = [column[0] for column in cursor.description]
+            return [', '.join(f'{n}={v}' for n, v in zip(names, row)) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+    def run_script(self, path):
+        """Run a file of ';'-terminated statements (e.g. sql/load.sql)"""
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+        if self.engine == 'sqlite':
+            self.connection.executescript(text)
+        else:
+            cursor = self.connection.cursor()
+            for statement in re.split(r';\s*\n', text):
+                if statement.strip():
+                    cursor.execute(statement)
+            cursor.close()
+        self.connection.commit()
+
+    def clear(self):
+        """Delete the rows of every generated table, children first, and of
+        the rule helper tables"""
+        cursor = self.connection.cursor()
+        if self.engine == 'mariadb':
+            cursor.execute('SET foreign_key_checks = 0')
+        for table in reversed(list(TABLE_COLUMNS)):
+            cursor.execute(f'DELETE FROM {table}')
+        for table in RULE_HELPER_TABLES:
+            cursor.execute(f'DELETE FROM {table}')
+        if self.engine == 'mariadb':
+            cursor.execute('SET foreign_key_checks = 1')
+        cursor.close()
+        self.connection.commit()
+
+    def load_tables(self, tables, batch_size=1000):
+        """Insert (name, rows) pairs, e.g. DataGenerator.tables(), in order.
+
+        Returns {table: seconds}.
+        """
+        timings = {}
+        if self.engine == 'mariadb':
+            self.execute('SET foreign_key_checks = 0')
+        for table, rows in tables:
+            start = datetime.now()
+            self.insert_rows(table, row_values(table, rows), batch_size)
+            self.connection.commit()
+            timings[table] = (datetime.now() - start).total_seconds()
+        if self.engine == 'mariadb':
+            self.execute('SET foreign_key_checks = 1')
+        return timings
+
+    def insert_rows(self, table, values, batch_size=1000, columns=None):
+        """Insert row value tuples (in TABLE_COLUMNS order, or in that of
+        'columns') with executemany, 'batch_size' rows per call. Does not
+        commit; returns the row count.
+        """
+        columns = columns or TABLE_COLUMNS[table]
+        names = [name for name, _ in columns]
+        statement = (f"INSERT INTO {table} ({', '.join(names)}) "
+                     f"VALUES ({', '.join([self.placeholder] * len(names))})")
+        convert = self._converters(columns)
+        cursor = self.connection.cursor()
+        count = 0
+        batch = []
+        for row in values:
+            batch.append(tuple(c(v) for c, v in zip(convert, row)) if convert else row)
+            if len(batch) == batch_size:
+                cursor.executemany(statement, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(statement, batch)
+            count += len(batch)
+        cursor.close()
+        return count
+
+    def _converters(self, columns):
+        # The MariaDB drivers take dates and timedeltas as they are
+        if self.engine != 'sqlite':
+            return None
+        convert = {'date': _sqlite_date, 'time': _sqlite_time, 'bool': _sqlite_bool}
+        kinds = [kind.rstrip('?') for _, kind in columns]
+        if not any(kind in convert for kind in kinds):
+            return None
+        return [convert.get(kind, _same) for kind in kinds]
+
+    def close(self):
+        self.connection.close()
+
+
+def _same(value):
+    return value
+
+
+def _sqlite_date(value):
+    return None if value is None else value.isoformat()
+
+
+def _sqlite_time(value):
+    if value is None:
+        return None
+    return str(value) if isinstance(value, timedelta) else value
+
+
+def _sqlite_bool(value):
+    return None if value is None else int(value)
+
+
+def connect(engine='sqlite', path=':memory:', today=None, timeout=5.0, **connect_args):
+    """Open a Database: SQLite at 'path', or MariaDB with the driver's connect arguments"""
+    if engine == 'sqlite':
+        return Database.sqlite(path, today=today, timeout=timeout)
+    return Database.mariadb(**connect_args)
+
+
+def add_connection_arguments(parser):
+    """The --engine and MariaDB connection options shared by the command line tools"""
+    parser.add_argument('--engine', choices=['sqlite', 'mariadb'], default='sqlite',
+                        help='sqlite runs offline on the install.sql tables (default; only load_test.py '
+                             'and bulk_loader.py add triggers); '
+                             'mariadb needs a server with install.sql loaded')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=3306)
+    parser.add_argument('--user', default='root')
+    parser.add_argument('--password', default='')
+    parser.add_argument('--database', default='music_festival')
+
+
+def connect_from_args(args, path=':memory:', today=None):
+    if args.engine == 'sqlite':
+        return connect('sqlite', path, today=today)
+    return connect('mariadb', host=args.host, port=args.port, user=args.user,
+                   password=args.password, database=args.database)
@@ -0,0 +1,322 @@
+import argparse
+import heapq
+import json
+import os
+import random
+import socket
+import sys
+import time
+from array import array
+from collections import Counter
+from datetime import date
+
+from generate_data import DataGenerator, build_dataset, derive_seed, read_previous, scaled_counts
+from skew import parse_skew
+from writers import open_compressed
+
+# A generated dataset replayed as the stream of things that happened to it,
+# in time order, the way an ingest pipeline would receive them:
+#
+#   purchase    a ticket bought (on its purchase_date)
+#   listing     an unactivated ticket put up for resale by its holder
+#   interest    a resale_interest row (expressed_on)
+#   activation  a ticket scanned at the gates of its event
+#   review      a review, some time after the end of its performance
+#
+# purchase_date is a day and reviews have no time at all, so the feed draws
+# the times of day, the listings and the review times from seeds derived
+# from the dataset's seed: the same dataset always gives the same feed.
+#
+# Every kind of record is one stream, sorted by a packed int64 per row (the
+# timestamp in seconds, and the row number in the low ROW_BITS bits), and
+# the streams are merged lazily: the feed adds 8 bytes per row to the
+# generated tables and builds one record at a time, however long it runs.
+
+KINDS = ('purchase', 'listing', 'interest', 'activation', 'review')
+
+ROW_BITS = 26
+EVENT_START = 18 * 3600       # the first performance of an event
+GATES_OPEN = 2 * 3600         # tickets are activated in the 2 hours before it
+LISTINGS_CLOSE = 2 * 3600     # and can be listed until then
+REVIEW_WINDOW = 2 * 86400     # reviews come within 2 days of the performance
+
+
+def _day_start(value):
+    return date.fromisoformat(str(value)[:10]).toordinal() * 86400
+
+
+def _timestamp(seconds):
+    day, seconds = divmod(seconds, 86400)
+    return (f'{date.fromordinal(day).isoformat()} '
+            f'{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}')
+
+
+def _sorted_stream(kind, keys, record):
+    # keys: (seconds, row) pairs; yields (seconds, kind, record) in time order
+    packed = array('q')
+    for seconds, row in keys:
+        packed.append(seconds << ROW_BITS | row)
+    packed = array('q', sorted(packed))
+    mask = (1 << ROW_BITS) - 1
+    for value in packed:
+        yield value >> ROW_BITS, kind, record(value & mask)
+
+
+def _fields(table, row, columns, names=None):
+    # decode just these columns of a record_store.Table row
+    values = []
+    for column in columns:
+        value, decode = table.columns[column][row], table.decoders[column]
+        values.append(value if decode is None else decode(value))
+    return dict(zip(names or columns, values))
+
+
+class EventFeed:
+    """The records of a DataGenerator's tables as (seconds, kind, record),
+    in time order.
+
+    'listing_share' of the unactivated tickets bought before their event's
+    day are listed for resale between their purchase and the event.
+    """
+
+    def __init__(self, generator, listing_share=0.05, kinds=KINDS):
+        for table in (generator.tickets, generator.resale_interest, generator.reviews):
+            if len(table) >> ROW_BITS:
+                raise ValueError(f'{table.name}: more than {1 << ROW_BITS} rows')
+        self.generator = generator
+        self.listing_share = listing_share
+        self.kinds = kinds
+        self.event_start = {e['event_id']: _day_start(e['event_date']) + EVENT_START for e in generator.events}
+
+    def _rng(self, kind):
+        return random.Random(derive_seed(self.generator.seed, 'feed', kind))
+
+    def _purchase_times(self):
+        # purchase_date (stored as a day number) plus a time of day; a ticket
+        # bought on its event's day is bought before the event starts
+        rng = self._rng('purchase')
+        tickets = self.generator.tickets
+        for row, (event_id, day) in enumerate(zip(tickets.columns['event_id'], tickets.columns['purchase_date'])):
+            day *= 86400
+            yield day + rng.randrange(max(1, min(86400, self.event_start[event_id] - day))), row
+
+    def purchases(self):
+        columns = ['ticket_id', 'event_id', 'visitor_id', 'ticket_category', 'price', 'payment_method', 'ean_code']
+        return _sorted_stream('purchase', self._purchase_times(),
+                              lambda row: _fields(self.generator.tickets, row, columns))
+
+    def listings(self):
+        rng = self._rng('listing')
+        tickets = self.generator.tickets
+        activated = tickets.columns['activated']
+        event_ids = tickets.columns['event_id']
+
+        def keys():
+            for bought, row in self._purchase_times():
+                if activated[row] or rng.random() >= self.listing_share:
+                    continue
+                closes = self.event_start[event_ids[row]] - LISTINGS_CLOSE
+                if closes > bought + 1:
+                    yield rng.randrange(bought + 1, closes), row
+        return _sorted_stream('listing', keys(), lambda row: _fields(
+            tickets, row, ['ticket_id', 'visitor_id', 'event_id', 'ticket_category'],
+            ['ticket_id', 'listed_by', 'event_id', 'ticket_category']))
+
+    def interest(self):
+        interest = self.generator.resale_interest
+        keys = ((seconds, row) for row, seconds in enumerate(interest.columns['expressed_on']))
+
+        def record(row):
+            # interest_id numbers the rows in load order, as AUTO_INCREMENT does
+            return dict(interest_id=row + 1, **_fields(interest, row, ['interested_visitor_id', 'event_id',
+                                                                       'ticket_category']))
+        return _sorted_stream('interest', keys, record)
+
+    def activations(self):
+        rng = self._rng('activation')
+        tickets = self.generator.tickets
+        keys = ((self.event_start[event_id] - GATES_OPEN + rng.randrange(GATES_OPEN), row)
+                for row, (event_id, activated) in enumerate(zip(tickets.columns['event_id'],
+                                                                tickets.columns['activated'])) if activated)
+        return _sorted_stream('activation', keys,
+                              lambda row: _fields(tickets, row, ['ticket_id', 'event_id', 'visitor_id']))
+
+    def reviews(self):
+        rng = self._rng('review')
+        performances = self.generator.performances
+        ends = dict(zip(performances.columns['performance_id'],
+                        map(sum, zip(performances.columns['start_time'], performances.columns['duration']))))
+        reviews = self.generator.reviews
+        keys = ((ends[pid] + rng.randrange(REVIEW_WINDOW), row)
+                for row, pid in enumerate(reviews.columns['performance_id']))
+        return _sorted_stream('review', keys, lambda row: _fields(reviews, row, reviews.names))
+
+    def __iter__(self):
+        streams = {'purchase': self.purchases, 'listing': self.listings, 'interest': self.interest,
+                   'activation': self.activations, 'review': self.reviews}
+        return heapq.merge(*(streams[kind]() for kind in self.kinds), key=lambda item: item[0])
+
+
+class NdjsonSink:
+    """One JSON record per line to 'path' ('-' for stdout, .gz/.zst
+    compressed), or to path-00000.ndjson, ... of 'split' records each"""
+
+    def __init__(self, path, split=None):
+        self.path = path
+        self.split = split
+        self.file = None
+        self.written = 0
+        self.files = []
+
+    def _open(self):
+        if self.path == '-':
+            return sys.stdout
+        path = self.path
+        if self.split:
+            stem, suffix = self.path.split('.', 1) if '.' in os.path.basename(self.path) else (self.path, 'ndjson')
+            path = f'{stem}-{len(self.files):05d}.{suffix}'
+        self.files.append(path)
+        return open_compressed(path, 'w')
+
+    def write(self, record):
+        if self.file is None or (self.split and self.written % self.split == 0):
+            self.close()
+            self.file = self._open()
+        self.file.write(json.dumps(record, default=str) + '\n')
+        self.written += 1
+
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+
+    def close(self):
+        if self.file is not None and self.file is not sys.stdout:
+            self.file.close()
+        self.file = None
+
+
+class SocketSink:
+    """Newline-delimited JSON over a TCP connection to 'host:port' or a Unix
+    socket path; every record gets the wall time it was sent ('sent_at'), to
+    measure the end-to-end latency downstream"""
+
+    def __init__(self, address):
+        if os.path.exists(address) or ':' not in address:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(address)
+        else:
+            host, port = address.rsplit(':', 1)
+            self.socket = socket.create_connection((host, int(port)))
+        self.file = self.socket.makefile('w', encoding='utf-8', newline='\n')
+
+    def write(self, record):
+        record['sent_at'] = time.time()
+        self.file.write(json.dumps(record, default=str) + '\n')
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+
+class QueueSink:
+    """Put the records on a queue.Queue for an in-process consumer, with
+    'sent_at' like SocketSink; None marks the end of the feed. A bounded
+    queue holds the feed back while the consumer is behind."""
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def write(self, record):
+        record['sent_at'] = time.time()
+        self.queue.put(record)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.queue.put(None)
+
+
+def replay(feed, sink, speed=None, limit=None):
+    """Write the feed to 'sink', 'speed' feed seconds per wall clock second
+    (as fast as possible if None). Returns counts, rates and how far the
+    replay fell behind its schedule."""
+    counts = Counter()
+    started = time.perf_counter()
+    first = None
+    behind = 0.0
+    try:
+        for seconds, kind, record in feed:
+            if limit is not None and sum(counts.values()) >= limit:
+                break
+            if speed:
+                first = seconds if first is None else first
+                wait = (seconds - first) / speed - (time.perf_counter() - started)
+                if wait > 0:
+                    # send what is buffered before idling, so it is not held back
+                    sink.flush()
+                    time.sleep(wait)
+                else:
+                    behind = max(behind, -wait)
+            sink.write(dict(type=kind, at=_timestamp(seconds), **record))
+            counts[kind] += 1
+    finally:
+        sink.close()
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    return {
+        'records': total,
+        'by_type': dict(counts),
+        'seconds': round(elapsed, 3),
+        'records_per_sec': round(total / elapsed) if elapsed else None,
+        'max_behind_seconds': round(behind, 3),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay a generated dataset as a time-ordered feed of ticket '
+                                                 'purchases, resale listings and interest, activations and reviews')
+    parser.add_argument('previous', nargs='*', metavar='DIR',
+                        help='tsv/csv outputs to replay (a full dataset, then any yearly deltas); '
+                             'without them a dataset is generated in memory')
+    parser.add_argument('--scale', type=float, default=1)
+    parser.add_argument('--seed', type=int, default=42,
+                        help='seed of the generated dataset, and of the times drawn for the feed')
+    parser.add_argument('--skew', type=parse_skew, help='generate with skewed popularity (see generate_data.py)')
+    parser.add_argument('--output', default='feed.ndjson',
+                        help="NDJSON file ('-' for stdout, .gz or .zst to compress; default feed.ndjson)")
+    parser.add_argument('--split', type=int, metavar='N', help='write files of N records each: <output>-00000.ndjson, ...')
+    parser.add_argument('--socket', metavar='ADDRESS',
+                        help='send to host:port (TCP) or a Unix socket path instead of a file')
+    parser.add_argument('--speed', type=float,
+                        help='feed seconds replayed per second, e.g. 3600 for an hour per second '
+                             '(default: as fast as possible)')
+    parser.add_argument('--types', type=lambda text: tuple(text.split(',')), default=KINDS,
+                        help=f"record types to include (default {','.join(KINDS)})")
+    parser.add_argument('--listing-share', type=float, default=0.05,
+                        help='share of the unactivated tickets listed for resale (default 0.05)')
+    parser.add_argument('--limit', type=int, help='stop after this many records')
+    args = parser.parse_args()
+    unknown = set(args.types) - set(KINDS)
+    if unknown:
+        parser.error(f"unknown record types {', '.join(sorted(unknown))}, expected some of {', '.join(KINDS)}")
+
+    if args.previous:
+        generator = DataGenerator(seed=args.seed)
+        generator.load_state(read_previous(args.previous))
+    else:
+        generator = build_dataset(scaled_counts(args.scale), seed=args.seed, skew=args.skew)
+    sink = SocketSink(args.socket) if args.socket else NdjsonSink(args.output, split=args.split)
+    report = replay(EventFeed(generator, listing_share=args.listing_share, kinds=args.types),
+                    sink, speed=args.speed, limit=args.limit)
+    where = args.socket or (', '.join(sink.files[:3]) + (' ...' if len(sink.files) > 3 else '')
+                            if sink.files else 'stdout')
+    print(f"{report['records']:,} records to {where} in {report['seconds']:.2f}s "
+          f"({report['records_per_sec'] or 0:,}/sec)", file=sys.stderr)
+    for kind, count in report['by_type'].items():
+        print(f'  {kind:<11}{count:>10,}', file=sys.stderr)
+    if args.speed:
+        print(f"at most {report['max_behind_seconds']:.3f}s behind schedule", file=sys.stderr)
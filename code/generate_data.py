@@ -1,15 +1,237 @@
+import argparse
+import hashlib
+import importlib.util
+import math
+import multiprocessing
+import os
 import random
+import sys
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, islice
 from datetime import datetime, date, timedelta, time
-from collections import defaultdict
-from faker import Faker
+from collections import Counter, defaultdict
+from record_store import Table
+from skew import SKEW_KINDS, parse_skew, zipf_weights
+from ticket_allocator import TicketAllocator
+from value_pool import POOL_SIZE, ValuePool, ean13, unique_email
+from writers import SqlWriter, DelimitedWriter, ShardedWriter, read_directory
+from partitioning import PartitionedWriter, generator_years, row_years
 
 #This is our python dummy data generator.
 
-fake = Faker()
 random.seed(42)  # For reproducible results
 
+_fake = None
+
+
+def _get_fake():
+    # Faker is imported and set up on first use: the sharded tables draw
+    # from value pools, so pool workers never need it
+    global _fake
+    if _fake is None:
+        from faker import Faker
+        _fake = Faker()
+    return _fake
+
+
+def _seed_fake(seed):
+    from faker import Faker
+    Faker.seed(seed)
+
+
+# Row counts at scale factor 1. Festivals are one per year (festival.year is
+# UNIQUE), so they do not grow with the scale factor.
+BASE_COUNTS = {
+    'locations': 10,
+    'festivals': 10,
+    'stages': 30,
+    'artists': 50,
+    'groups': 10,
+    'visitors': 150,
+    'tickets': 400,
+    'staff': 50,
+}
+
+
+def scaled_counts(scale=1):
+    """Row counts for a TPC-H style scale factor.
+
+    People and sales grow linearly with the scale. Venues grow in two
+    directions at once, more stages/events and bigger stages, each by
+    sqrt(scale), so total capacity (and with it the VIP caps and staff
+    needed per event) keeps the same ratio to ticket demand at every scale.
+    """
+    venue = math.sqrt(scale)
+    counts = {name: max(1, round(count * scale)) for name, count in BASE_COUNTS.items()}
+    counts['festivals'] = BASE_COUNTS['festivals']
+    counts['stages'] = max(1, round(BASE_COUNTS['stages'] * venue))
+    counts['venue_scale'] = venue
+    return counts
+
+# --- Sharded generation ---
+#
+# Tables whose rows do not depend on each other are generated in shards that
+# can run in a process pool. Every shard (a fixed id range, or one event) gets
+# its own seed derived from the master seed, so the output is the same
+# whatever the number of workers. Faker values come from value pools (see
+# value_pool) that every process builds the same way.
+
+SHARD_SIZE = 2000        # rows per shard for the entity tables
+EVENTS_PER_TASK = 64     # events handed to a worker at once
+
+# EAN-13 codes are this prefix (2: in-store numbering) plus the ticket id
+EAN_PREFIX = 2 * 10 ** 11
+
+
+def derive_seed(master_seed, *parts):
+    """Derive a stable per-shard seed from the master seed and a shard key"""
+    key = repr((master_seed,) + parts).encode()
+    return int.from_bytes(hashlib.sha256(key).digest()[:8], 'big')
+
+
+def _location_shard(seed, first_id, count, pool, continents):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(first_id, first_id + count):
+        rows.append({
+            'location_id': i,
+            'address': pool.choice(rng, 'address'),
+            'latitude': round(rng.uniform(-90, 90), 6),
+            'longitude': round(rng.uniform(-180, 180), 6),
+            'city': pool.choice(rng, 'city'),
+            'country': pool.choice(rng, 'country'),
+            # One location per continent first, the rest at random
+            'continent': continents[i - 1] if i <= len(continents) else rng.choice(continents)
+        })
+    return rows
+
+
+def _artist_shard(seed, first_id, count, pool, today):
+    rng = random.Random(seed)
+    # Born 18 to 60 years ago
+    oldest = today.replace(year=today.year - 61).toordinal() + 1
+    youngest = today.replace(year=today.year - 18).toordinal()
+    rows = []
+    for i in range(first_id, first_id + count):
+        rows.append({
+            'artist_id': i,
+            'name': pool.choice(rng, 'name'),
+            'stage_name': pool.choice(rng, 'user_name'),
+            'dob': date.fromordinal(rng.randint(oldest, youngest)),
+            'website': pool.choice(rng, 'url'),
+            'instagram': f"@{pool.choice(rng, 'user_name')}",
+            'photo': f'artist_{i}.jpg'
+        })
+    return rows
+
+
+def _visitor_shard(seed, first_id, count, pool):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(first_id, first_id + count):
+        rows.append({
+            'visitor_id': i,
+            'first_name': pool.choice(rng, 'first_name'),
+            'last_name': pool.choice(rng, 'last_name'),
+            'email': unique_email(pool, rng, i),
+            'phone': pool.choice(rng, 'phone_number'),
+            'age': rng.randint(18, 80)
+        })
+    return rows
+
+
+def _staff_shard(seed, first_id, roles, pool):
+    rng = random.Random(seed)
+    exp_levels = ['intern', 'junior', 'average', 'experienced', 'senior']
+    rows = []
+    for i, role in enumerate(roles, first_id):
+        rows.append({
+            'staff_id': i,
+            'name': pool.choice(rng, 'name'),
+            'age': rng.randint(18, 65),
+            'staff_role': role,
+            'experience_level': rng.choice(exp_levels)
+        })
+    return rows
+
+
+def _ticket_events_task(tasks):
+    return [_ticket_event_shard(*task) for task in tasks]
+
+
+def _ticket_event_shard(seed, event_id, event_date, vip_quota, buyers, interested, today, now):
+    """Tickets (without ids and EAN codes) and resale interest of one event"""
+    rng = random.Random(seed)
+
+    # --- FIXED date range logic ---
+    if event_date > today:
+        end_date = today
+        start_date = today - timedelta(days=180)
+    else:
+        end_date = event_date
+        start_date = event_date - timedelta(days=180)
+    if start_date >= end_date:
+        start_date = end_date - timedelta(days=1)
+    # ------------------------------
+
+    first_day = start_date.toordinal()
+    last_day = end_date.toordinal()
+
+    tickets = []
+    # VIP allocation, within what is left of the event's 10% quota
+    for visitor_id in buyers:
+        is_vip = vip_quota > 0 and rng.random() < 0.1
+        tickets.append({
+            'event_id': event_id,
+            'visitor_id': visitor_id,
+            'ticket_category': 'VIP' if is_vip else rng.choice(['general', 'backstage']),
+            'price': round(rng.uniform(200, 500), 2) if is_vip else round(rng.uniform(50, 200), 2),
+            'purchase_date': date.fromordinal(rng.randint(first_day, last_day)).strftime('%Y-%m-%d'),
+            'payment_method': rng.choice(['credit_card', 'debit_card', 'bank_transfer']),
+            'activated': rng.choice([True, False])
+        })
+        if is_vip:
+            vip_quota -= 1
+
+    # Sold-out → resale_interest
+    interest = []
+    for visitor_id in interested:
+        category = 'VIP' if rng.random() < 0.1 else rng.choice(['general', 'backstage'])
+        interest.append({
+            'interested_visitor_id': visitor_id,
+            'event_id': event_id,
+            'ticket_category': category,
+            # pick a random datetime between 90 days before today and now:
+            'expressed_on': (now - timedelta(seconds=rng.randint(0, 90 * 86400)))
+                                  .strftime('%Y-%m-%d %H:%M:%S')
+        })
+    return tickets, interest
+
+
+def _review_events_task(tasks):
+    return [_review_event_shard(*task) for task in tasks]
+
+
+def _review_event_shard(seed, activated_count, performance_count):
+    """Review candidates for the activated tickets of one event.
+
+    Returns one entry per activated ticket: None, or a tuple of an index into
+    the event's performances and the five scores.
+    """
+    rng = random.Random(seed)
+    candidates = []
+    for _ in range(activated_count):
+        if rng.random() < 0.7 and performance_count:
+            candidates.append((rng.randrange(performance_count),
+                               rng.randint(1, 5), rng.randint(1, 5), rng.randint(1, 5),
+                               rng.randint(1, 5), rng.randint(1, 5)))
+        else:
+            candidates.append(None)
+    return candidates
+
+
 class DataGenerator:
-    def __init__(self):
+    def __init__(self, seed=42, workers=1, skew=None):
         # Initialize all data containers
         self.festivals = []
         self.locations = []
@@ -22,27 +244,80 @@ class DataGenerator:
         self.artist_group_members = []
         self.genres = []
         self.artist_genres = []
-        self.performances = []
-        self.visitors = []
-        self.tickets = []
-        self.reviews = []
+        # The large tables are kept column by column (see record_store)
+        self.performances = Table('Performance')
+        self.performance_members = Table('performance_members')
+        self.visitors = Table('Visitor')
+        self.tickets = Table('Ticket')
+        self.reviews = Table('Review')
         self.staff = []
-        self.staff_assignments = []
-        self.resale_interest = []
+        self.staff_assignments = Table('Staff_Assignment')
+        self.resale_interest = Table('resale_interest')
         self.group_performance_years = defaultdict(list)
         
         # Track artist performance history
         self.artist_performance_years = defaultdict(list)
+        self.artist_bookings = defaultdict(list)   # (artist_id, date) -> (start, end)
         self.festival_years = {}  # Maps festival_id to year
+        self.loaded = {}          # table -> rows taken over by load_state()
+
+        # Master seed for the sharded tables and the process pool running them
+        self.seed = seed
+        self.workers = workers
+        self._pool = None
+
+        # Zipf exponents of event demand, artist bookings and visitor
+        # activity (see skew.py); 0 draws uniformly
+        self.skew = dict.fromkeys(SKEW_KINDS, 0.0)
+        self.skew.update(skew or {})
+
+        # Fixed reference time, so that a run does not depend on the clock
+        # ticking while it generates
+        self.today = date.today()
+        self.now = datetime.combine(self.today, time(0, 0))
+
+    def _map(self, func, tasks):
+        """Run func over tasks, in the process pool when there is more than one worker"""
+        if self.workers > 1 and len(tasks) > 1:
+            if self._pool is None:
+                self._pool = multiprocessing.Pool(self.workers)
+            return self._pool.starmap(func, tasks)
+        return [func(*task) for task in tasks]
+
+    def _id_shards(self, table, first_id, count):
+        """Split ids first_id..first_id+count-1 into (seed, first id, count) shards"""
+        return [
+            (derive_seed(self.seed, table, start), start, min(SHARD_SIZE, first_id + count - start))
+            for start in range(first_id, first_id + count, SHARD_SIZE)
+        ]
+
+    def _skew_weights(self, kind, items):
+        """{item: weight} for a skewed 'kind', None when it is uniform"""
+        if not self.skew[kind]:
+            return None
+        return zipf_weights(items, self.skew[kind], derive_seed(self.seed, 'skew', kind))
+
+    def _pool_for(self, count):
+        """Value pool for a table of 'count' rows; small tables get small pools"""
+        return ValuePool(derive_seed(self.seed, 'pool'), size=min(POOL_SIZE, max(count, 100)))
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
 
     def generate_festivals(self, count=10):
-        current_year = datetime.now().year
-        # Generate 8 past years and 2 future years
-        past_years = [current_year - i for i in range(1, 9)]  # Last 8 years
-        future_years = [current_year + 1, current_year + 2]
+        fake = _get_fake()
+        current_year = self.today.year
+        # Generate 2 future years and count-2 past years (8 by default)
+        future_count = min(2, count)
+        past_years = [current_year - i for i in range(1, count - future_count + 1)]
+        future_years = [current_year + i for i in range(1, future_count + 1)]
         all_years = past_years + future_years
-        
-        assert len(all_years) == count, "Incorrect number of years generated"
+
+        if min(all_years) < 2000:
+            raise ValueError(f"{count} festivals would start before 2000 (festival.year >= 2000)")
         
         for i in range(count):
             year = all_years[i]
@@ -57,23 +332,36 @@ class DataGenerator:
             }
             self.festivals.append(festival)
             self.festival_years[festival['festival_id']] = year
-        
+
+    def generate_next_festival(self):
+        """Add the festival of the year after the latest one and return it"""
+        fake = _get_fake()
+        festival_id = len(self.festivals) + 1
+        year = max(self.festival_years.values()) + 1
+        festival = {
+            'festival_id': festival_id,
+            'location_id': random.choice([loc['location_id'] for loc in self.locations]),
+            'name': f'Pulse University {year}',
+            'year': year,
+            'duration_days': random.randint(1, 7),
+            'poster_image': f'poster_{festival_id}.jpg',
+            'description': fake.sentence()
+        }
+        self.festivals.append(festival)
+        self.festival_years[festival_id] = year
+        return festival
+
     def generate_artists(self, count=50):
         """Generate artists with sequential IDs"""
         self.artists = []
-        for i in range(1, count+1):
-            self.artists.append({
-                'artist_id': i,
-                'name': fake.name(),
-                'stage_name': fake.user_name(),
-                'dob': fake.date_of_birth(minimum_age=18, maximum_age=60),
-                'website': fake.url(),
-                'instagram': f'@{fake.user_name()}',
-                'photo': f'artist_{i}.jpg'
-            })
+        shards = [shard + (self._pool_for(count), self.today)
+                  for shard in self._id_shards('artists', 1, count)]
+        for rows in self._map(_artist_shard, shards):
+            self.artists.extend(rows)
     
     def generate_groups(self, count=10):
         """Generate groups with explicit IDs (AUTO_INCREMENT in DB)"""
+        fake = _get_fake()
         self.groups = []
         for idx in range(count):
             self.groups.append({
@@ -113,35 +401,16 @@ class DataGenerator:
                       'South America', 'Africa', 'Australia']
         self.locations = []
 
-        # Assign one location per continent first
-        for idx, cont in enumerate(continents):
-            if idx >= count:
-                break
-            self.locations.append({
-                'location_id': idx + 1,
-                'address': fake.address(),
-                'latitude': float(fake.latitude()),
-                'longitude': float(fake.longitude()),
-                'city': fake.city(),
-                'country': fake.country(),
-                'continent': cont
-            })
-
-        # Fill remaining slots randomly
-        for i in range(len(self.locations) + 1, count + 1):
-            self.locations.append({
-                'location_id': i,
-                'address': fake.address(),
-                'latitude': float(fake.latitude()),
-                'longitude': float(fake.longitude()),
-                'city': fake.city(),
-                'country': fake.country(),
-                'continent': random.choice(continents)
-            })
+        pool = self._pool_for(count)
+        shards = [shard + (pool, continents) for shard in self._id_shards('locations', 1, count)]
+        for rows in self._map(_location_shard, shards):
+            self.locations.extend(rows)
 
-
-    def generate_stages(self, count=30):
-        used_names = set()
+    def generate_stages(self, count=30, capacity_scale=1, festivals=None):
+        fake = _get_fake()
+        # Stage names are UNIQUE across all festivals
+        used_names = {s['name'] for s in self.stages}
+        festival_ids = [f['festival_id'] for f in festivals or self.festivals]
         for _ in range(count):
             while True:
                 name = f"{fake.color_name()} {fake.street_suffix()}"
@@ -151,10 +420,10 @@ class DataGenerator:
                     
             self.stages.append({
                 'stage_id': len(self.stages) + 1,
-                'festival_id': random.choice([f['festival_id'] for f in self.festivals]),
+                'festival_id': random.choice(festival_ids),
                 'name': name,
                 'description': fake.sentence(),
-                'capacity': random.randint(8, 10),
+                'capacity': round(random.randint(8, 10) * capacity_scale),
                 'image': f'stage_{fake.uuid4()}.jpg'
             })
 
@@ -168,10 +437,10 @@ class DataGenerator:
                 'image': f'{eq.lower()}.jpg'
             })
 
-    def generate_stage_equipment(self):
+    def generate_stage_equipment(self, stages=None):
         equipment_ids = [e['equipment_id'] for e in self.equipment]
     
-        for stage in self.stages:
+        for stage in stages or self.stages:
             # Ensure we don't request more equipment than exists
             num_equipment = random.randint(3, min(6, len(equipment_ids)))  # Never exceed available equipment
         
@@ -210,9 +479,10 @@ class DataGenerator:
                     'genre_id': genre['genre_id']
                 })
 
-    def generate_events(self):
-        event_id = 1
-        for festival in self.festivals:
+    def generate_events(self, events_scale=1, festivals=None):
+        fake = _get_fake()
+        event_id = len(self.events) + 1
+        for festival in festivals or self.festivals:
             festival_id = festival['festival_id']
             # Get stages belonging to this festival
             stages_in_festival = [s for s in self.stages if s['festival_id'] == festival_id]
@@ -220,7 +490,7 @@ class DataGenerator:
                 continue  # Skip if no stages available
             
             used_stage_dates = set()
-            for _ in range(random.randint(5, 10)):
+            for _ in range(round(random.randint(5, 10) * events_scale)):
                 while True:
                     # Select a stage from this festival's stages
                     stage = random.choice(stages_in_festival)
@@ -244,33 +514,67 @@ class DataGenerator:
                 })
                 event_id += 1
 
-    def generate_performances(self):
+    def generate_performances(self, events=None):
+        """Schedule the performances of 'events' (all events by default).
+
+        The performers' history of earlier years counts towards the 4 years
+        in a row rule. The continent guarantee below only runs for a full
+        dataset.
+        """
         performance_types = ['warm up', 'headline', 'special guest']
-        performance_id = 1
-        self.performance_members = []
+        performance_id = len(self.performances) + 1
 
         # Track which artists are in groups
         artists_in_groups = {m['artist_id'] for m in self.artist_group_members}
 
+        # Index group -> member artists once instead of scanning per performance
+        group_members_index = defaultdict(list)
+        artist_groups_index = defaultdict(list)
+        for m in self.artist_group_members:
+            group_members_index[m['group_id']].append(m['artist_id'])
+            artist_groups_index[m['artist_id']].append(m['group_id'])
+
+        # The trigger counts a member's years through all of their groups
+        def group_streak(gid, year):
+            return (self._has_three_consecutive(gid, year, is_artist=False) or
+                    any(self._has_three_consecutive(aid, year, is_artist=True)
+                        for aid in group_members_index[gid]))
+
+        solo_ids = sorted(a['artist_id'] for a in self.artists
+                          if a['artist_id'] not in artists_in_groups)
+        group_ids = sorted(g['group_id'] for g in self.groups)
+
+        # Performers eligible for the current year, kept sorted so that
+        # ('artist', id) entries come before ('group', id) entries, i.e. the
+        # same order the per-event list comprehensions used to produce.
+        performers = []
+        performers_year = None
+
+        # With skewed bookings performers are drawn by weight, from the
+        # running totals of the current performers (rebuilt when they change)
+        weights = self._skew_weights('artists', [('artist', aid) for aid in solo_ids] +
+                                     [('group', gid) for gid in group_ids])
+        cumulative = None
+
         # --- Original random scheduling logic ---
-        for event in self.events:
+        for event in events or self.events:
             fest_id = event['festival_id']
             current_year = self.festival_years[fest_id]
 
-            # Solo artists eligible (not in a group, and no 4-year streak)
-            eligible_solo = [
-                a['artist_id'] for a in self.artists
-                if a['artist_id'] not in artists_in_groups
-                and not self._has_three_consecutive(a['artist_id'], current_year, is_artist=True)
-            ]
-            # Groups eligible (no 4-year streak)
-            eligible_groups = [
-                g['group_id'] for g in self.groups
-                if not self._has_three_consecutive(g['group_id'], current_year, is_artist=False)
-            ]
-
-            performers = [('artist', aid) for aid in eligible_solo] + \
-                         [('group', gid)  for gid in eligible_groups]
+            # Rebuild the eligibility list only when the year changes; within a
+            # year only performers that just played can drop out (see below).
+            if current_year != performers_year:
+                # Solo artists eligible (not in a group, and no 4-year streak)
+                # Groups eligible (no 4-year streak)
+                performers = [
+                    ('artist', aid) for aid in solo_ids
+                    if not self._has_three_consecutive(aid, current_year, is_artist=True)
+                ] + [
+                    ('group', gid) for gid in group_ids
+                    if not group_streak(gid, current_year)
+                ]
+                performers_year = current_year
+                cumulative = None
             if not performers:
                 continue
 
@@ -280,24 +584,43 @@ class DataGenerator:
 
             max_performances = random.randint(3, 5)
             performance_count = 0
+            played = set()
+            busy_draws = 0
 
             while performance_count < max_performances and start_time < end_time:
                 if not performers:
                     break
 
-                performer_type, performer_id = random.choice(performers)
-
-                # Record that this performer has played this year
-                if performer_type == 'artist':
-                    self.artist_performance_years[performer_id].append(current_year)
+                if weights is None:
+                    performer_type, performer_id = random.choice(performers)
                 else:
-                    self.group_performance_years[performer_id].append(current_year)
+                    if cumulative is None:
+                        cumulative = list(accumulate(weights[p] for p in performers))
+                    i = bisect_right(cumulative, random.random() * cumulative[-1])
+                    performer_type, performer_id = performers[min(i, len(performers) - 1)]
 
                 # Pick a duration
                 duration = timedelta(minutes=random.randint(30, 120))
                 if start_time + duration > end_time:
                     break  # Not enough time remaining
 
+                # The artists may be on another stage of the day at that time:
+                # draw again, up to 10 times per event
+                members = [performer_id] if performer_type == 'artist' else group_members_index[performer_id]
+                if not self._artists_free(members, start_time, start_time + duration):
+                    busy_draws += 1
+                    if busy_draws == 10:
+                        break
+                    continue
+                self._book_artists(members, start_time, start_time + duration)
+
+                # Record that this performer has played this year
+                if performer_type == 'group':
+                    self.group_performance_years[performer_id].append(current_year)
+                for artist_id in members:
+                    self.artist_performance_years[artist_id].append(current_year)
+                played.add((performer_type, performer_id))
+
                 # Create the performance row
                 self.performances.append({
                     'performance_id': performance_id,
@@ -309,23 +632,12 @@ class DataGenerator:
                 })
 
                 # Link artists to performance (solo or group members)
-                if performer_type == 'artist':
+                for artist_id in members:
                     self.performance_members.append({
                         'performance_id': performance_id,
-                        'artist_id': performer_id,
-                        'group_id': None
+                        'artist_id': artist_id,
+                        'group_id': performer_id if performer_type == 'group' else None
                     })
-                else:
-                    group_members = [
-                        m['artist_id'] for m in self.artist_group_members
-                        if m['group_id'] == performer_id
-                    ]
-                    for artist_id in group_members:
-                        self.performance_members.append({
-                            'performance_id': performance_id,
-                            'artist_id': artist_id,
-                            'group_id': performer_id
-                        })
 
                 performance_id += 1
                 performance_count += 1
@@ -337,23 +649,57 @@ class DataGenerator:
                 else:
                     start_time += duration
 
+            # A new year on a performer's history can only make it ineligible,
+            # so re-check just the performers of this event and the other
+            # groups of their members.
+            for performer_type, performer_id in list(played):
+                if performer_type == 'group':
+                    played.update(('group', gid) for aid in group_members_index[performer_id]
+                                  for gid in artist_groups_index[aid])
+            for performer in played:
+                performer_type, performer_id = performer
+                if (self._has_three_consecutive(performer_id, current_year, is_artist=True)
+                        if performer_type == 'artist' else group_streak(performer_id, current_year)):
+                    i = bisect_left(performers, performer)
+                    if i < len(performers) and performers[i] == performer:
+                        del performers[i]
+                        cumulative = None
+
+        if events is None:
+            self._guarantee_continents()
+
+    def _guarantee_continents(self):
         # --- Guarantee at least 5 artists span 3 continents ---
+        # The extra performances follow the rules of the scheduler above: they
+        # go after the last performance of an event, with a 5 to 30 minute
+        # break and before the event ends, when the artist is free and
+        # the year does not make 4 in a row
         N = 5
         # Build festival→continent map
+        location_continent = {loc['location_id']: loc['continent'] for loc in self.locations}
         fest_cont = {
-            f['festival_id']: next(
-                loc['continent']
-                for loc in self.locations
-                if loc['location_id'] == f['location_id']
-            )
+            f['festival_id']: location_continent[f['location_id']]
             for f in self.festivals
         }
+        # id -> row indexes for the performance/event lookups below
+        performance_festival = {}
+        last_end = {}   # event id -> end of its last performance
+        event_by_id = {e['event_id']: e for e in self.events}
+        for performance_id, event_id, start, duration in self.performances.rows(
+                ['performance_id', 'event_id', 'start_time', 'duration']):
+            performance_festival[performance_id] = event_by_id[event_id]['festival_id']
+            hours, minutes, seconds = map(int, duration.split(':'))
+            end = datetime.strptime(start, '%Y-%m-%d %H:%M:%S') + timedelta(
+                hours=hours, minutes=minutes, seconds=seconds)
+            last_end[event_id] = max(end, last_end.get(event_id, end))
+        events_by_festival = defaultdict(list)
+        for e in self.events:
+            events_by_festival[e['festival_id']].append(e)
+
         # Collect continents per artist
         artist_conts = defaultdict(set)
-        for pm in self.performance_members:
-            perf = next(p for p in self.performances if p['performance_id'] == pm['performance_id'])
-            evt  = next(e for e in self.events       if e['event_id']       == perf['event_id'])
-            artist_conts[pm['artist_id']].add(fest_cont[evt['festival_id']])
+        for performance_id, artist_id in self.performance_members.rows(['performance_id', 'artist_id']):
+            artist_conts[artist_id].add(fest_cont[performance_festival[performance_id]])
 
         # Pick up to N artists who have <3 continents so far
         candidates = [
@@ -363,46 +709,69 @@ class DataGenerator:
         random.shuffle(candidates)
         featured = candidates[:N]
 
-        next_perf_id = max(p['performance_id'] for p in self.performances) + 1
+        next_perf_id = max(self.performances.values('performance_id')) + 1
 
         for artist_id in featured:
             have = artist_conts[artist_id]
-            missing = [c for c in set(fest_cont.values()) if c not in have]
+            missing = [c for c in sorted(set(fest_cont.values())) if c not in have]
             # Add performances until they reach 3 continents
             for cont in missing[:3 - len(have)]:
-                # Choose a festival in that continent
-                fids = [fid for fid, cc in fest_cont.items() if cc == cont]
-                fid = random.choice(fids)
+                # The events of that continent's festivals, in random order
+                evts = [evt for fid, cc in fest_cont.items() if cc == cont
+                        for evt in events_by_festival[fid]]
+                random.shuffle(evts)
 
-                # Pick an existing event
-                evts = [e for e in self.events if e['festival_id'] == fid]
-                if not evts:
-                    continue
-                evt = random.choice(evts)
-
-                perf = {
-                    'performance_id': next_perf_id,
-                    'event_id': evt['event_id'],
-                    'start_time': datetime.combine(evt['event_date'], time(20, 0))\
-                                  .strftime('%Y-%m-%d %H:%M:%S'),
-                    'stage_id': evt['stage_id'],
-                    'duration': str(timedelta(minutes=60)),
-                    'type': 'special guest'
-                }
-                self.performances.append(perf)
-                self.performance_members.append({
-                    'performance_id': next_perf_id,
-                    'artist_id': artist_id,
-                    'group_id': None
-                })
-                next_perf_id += 1
+                for evt in evts:
+                    year = self.festival_years[evt['festival_id']]
+                    if self._has_three_consecutive(artist_id, year, is_artist=True):
+                        continue
+                    opening = datetime.combine(evt['event_date'], time(18, 0))
+                    start_time = opening
+                    if evt['event_id'] in last_end:
+                        start_time = last_end[evt['event_id']] + timedelta(minutes=random.randint(5, 30))
+                    end_time = start_time + timedelta(minutes=60)
+                    if end_time > opening + evt['total_duration']:
+                        continue
+                    if not self._artists_free([artist_id], start_time, end_time):
+                        continue
+
+                    self.performances.append({
+                        'performance_id': next_perf_id,
+                        'event_id': evt['event_id'],
+                        'start_time': start_time.strftime('%Y-%m-%d %H:%M:%S'),
+                        'stage_id': evt['stage_id'],
+                        'duration': str(timedelta(minutes=60)),
+                        'type': 'special guest'
+                    })
+                    self.performance_members.append({
+                        'performance_id': next_perf_id,
+                        'artist_id': artist_id,
+                        'group_id': None
+                    })
+                    self._book_artists([artist_id], start_time, end_time)
+                    self.artist_performance_years[artist_id].append(year)
+                    last_end[evt['event_id']] = end_time
+                    next_perf_id += 1
+                    break
+
+    def _artists_free(self, artist_ids, start, end):
+        # No booking of these artists overlaps start..end; a booking of the
+        # day before can run past midnight
+        days = (start.date(), start.date() - timedelta(days=1))
+        return not any(begin < end and start < stop
+                       for artist_id in artist_ids for day in days
+                       for begin, stop in self.artist_bookings.get((artist_id, day), ()))
+
+    def _book_artists(self, artist_ids, start, end):
+        for artist_id in artist_ids:
+            self.artist_bookings[(artist_id, start.date())].append((start, end))
 
     # The rest of the methods remain unchanged (generate_locations, generate_stages, generate_equipment, etc.)
 
     def _has_three_consecutive(self, performer_id, current_year, is_artist=True):
         years = self.artist_performance_years if is_artist else self.group_performance_years
-        existing_years = sorted(list(set(years.get(performer_id, []))))
-        test_years = existing_years + [current_year]
+        # festivals are generated newest first: sort the current year in
+        test_years = sorted(set(years.get(performer_id, [])) | {current_year})
         
         # Check for 4 consecutive years
         consecutive = 1
@@ -417,238 +786,527 @@ class DataGenerator:
             
 
     def generate_visitors(self, count=150):
-        for i in range(1, count+1):
-            self.visitors.append({
-                'visitor_id': i,
-                'first_name': fake.first_name(),
-                'last_name': fake.last_name(),
-                'email': fake.unique.email(),
-                'phone': fake.phone_number(),
-                'age': random.randint(18, 80)
-            })
+        # Emails contain the visitor id, so they are unique without checks
+        first_id = len(self.visitors) + 1
+        pool = self._pool_for(count)
+        shards = [shard + (pool,) for shard in self._id_shards('visitors', first_id, count)]
+        for rows in self._map(_visitor_shard, shards):
+            self.visitors.extend(rows)
+
+    def generate_tickets(self, count=400, events=None):
+        """Sell tickets until 'events' (all events by default) have 'count' in total"""
+        events = events or self.events
+        capacities = {s['stage_id']: s['capacity'] for s in self.stages}
+        event_capacity = {e['event_id']: capacities[e['stage_id']] for e in events}
+        total_capacity = sum(event_capacity.values())
+        if count > min(total_capacity, len(self.visitors) * len(events)):
+            raise ValueError(f"Cannot sell {count} tickets: the events only have "
+                             f"{total_capacity} seats for {len(self.visitors)} visitors")
+
+        ticket_id = max(self.tickets.values('ticket_id'), default=0) + 1
+        event_by_id = {e['event_id']: e for e in events}
+        sold = [t for t in self.tickets.rows(['visitor_id', 'event_id', 'ticket_category'])
+                if t[1] in event_by_id]
+
+        # Decide who buys a ticket for which event, in purchase order; the
+        # rows themselves are filled in per event below
+        visitor_ids = list(self.visitors.values('visitor_id'))
+        allocator = TicketAllocator(
+            event_by_id, event_capacity, visitor_ids, tickets=sold, rng=random,
+            event_weights=self._skew_weights('events', event_by_id),
+            visitor_weights=self._skew_weights('visitors', visitor_ids))
+        sales, interest = allocator.allocate(count - len(sold))
+        buyers = defaultdict(list)      # event id -> visitor ids
+        interested = defaultdict(list)
+        for eid, visitor_id in sales:
+            buyers[eid].append(visitor_id)
+        for eid, visitor_id in interest:
+            interested[eid].append(visitor_id)
+
+        tasks = []
+        for eid in sorted(set(buyers) | set(interested)):
+            event = event_by_id[eid]
+            tasks.append((derive_seed(self.seed, 'tickets', eid), eid, event['event_date'],
+                          allocator.vip_quota(eid), buyers[eid], interested[eid],
+                          self.today, self.now))
+        per_event = {}
+        for task, result in zip(tasks, self._map_events(_ticket_events_task, tasks)):
+            per_event[task[1]] = result
+
+        # Number tickets and interest in purchase order
+        ticket_rows = {eid: iter(result[0]) for eid, result in per_event.items()}
+        for eid, _ in sales:
+            ticket = next(ticket_rows[eid])
+            ticket['ean_code'] = ean13(EAN_PREFIX + ticket_id)
+            self.tickets.append(dict(ticket_id=ticket_id, **ticket))
+            ticket_id += 1
+        interest_rows = {eid: iter(result[1]) for eid, result in per_event.items()}
+        for eid, _ in interest:
+            self.resale_interest.append(next(interest_rows[eid]))
+        print(f"Inserted {len(interest)} rows into resale_interest")
+
+    def _map_events(self, func, tasks):
+        """Run per-event tasks in batches of EVENTS_PER_TASK and flatten the results"""
+        batches = [(tasks[i:i + EVENTS_PER_TASK],) for i in range(0, len(tasks), EVENTS_PER_TASK)]
+        return [result for batch in self._map(func, batches) for result in batch]
+
+    def generate_reviews(self, first_ticket=0, first_performance=0):
+        """Review the performances from row 'first_performance' on, by the
+        activated tickets from row 'first_ticket' on (all by default).
+
+        A ticket only reviews performances of its own event. That is the
+        generator's policy: check_ticket_review only rejects a review whose
+        visitor holds a ticket for the event that is not activated.
+        """
+        review_id = len(self.reviews) + 1
+        # Track (visitor_id, performance_id) pairs
+        existing_pairs = set(self.reviews.rows(['visitor_id', 'performance_id']))
+
+        activated = defaultdict(int)
+        for event_id, is_activated in islice(self.tickets.rows(['event_id', 'activated']), first_ticket, None):
+            if is_activated:
+                activated[event_id] += 1
+        event_ids = sorted(activated)
+        event_performances = defaultdict(list)     # event id -> performance ids
+        for performance_id, event_id in islice(self.performances.rows(['performance_id', 'event_id']),
+                                               first_performance, None):
+            event_performances[event_id].append(performance_id)
+        tasks = [(derive_seed(self.seed, 'reviews', eid), activated[eid], len(event_performances[eid]))
+                 for eid in event_ids]
+        candidates = {eid: iter(result)
+                      for eid, result in zip(event_ids, self._map_events(_review_events_task, tasks))}
+
+        tickets = islice(self.tickets.rows(['visitor_id', 'event_id', 'activated']), first_ticket, None)
+        for visitor_id, event_id, is_activated in tickets:
+            if not is_activated:
+                continue
+            candidate = next(candidates[event_id])
+            if candidate is None:
+                continue
+            performance_id = event_performances[event_id][candidate[0]]
+            pair = (visitor_id, performance_id)
 
-    def generate_tickets(self, count=400):
-        existing_pairs = {(t['visitor_id'], t['event_id']) for t in self.tickets}
-        event_counts = defaultdict(int)
-        vip_counts = defaultdict(int)
-        for t in self.tickets:
-            event_counts[t['event_id']] += 1
-            if t['ticket_category'] == 'VIP':
-                vip_counts[t['event_id']] += 1
-
-        ticket_id = max((t['ticket_id'] for t in self.tickets), default=0) + 1
-        initial_interest = len(self.resale_interest)
-        while len(self.tickets) < count:
-            event = random.choice(self.events)
-            visitor = random.choice(self.visitors)
-            pair = (visitor['visitor_id'], event['event_id'])
             if pair in existing_pairs:
                 continue
+
             existing_pairs.add(pair)
 
-            # --- FIXED date range logic ---
-            event_date = event['event_date']
-            today = date.today()
-            if event_date > today:
-                end_date = today
-                start_date = today - timedelta(days=180)
-            else:
-                end_date = event_date
-                start_date = event_date - timedelta(days=180)
-            if start_date >= end_date:
-                start_date = end_date - timedelta(days=1)
-            # ------------------------------
-
-            stage = next(s for s in self.stages if s['stage_id'] == event['stage_id'])
-            capacity = stage['capacity']
-            eid = event['event_id']
-
-            # Sold-out → resale_interest
-            if event_counts[eid] >= capacity:
-                category = 'VIP' if random.random() < 0.1 else random.choice(['general', 'backstage'])
-                self.resale_interest.append({
-                    'interested_visitor_id': visitor['visitor_id'],
-                    'event_id': eid,
-                    'ticket_category': category,
-                        # pick a random datetime between 90 days before today and now:
-                    'expressed_on': fake.date_time_between(start_date='-90d', end_date='now')
-                                          .strftime('%Y-%m-%d %H:%M:%S')
+            self.reviews.append({
+                'review_id': review_id,
+                'visitor_id': visitor_id,
+                'performance_id': performance_id,
+                'interpretation': candidate[1],
+                'lights_sound': candidate[2],
+                'stage_presence': candidate[3],
+                'organization': candidate[4],
+                'overall_impression': candidate[5]
+            })
+            review_id += 1
 
-                })
-                continue
-            new_interest = len(self.resale_interest) - initial_interest
-
-            # VIP allocation
-            max_vip = int(0.1 * capacity)
-            current_vip = vip_counts.get(eid, 0)
-            is_vip = current_vip < max_vip and random.random() < 0.1
-
-            ticket_data = {
-                'ticket_id': ticket_id,
-                'event_id': eid,
-                'visitor_id': visitor['visitor_id'],
-                'ticket_category': 'VIP' if is_vip else random.choice(['general', 'backstage']),
-                'price': round(random.uniform(200, 500), 2) if is_vip else round(random.uniform(50, 200), 2),
-                'purchase_date': fake.date_between(start_date=start_date, end_date=end_date).strftime('%Y-%m-%d'),
-                'payment_method': random.choice(['credit_card', 'debit_card', 'bank_transfer']),
-                'ean_code': fake.ean13(),
-                'activated': random.choice([True, False])
+    def generate_staff(self, count=50):
+        # Generate 40% security, 40% support and 20% technicians
+        # (20/20/10 for the default 50)
+        security = round(count * 0.4)
+        support = round(count * 0.4)
+        roles = ['security']*security + ['support']*support + ['technician']*(count - security - support)
+        random.shuffle(roles)
+
+        pool = self._pool_for(count)
+        shards = [(seed, start, roles[start - 1:start - 1 + n], pool)
+                  for seed, start, n in self._id_shards('staff', 1, count)]
+        for rows in self._map(_staff_shard, shards):
+            self.staff.extend(rows)
+
+    def generate_staff_assignments(self, events=None):
+        """Staff every event without booking anyone twice on the same day.
+
+        Security and support get 5% / 2% of the stage capacity, but at least
+        the 5% / 2% of the tickets sold that trg_staff_assignment_before_insert
+        asks for; technicians 2 to 5. Staff are drawn from per role lists of
+        who is still free on the event's date, and more staff are hired
+        when a date runs out of them.
+        """
+        assignment_id = len(self.staff_assignments) + 1
+        capacity = {s['stage_id']: s['capacity'] for s in self.stages}
+        tickets = Counter(event_id for event_id, in self.tickets.rows(['event_id']))
+        pools = defaultdict(list)
+        for staff in self.staff:
+            pools[staff['staff_role']].append(staff['staff_id'])
+        # Staff already working on a date, e.g. in the years of an earlier run
+        busy = defaultdict(set)
+        for staff_id, day in self.staff_assignments.rows(['staff_id', 'assignment_date']):
+            busy[day].add(staff_id)
+        free = {}        # (date, role) -> ids of the staff still free that day
+
+        for event in events or self.events:
+            stage_capacity = capacity[event['stage_id']]
+            sold = tickets[event['event_id']]
+            needed = {
+                'security': max(1, int(stage_capacity * 0.05), math.ceil(sold * 0.05)),
+                'support': max(1, int(stage_capacity * 0.02), math.ceil(sold * 0.02)),
+                'technician': random.randint(2, 5),
             }
+            day = event['event_date']
+            for role, count in needed.items():
+                if (day, role) not in free:
+                    taken = busy.get(day)
+                    free[(day, role)] = [s for s in pools[role] if s not in taken] if taken else pools[role][:]
+                available = free[(day, role)]
+                if count > len(available):
+                    # new hires are free on every date
+                    hired = [s['staff_id'] for s in self._hire_staff(role, count - len(available))]
+                    pools[role].extend(hired)
+                    for (other_day, other_role), ids in free.items():
+                        if other_role == role:
+                            ids.extend(hired)
+                for _ in range(count):
+                    # swap a random free member to the end and take it
+                    i = random.randrange(len(available))
+                    available[i], available[-1] = available[-1], available[i]
+                    self.staff_assignments.append({
+                        'assignment_id': assignment_id,
+                        'staff_id': available.pop(),
+                        'event_id': event['event_id'],
+                        'assignment_date': day,
+                        'staff_role': role
+                    })
+                    assignment_id += 1
 
-            if is_vip:
-                vip_counts[eid] += 1
-            event_counts[eid] += 1
-            self.tickets.append(ticket_data)
-            ticket_id += 1
-        print(f"Inserted {new_interest} rows into resale_interest")
+    def _hire_staff(self, role, count):
+        # Staff rows of 'role' with the next ids, seeded by their first id
+        first_id = len(self.staff) + 1
+        rows = _staff_shard(derive_seed(self.seed, 'staff hire', first_id), first_id, [role] * count,
+                            self._pool_for(count))
+        self.staff.extend(rows)
+        return rows
 
+    def tables(self):
+        """Return (table name, rows) pairs in foreign key insertion order,
+        the staff assignments before the tickets (see writers.LOAD_AFTER)"""
+        return [
+            ('Location', self.locations),
+            ('Festival', self.festivals),
+            ('Stage', self.stages),
+            ('Equipment', self.equipment),
+            ('Stage_Equipment', self.stage_equipment),
+            ('Artist_Group', self.groups),
+            ('Artist', self.artists),
+            ('Artist_Group_Members', self.artist_group_members),
+            ('Genre', self.genres),
+            ('Artist_Genres', self.artist_genres),
+            ('Event', self.events),
+            ('Performance', self.performances),
+            ('performance_members', self.performance_members),
+            ('Staff', self.staff),
+            ('Staff_Assignment', self.staff_assignments),
+            ('Visitor', self.visitors),
+            ('Ticket', self.tickets),
+            ('resale_interest', self.resale_interest),
+            ('Review', self.reviews)
+        ]
 
-    def generate_reviews(self):
-        review_id = 1
-        existing_pairs = set()  # Track (visitor_id, performance_id) pairs
-        
-        for ticket in self.tickets:
-            if ticket['activated'] and random.random() < 0.7:
-                performance = random.choice(self.performances)
-                pair = (ticket['visitor_id'], performance['performance_id'])
-                
-                if pair in existing_pairs:
-                    continue
-                    
-                existing_pairs.add(pair)
-                
-                self.reviews.append({
-                    'review_id': review_id,
-                    'visitor_id': ticket['visitor_id'],
-                    'performance_id': performance['performance_id'],
-                    'interpretation': random.randint(1, 5),
-                    'lights_sound': random.randint(1, 5),
-                    'stage_presence': random.randint(1, 5),
-                    'organization': random.randint(1, 5),
-                    'overall_impression': random.randint(1, 5)
-                })
-                review_id += 1
+    def load_state(self, data):
+        """Take over the rows of an earlier run ({table: rows}, e.g. read back
+        from its tsv/csv output) as the starting point for new rows"""
+        for table_name, rows in self.tables():
+            if isinstance(rows, Table):
+                rows.extend(data.get(table_name, []))
+            else:
+                rows.extend(dict(row) for row in data.get(table_name, []))
+        self.festival_years = {f['festival_id']: f['year'] for f in self.festivals}
 
-    def generate_staff(self, count=50):
-        # Generate 20 security, 20 support, and 10 technicians
-        roles = ['security']*20 + ['support']*20 + ['technician']*10
-        random.shuffle(roles)
-        
-        exp_levels = ['intern', 'junior', 'average', 'experienced', 'senior']
-        for i in range(1, count+1):
-            self.staff.append({
-                'staff_id': i,
-                'name': fake.name(),
-                'age': random.randint(18, 65),
-                'staff_role': roles[i-1],
-                'experience_level': random.choice(exp_levels)
-            })
+        # Performance history for the 4 years in a row rule
+        event_year = {e['event_id']: self.festival_years[e['festival_id']] for e in self.events}
+        performance_year = {pid: event_year[eid]
+                            for pid, eid in self.performances.rows(['performance_id', 'event_id'])}
+        for pid, artist_id, group_id in self.performance_members.rows(
+                ['performance_id', 'artist_id', 'group_id']):
+            # a member's years count with those of the group
+            self.artist_performance_years[artist_id].append(performance_year[pid])
+            if group_id is not None:
+                self.group_performance_years[group_id].append(performance_year[pid])
 
-    def generate_staff_assignments(self):
-        assignment_id = 1
-        for event in self.events:
-            stage = next(s for s in self.stages if s['stage_id'] == event['stage_id'])
-            
-            # Staff requirements
-            security_needed = max(1, int(stage['capacity'] * 0.05))  # 5%
-            support_needed = max(1, int(stage['capacity'] * 0.02))   # 2%
-            technicians_needed = random.randint(2, 5)  # Fixed number of technicians
-            
-            # Get available staff
-            security_staff = [s for s in self.staff if s['staff_role'] == 'security']
-            support_staff = [s for s in self.staff if s['staff_role'] == 'support']
-            tech_staff = [s for s in self.staff if s['staff_role'] == 'technician']
-            
-            # Assign staff
-            security = random.sample(security_staff, min(security_needed, len(security_staff)))
-            support = random.sample(support_staff, min(support_needed, len(support_staff)))
-            technicians = random.sample(tech_staff, min(technicians_needed, len(tech_staff)))
-            
-            # Create assignments
-            for staff in security + support + technicians:
-                self.staff_assignments.append({
-                    'assignment_id': assignment_id,
-                    'staff_id': staff['staff_id'],
-                    'event_id': event['event_id'],
-                    'assignment_date': event['event_date'],
-                    'staff_role': staff['staff_role']
-                })
-                assignment_id += 1
-
-    def save_to_sql(self):
-        """Generate SQL with proper insertion order and NULL handling"""
-        with open('load.sql', 'w') as f:
-            tables = [
-                ('Location', self.locations),
-                ('Festival', self.festivals),
-                ('Stage', self.stages),
-                ('Equipment', self.equipment),
-                ('Stage_Equipment', self.stage_equipment),
-                ('Artist_Group', self.groups),
-                ('Artist', self.artists),
-                ('Artist_Group_Members', self.artist_group_members),
-                ('Genre', self.genres),
-                ('Artist_Genres', self.artist_genres),
-                ('Event', self.events),
-                ('Performance', self.performances),
-                ('performance_members', self.performance_members),
-                ('Visitor', self.visitors),
-                ('Ticket', self.tickets),
-                ('resale_interest', self.resale_interest),
-                ('Review', self.reviews),
-                ('Staff', self.staff),
-                ('Staff_Assignment', self.staff_assignments)
-            ]
-
-            for table_name, data in tables:
-                if not data:
-                    continue
+        # Rows from here on are new
+        self.loaded = {table_name: len(rows) for table_name, rows in self.tables()}
 
-                columns = ', '.join(data[0].keys())
-                f.write(f'INSERT INTO {table_name} ({columns}) VALUES\n')
-                
-                for i, row in enumerate(data):
-                    values = []
-                    for key, val in row.items():
-                        if val is None:
-                            values.append('NULL')
-                        elif isinstance(val, (datetime, date)):
-                            values.append(f"'{val.strftime('%Y-%m-%d')}'")
-                        elif isinstance(val, timedelta):
-                            values.append(f"'{str(val)}'")
-                        elif isinstance(val, str):
-                            values.append(f"'{val}'")
-                        else:
-                            values.append(str(val))
-                    
-                    line = f'({", ".join(values)})'
-                    f.write(line + (',\n' if i < len(data)-1 else ';\n\n'))
+    def new_tables(self):
+        """(table name, rows) pairs of the rows added since load_state()"""
+        result = []
+        for table_name, rows in self.tables():
+            start = self.loaded.get(table_name, 0)
+            if len(rows) > start:
+                result.append((table_name, rows[start:]))
+        return result
+
+    def save_to_sql(self, path='load.sql', batch_size=1000, tables=None):
+        """Generate SQL with proper insertion order and NULL handling.
+
+        Rows are streamed out as INSERT statements of at most 'batch_size'
+        rows each, so no statement outgrows max_allowed_packet. 'tables'
+        defaults to all of self.tables().
+        """
+        with SqlWriter(path, batch_size=batch_size) as writer:
+            for table_name, data in tables or self.tables():
+                writer.write_table(table_name, data)
+
+    def save_to_files(self, directory='load_data', fmt='tsv', tables=None):
+        """Write one tsv/csv file per table and a LOAD DATA script loading them.
+
+        Files are written in the same foreign key order as save_to_sql.
+        """
+        with DelimitedWriter(directory, fmt=fmt) as writer:
+            for table_name, data in tables or self.tables():
+                writer.write_table(table_name, data)
+            return writer.write_load_script()
+
+    def save_to_shards(self, directory='load_shards', fmt='sql', shards=1, compression=None, tables=None):
+        """Write every table as up to 'shards' files of primary key ranges,
+        optionally gzip/zstd compressed, and a manifest.json with the files
+        and their foreign key levels (see writers.ShardedWriter)"""
+        with ShardedWriter(directory, fmt=fmt, shards=shards, compression=compression) as writer:
+            for table_name, data in tables or self.tables():
+                writer.write_table(table_name, data)
+            return writer.write_manifest()
+
+    def save_to_partitions(self, directory='load_partitions', fmt='sql', tables=None):
+        """Write the rows of every festival year apart, for the partitioned
+        install (sql/install_partitioned.sql): load_common.sql and a
+        load_<year>.sql per year that fills the year's partitions (see
+        partitioning.PartitionedWriter). Returns the script loading them all.
+        """
+        event_years, performance_years = generator_years(self)
+        with PartitionedWriter(directory, fmt=fmt) as writer:
+            for table_name, data in tables or self.tables():
+                writer.write_table(table_name, data, row_years(table_name, data, event_years, performance_years))
+            return writer.write_load_script()
+
+def build_dataset(counts=None, seed=42, workers=1, profiler=None, skew=None):
+    """Run every generation step in dependency order and return the generator.
+
+    'profiler' (a profiler.StageProfiler) records every step; 'skew' holds
+    the Zipf exponents of the skewed popularity mode (see skew.py).
+    """
+    if counts is None:
+        counts = scaled_counts(1)
+    random.seed(seed)
+    _seed_fake(seed)
+
+    generator = DataGenerator(seed=seed, workers=workers, skew=skew)
+    if profiler is not None:
+        profiler.attach(generator)
 
-if __name__ == '__main__':
-    generator = DataGenerator()
-    
     # Generate in dependency order
-    generator.generate_locations(10)
-    generator.generate_festivals(10)
-    generator.generate_stages(30)
+    generator.generate_locations(counts['locations'])
+    generator.generate_festivals(counts['festivals'])
+    generator.generate_stages(counts['stages'], capacity_scale=counts['venue_scale'])
     generator.generate_equipment()
     generator.generate_stage_equipment()
-    
+
     # Artist/Group generation sequence
-    generator.generate_artists(50)
-    generator.generate_groups(10)
+    generator.generate_artists(counts['artists'])
+    generator.generate_groups(counts['groups'])
     generator.assign_artists_to_groups()
-    
+
     # Generate remaining data
     generator.generate_genres()
     generator.generate_artist_genres()
-    generator.generate_events()
+    generator.generate_events(events_scale=counts['venue_scale'])
     generator.generate_performances()
-    generator.generate_visitors(150)
-    generator.generate_tickets(400)
+    generator.generate_visitors(counts['visitors'])
+    generator.generate_tickets(counts['tickets'])
     generator.generate_reviews()
-    generator.generate_staff(50)
+    generator.generate_staff(counts['staff'])
     generator.generate_staff_assignments()
-    
-    generator.save_to_sql()
-    print("SQL generation complete. Check load.sql")
\ No newline at end of file
+    generator.close()
+    return generator
+
+
+def read_previous(directories):
+    """Rows of one or more earlier tsv/csv outputs, e.g. a full dataset and
+    the yearly deltas generated on top of it, in that order"""
+    data = defaultdict(list)
+    for directory in directories:
+        fmt = 'csv' if os.path.exists(os.path.join(directory, 'festival.csv')) else 'tsv'
+        for table_name, rows in read_directory(directory, fmt).items():
+            data[table_name].extend(rows)
+    return data
+
+
+def build_next_year(data, counts=None, seed=42, workers=1, profiler=None, skew=None):
+    """Generate only the next festival year on top of an earlier dataset.
+
+    New stages, events, performances, tickets, reviews and staff assignments
+    get ids after the existing ones; the people and the rest stay as they
+    are. The per-year sizes are the full dataset's counts divided by the
+    number of festivals. Returns the generator, whose new_tables() are the
+    rows to load.
+    """
+    if counts is None:
+        counts = scaled_counts(1)
+    generator = DataGenerator(seed=seed, workers=workers, skew=skew)
+    if profiler is not None:
+        profiler.attach(generator)
+    generator.load_state(data)
+
+    # Seeded per year, so every rollover draws different rows
+    year_seed = derive_seed(seed, 'year', max(generator.festival_years.values()) + 1)
+    random.seed(year_seed)
+    _seed_fake(year_seed)
+
+    festival = generator.generate_next_festival()
+    first_stage = len(generator.stages)
+    generator.generate_stages(max(1, round(counts['stages'] / counts['festivals'])),
+                              capacity_scale=counts['venue_scale'], festivals=[festival])
+    generator.generate_stage_equipment(generator.stages[first_stage:])
+
+    first_event = len(generator.events)
+    generator.generate_events(events_scale=counts['venue_scale'], festivals=[festival])
+    events = generator.events[first_event:]
+
+    first_performance = len(generator.performances)
+    generator.generate_performances(events)
+    first_ticket = len(generator.tickets)
+    generator.generate_tickets(round(counts['tickets'] / counts['festivals']), events)
+    generator.generate_reviews(first_ticket, first_performance)
+    generator.generate_staff_assignments(events)
+    generator.close()
+    return generator
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate dummy data for the music festival database')
+    parser.add_argument('--scale', type=float, default=1,
+                        help='scale factor: 1 is the default dataset, 10/100/1000 grow it accordingly')
+    parser.add_argument('--seed', type=int, default=42, help='random seed (default 42)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='processes generating the independent tables (default: all cores); '
+                             'the output does not depend on it')
+    parser.add_argument('--skew', type=parse_skew,
+                        help='Zipf exponent of event demand, artist bookings and visitor activity, '
+                             'e.g. 1.1, or per kind: events=1.2,artists=1,visitors=0.8 (default uniform)')
+    parser.add_argument('--format', choices=['sql', 'tsv', 'csv'], default='sql',
+                        help='sql writes a single script, tsv/csv write one file per table '
+                             'and a LOAD DATA script')
+    parser.add_argument('--output',
+                        help='output file for sql (default load.sql), '
+                             'directory for tsv/csv (default load_data); load_<year> with --previous')
+    parser.add_argument('--shards', type=int,
+                        help='write every table as up to N files of primary key ranges, in --format, with a '
+                             'manifest.json of their foreign key levels (directory, default load_shards)')
+    parser.add_argument('--compress', choices=['gzip', 'zstd'],
+                        help='compress the --shards files (implies --shards 1; zstd needs the zstandard package)')
+    parser.add_argument('--partitioned', action='store_true',
+                        help='for sql/install_partitioned.sql: write the common tables and every festival year '
+                             'apart, each year into its partitions, in --format (directory, default load_partitions)')
+    parser.add_argument('--columnar', metavar='DIR',
+                        help='also write the reporting data as columnar files for columnar.py (Parquet if '
+                             'pyarrow is installed, else .npy; needs numpy)')
+    parser.add_argument('--previous', nargs='+', metavar='DIR',
+                        help='tsv/csv output of earlier runs (the full dataset, then any earlier yearly '
+                             'deltas): generate and write only the next festival year')
+    parser.add_argument('--validate', action='store_true',
+                        help='check the data against the install.sql trigger rules before writing it')
+    parser.add_argument('--profile', nargs='?', const='generate_profile.json', metavar='REPORT',
+                        help='time every generation and save step and write a JSON report '
+                             '(default generate_profile.json) and a summary table')
+    parser.add_argument('--cprofile', metavar='DIR',
+                        help='with --profile, also run each step under cProfile and save DIR/<step>.prof')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='with --profile, also record the peak Python allocations of each step '
+                             '(tracemalloc, slower)')
+    parser.add_argument('--cache', action='store_true',
+                        help='reuse the output of an earlier run with the same seed, counts, format, '
+                             'code and date from the dataset cache (skips --validate, --profile and --columnar), '
+                             'or store this one there')
+    parser.add_argument('--cache-dir', help='cache directory (default ~/.cache/festival_data, '
+                                            'or $FESTIVAL_DATA_CACHE)')
+    parser.add_argument('--cache-max-size', default='5G',
+                        help='evict the least recently used outputs beyond this size (default 5G)')
+    for name in BASE_COUNTS:
+        parser.add_argument(f'--{name}', type=int, help=f'override the number of {name}')
+    args = parser.parse_args()
+    if args.compress == 'zstd' and importlib.util.find_spec('zstandard') is None:
+        parser.error('--compress zstd needs the zstandard package (pip install zstandard)')
+    if args.partitioned and (args.shards or args.compress):
+        parser.error('--partitioned does not combine with --shards or --compress')
+    if args.columnar and importlib.util.find_spec('numpy') is None:
+        parser.error('--columnar needs the numpy package (pip install numpy)')
+
+    profiler = None
+    if args.profile:
+        from profiler import StageProfiler
+        profiler = StageProfiler(cprofile_dir=args.cprofile, trace_memory=args.trace_memory)
+
+    counts = scaled_counts(args.scale)
+    for name in BASE_COUNTS:
+        if getattr(args, name) is not None:
+            counts[name] = getattr(args, name)
+    previous = read_previous(args.previous) if args.previous else None
+    if previous is not None:
+        default_name = f"load_{max(f['year'] for f in previous['Festival']) + 1}"
+    else:
+        default_name = 'load' if args.format == 'sql' else 'load_data'
+    if args.compress and not args.shards:
+        args.shards = 1
+    if args.shards:
+        output = args.output or (default_name if previous is not None else 'load') + '_shards'
+    elif args.partitioned:
+        output = args.output or (default_name if previous is not None else 'load') + '_partitions'
+    else:
+        output = args.output or (default_name + '.sql' if args.format == 'sql' else default_name)
+
+    cache = None
+    if args.cache:
+        from dataset_cache import DEFAULT_DIR, DatasetCache, cache_key, parse_size
+        cache = DatasetCache(args.cache_dir or DEFAULT_DIR, max_bytes=parse_size(args.cache_max_size))
+        key, params = cache_key(args.seed, counts, args.format, args.previous,
+                                shards=args.shards, compression=args.compress, skew=args.skew,
+                                partitioned=args.partitioned)
+        if cache.get(key, output):
+            print(f'Reused the cached output {key[:12]}: {output}')
+            sys.exit(0)
+
+    if previous is not None:
+        generator = build_next_year(previous, counts,
+                                    seed=args.seed, workers=args.workers, profiler=profiler, skew=args.skew)
+        year = generator.festivals[-1]['year']
+        print(f"Generated festival year {year} on top of {', '.join(args.previous)}")
+        tables = generator.new_tables()
+    else:
+        print('Generating ' + ', '.join(f'{counts[name]} {name}' for name in BASE_COUNTS))
+        generator = build_dataset(counts, seed=args.seed, workers=args.workers, profiler=profiler,
+                                  skew=args.skew)
+        tables = generator.tables()
+
+    if args.validate:
+        from validate_data import Validator, print_report
+        print_report(Validator.from_generator(generator).check_all())
+
+    if args.shards:
+        manifest = generator.save_to_shards(output, fmt=args.format, shards=args.shards,
+                                            compression=args.compress, tables=tables)
+        print(f"Sharded files complete. Their load order is in {manifest}")
+    elif args.partitioned:
+        script = generator.save_to_partitions(output, fmt=args.format, tables=tables)
+        print(f"Partitioned files complete. Load them into sql/install_partitioned.sql with: "
+              f"cd {output} && mariadb --local-infile=1 < {os.path.basename(script)}")
+    elif args.format == 'sql':
+        generator.save_to_sql(output, tables=tables)
+        print(f"SQL generation complete. Check {output}")
+    else:
+        script = generator.save_to_files(output, fmt=args.format, tables=tables)
+        print(f"Data files complete. Load them with: cd {output} && mariadb --local-infile=1 < {os.path.basename(script)}")
+
+    if args.columnar:
+        # the whole dataset, also with --previous: the reports cover every year
+        from columnar import export, table_source
+        print(f"Columnar files complete. Check {export(table_source(generator.tables()), args.columnar)}")
+
+    if cache is not None:
+        cache.put(key, output, params)
+        print(f'Stored the output in the cache as {key[:12]}')
+
+    if profiler is not None:
+        profiler.write(args.profile, argv=sys.argv[1:], seed=args.seed, workers=args.workers, counts=counts)
+        profiler.print_summary()
+        print(f'Profile written to {args.profile}')
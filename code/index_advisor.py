@@ -0,0 +1,372 @@
+import argparse
+import json
+import re
+import time
+from collections import defaultdict
+
+from benchmark_queries import QUERY_DIR, load_queries, percentile
+from db import INSTALL_SQL, connect
+from generate_data import build_dataset, scaled_counts
+
+# Proposes composite and covering indexes for the statements the database
+# runs most: the queries of sql/query and the SELECTs in the trigger bodies
+# of install.sql (a trigger runs its lookups for every inserted row).
+#
+# The statements are not really parsed: regular expressions find the tables
+# and aliases, and the comparisons of their columns with constants (NEW.x,
+# variables, literals) and with each other (joins). For every table of a
+# statement the candidate key is its equality columns, then a join or range
+# column. Candidates that an existing index already serves are dropped.
+#
+# Each candidate is then created on a generated dataset (SQLite) and the
+# statements that use its table are timed with and without it, along with
+# the time to bulk load its table with the extra index.
+
+_KEYWORDS = {'on', 'where', 'join', 'left', 'right', 'inner', 'outer', 'cross', 'natural', 'group',
+             'order', 'limit', 'using', 'set', 'as', 'having', 'select', 'and', 'or'}
+
+_OPERAND = r"(?::\w+|\w+\.\w+|'[^']*'|\d+(?:\.\d+)?|\w+)"
+_COMPARISON = re.compile(rf"(?<![\w.:'])({_OPERAND})\s*(=|<=|>=|<>|!=|<|>)\s*({_OPERAND})")
+_IN_BETWEEN = re.compile(rf"(?<![\w.:'])({_OPERAND})\s+(?:NOT\s+)?(IN|BETWEEN)\b", re.IGNORECASE)
+_TABLE_REF = re.compile(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+
+_TRIGGER = re.compile(r'CREATE\s+TRIGGER\s+(\w+)\s+(?:BEFORE|AFTER)\s+\w+\s+ON\s+(\w+)\s+FOR\s+EACH\s+ROW'
+                      r'\s+(.*?)\bEND\s*;?\s*\$\$', re.IGNORECASE | re.DOTALL)
+
+
+class Probe:
+    """A statement to time: a query, or one SELECT of a trigger body run
+    with the parameters of a few sample rows"""
+
+    def __init__(self, name, sql, binds=(), table=None):
+        self.name = name
+        self.sql = sql
+        self.binds = list(binds)        # trigger variables the statement sets
+        self.table = table              # trigger table, for NEW./OLD. values
+        self.params = [{}]
+        self.tables = set()
+
+
+def _balanced(text, start):
+    # text[start:] up to the parenthesis that closes an enclosing one
+    depth = 0
+    for i in range(start, len(text)):
+        if text[i] == '(':
+            depth += 1
+        elif text[i] == ')':
+            depth -= 1
+            if depth < 0:
+                return text[start:i]
+    return text[start:]
+
+
+def read_triggers(install_sql=INSTALL_SQL):
+    """The SELECT and SET statements of every trigger of install.sql as
+    Probes, NEW.x / OLD.x and variables written as :new_x / :old_x / :name"""
+    with open(install_sql, encoding='utf-8') as f:
+        text = f.read()
+    text = text.split('DELIMITER', 1)[1]
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.DOTALL)
+    text = re.sub(r'--[^\n]*', '', text)
+
+    probes = []
+    for trigger, table, body in _TRIGGER.findall(text):
+        variables = set()
+        for names in re.findall(r'\bDECLARE\s+(\w+(?:\s*,\s*\w+)*)\s+\w+', body, re.IGNORECASE):
+            variables.update(name.strip() for name in names.split(','))
+        body = re.sub(r'\b(NEW|OLD)\.(\w+)', lambda m: f':{m.group(1).lower()}_{m.group(2)}', body)
+        for name in variables:
+            body = re.sub(rf'(?<![\w.:]){name}\b', ':' + name, body)
+
+        for fragment in body.split(';'):
+            select = re.search(r'\bSELECT\b', fragment, re.IGNORECASE)
+            if select:
+                sql = _balanced(fragment, select.start())
+                into = re.search(r'\bINTO\s+(:\w+(?:\s*,\s*:\w+)*)\s+', sql, re.IGNORECASE)
+                binds = []
+                if into:
+                    binds = [name.strip()[1:] for name in into.group(1).split(',')]
+                    sql = sql[:into.start()] + sql[into.end():]
+            else:
+                assignment = re.search(r'\bSET\s+:(\w+)\s*=\s*(.*)', fragment, re.IGNORECASE | re.DOTALL)
+                if not assignment:
+                    continue
+                sql, binds = 'SELECT ' + assignment.group(2), [assignment.group(1)]
+            probes.append(Probe(f'{trigger}#{len([p for p in probes if p.name.startswith(trigger + "#")]) + 1}',
+                                ' '.join(sql.split()), binds, table.lower()))
+    return probes
+
+
+def read_schema(database):
+    """({table: [columns]}, {table: [index column lists]}, {table: rowid key column})"""
+    columns, indexes, rowid = {}, {}, {}
+    for (table,) in database.execute("SELECT name FROM sqlite_master WHERE type = 'table'"):
+        info = database.execute(f'PRAGMA table_info({table})')
+        columns[table] = [row[1] for row in info]
+        keys = [row[1] for row in sorted(info, key=lambda row: row[5]) if row[5]]
+        indexes[table] = [keys] if keys else []
+        if len(keys) == 1:
+            rowid[table] = keys[0]
+        for index in database.execute(f'PRAGMA index_list({table})'):
+            indexes[table].append([row[2] for row in database.execute(f'PRAGMA index_info({index[1]})')])
+    return columns, indexes, rowid
+
+
+def analyze(sql, columns):
+    """{alias: {'table', 'eq', 'range', 'join', 'used'}} of the tables of a
+    statement: the columns compared with constants (= / IN, or a range) or
+    joined to another table, and every column the statement reads"""
+    aliases = {}
+    for table, alias in _TABLE_REF.findall(sql):
+        table = table.lower()
+        if table in columns:
+            alias = alias.lower() if alias and alias.lower() not in _KEYWORDS else table
+            aliases[alias] = table
+    uses = {alias: {'table': table, 'eq': [], 'range': [], 'join': [], 'used': []}
+            for alias, table in aliases.items()}
+
+    def column(operand):
+        # (alias, column), 'const', or None for anything else
+        if operand.startswith(':') or operand[0] in "'0123456789":
+            return 'const'
+        if '.' in operand:
+            alias, name = operand.lower().split('.')
+            if alias in aliases and name in columns[aliases[alias]]:
+                return alias, name
+            return None
+        owners = [alias for alias, table in aliases.items() if operand.lower() in columns[table]]
+        return (owners[0], operand.lower()) if len(owners) == 1 else None
+
+    def add(alias, kind, name):
+        if name not in uses[alias][kind]:
+            uses[alias][kind].append(name)
+
+    for left, op, right in _COMPARISON.findall(sql):
+        left, right = column(left), column(right)
+        if op in ('<>', '!=') or left is None or right is None:
+            continue
+        if left == 'const':
+            left, right = right, left
+            op = {'<': '>', '>': '<', '<=': '>=', '>=': '<='}.get(op, op)
+        if left == 'const':
+            continue
+        if right == 'const':
+            add(left[0], 'eq' if op == '=' else 'range', left[1])
+        elif op == '=' and left[0] != right[0]:
+            add(left[0], 'join', left[1])
+            add(right[0], 'join', right[1])
+    for operand, op in _IN_BETWEEN.findall(sql):
+        ref = column(operand)
+        if ref not in (None, 'const'):
+            add(ref[0], 'eq' if op.upper() == 'IN' else 'range', ref[1])
+    for alias, name in re.findall(r'(?<![\w.:])(\w+)\.(\w+)', sql):
+        alias, name = alias.lower(), name.lower()
+        if alias in aliases and name in columns[aliases[alias]]:
+            add(alias, 'used', name)
+    return uses
+
+
+def _served(key, equalities, existing):
+    # an index whose leading columns are the key's (equalities in any order)
+    for index in existing:
+        if (len(index) >= len(key) and set(index[:equalities]) == set(key[:equalities])
+                and index[equalities:len(key)] == key[equalities:]):
+            return True
+    return False
+
+
+def propose(probes, columns, indexes, rowid, max_columns=4):
+    """{(table, columns): candidate} for the statements of 'probes'"""
+    candidates = {}
+    for probe in probes:
+        for use in analyze(probe.sql, columns).values():
+            table = use['table']
+            probe.tables.add(table)
+            eq = sorted(use['eq'])
+            keys = []
+            if eq:
+                keys.append((eq + use['range'][:1], 'filter'))
+            keys.extend((eq + [name], 'join') for name in use['join'] if name not in eq)
+            if not eq and use['range']:
+                keys.append((use['range'][:1], 'range'))
+            # a column both compared and ranged on (or ranged twice) only once
+            keys = [(list(dict.fromkeys(key)), reason) for key, reason in keys]
+            for key, reason in list(keys):
+                extra = [name for name in use['used'] if name not in key]
+                if extra and len(key) + len(extra) <= max_columns:
+                    keys.append((key + extra, 'covering'))
+            for key, reason in keys:
+                if key[0] == rowid.get(table) or _served(key, len(eq), indexes.get(table, [])):
+                    continue
+                candidate = candidates.setdefault((table, tuple(key)), {
+                    'table': table, 'columns': key, 'kind': reason, 'statements': []})
+                if probe.name not in candidate['statements']:
+                    candidate['statements'].append(probe.name)
+    return candidates
+
+
+def index_name(table, key):
+    return f"idx_{table}_{'_'.join(key)}"[:64]
+
+
+def create_index(table, key):
+    return f"CREATE INDEX {index_name(table, key)} ON {table}({', '.join(key)})"
+
+
+def bind_parameters(database, probes, samples):
+    """Give every trigger probe the parameters of 'samples' rows of its table,
+    with the variables set by the statements before it. Probes that cannot
+    run here are left without parameters."""
+    by_trigger = defaultdict(list)
+    for probe in probes:
+        if probe.table is not None:
+            by_trigger[probe.name.split('#')[0]].append(probe)
+            continue
+        try:
+            database.execute(probe.sql)
+        except Exception:
+            probe.params = []
+    for statements in by_trigger.values():
+        table = statements[0].table
+        total = database.execute(f'SELECT COUNT(*) FROM {table}')[0][0]
+        step = max(1, total // samples)
+        cursor = database.connection.execute(f'SELECT * FROM {table}')
+        names = [d[0] for d in cursor.description]
+        rows = cursor.fetchall()[::step][:samples]
+        contexts = [dict([(f'new_{n}', v) for n, v in zip(names, row)] +
+                         [(f'old_{n}', v) for n, v in zip(names, row)]) for row in rows]
+        for probe in statements:
+            wanted = set(re.findall(r':(\w+)', probe.sql))
+            probe.params = []
+            for context in contexts:
+                if not wanted <= set(context):
+                    continue
+                params = {name: context[name] for name in wanted}
+                try:
+                    row = database.connection.execute(database._translate(probe.sql), params).fetchone()
+                except Exception:
+                    # e.g. a MariaDB function SQLite does not have
+                    break
+                probe.params.append(params)
+                for name, value in zip(probe.binds, row or [None] * len(probe.binds)):
+                    context[name] = value
+
+
+def time_probe(database, probe, runs):
+    """Median ms of one execution of the probe"""
+    connection = database.connection
+    sql = database._translate(probe.sql)
+    for params in probe.params:
+        connection.execute(sql, params).fetchall()
+    timings = []
+    for _ in range(runs):
+        for params in probe.params:
+            start = time.perf_counter()
+            connection.execute(sql, params).fetchall()
+            timings.append((time.perf_counter() - start) * 1000)
+    return percentile(timings, 50)
+
+
+def load_seconds(generator, table, index=None, runs=3):
+    """Best time to bulk load one table into a new database, with 'index'
+    added; None for a table the generator has no rows for (the rule helper
+    tables)"""
+    name, rows = next(((name, rows) for name, rows in generator.tables() if name.lower() == table), (None, None))
+    if name is None:
+        return None
+    best = None
+    for _ in range(runs):
+        database = connect('sqlite')
+        if index:
+            database.execute(index)
+        seconds = database.load_tables([(name, rows)])[name]
+        database.close()
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def evaluate(generator, probes, candidates, runs=5, samples=50, load_runs=3):
+    """Time every candidate: the statements that touch its table with and
+    without it, and the bulk load of its table"""
+    database = connect('sqlite')
+    database.load_tables(generator.tables())
+    database.fill_rule_helpers()
+    database.execute('ANALYZE')
+    bind_parameters(database, probes, samples)
+    probes = [probe for probe in probes if probe.params]
+    baseline = {probe.name: time_probe(database, probe, runs) for probe in probes}
+    base_load = {}
+
+    results = []
+    for (table, key), candidate in candidates.items():
+        touched = [probe for probe in probes if table in probe.tables]
+        statement = create_index(table, list(key))
+        database.execute(statement)
+        database.execute('ANALYZE')
+        timings = {probe.name: time_probe(database, probe, runs) for probe in touched}
+        database.execute(f'DROP INDEX {index_name(table, list(key))}')
+
+        motivating = [name for name in candidate['statements'] if name in timings]
+        before = sum(baseline[name] for name in motivating)
+        after = sum(timings[name] for name in motivating)
+        if table not in base_load:
+            base_load[table] = load_seconds(generator, table, runs=load_runs)
+        load = load_seconds(generator, table, statement, runs=load_runs)
+        results.append(dict(candidate, **{
+            'create': statement,
+            'measured': motivating,
+            'before_ms': round(before, 4),
+            'after_ms': round(after, 4),
+            'speedup': round(before / after, 2) if after else None,
+            # other statements on the table whose plan got faster or slower
+            'side_effects': {name: round(baseline[name] / timings[name], 2)
+                             for name in timings if name not in motivating and timings[name]
+                             and not 0.67 < baseline[name] / timings[name] < 1.5},
+            'load_seconds': None if load is None else round(base_load[table], 4),
+            'load_extra_seconds': None if load is None else round(load - base_load[table], 4),
+        }))
+    database.close()
+    results.sort(key=lambda r: -(r['speedup'] or 0))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Propose and measure composite indexes for the '
+                                                 'sql/query workload and the install.sql triggers')
+    parser.add_argument('--scale', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--queries', default=QUERY_DIR, help='directory with the Q*.sql files')
+    parser.add_argument('--runs', type=int, default=5, help='timed runs per statement (default 5)')
+    parser.add_argument('--samples', type=int, default=50,
+                        help='rows whose values the trigger statements are run with (default 50)')
+    parser.add_argument('--list', action='store_true', help='only list the candidates, without measuring')
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+
+    probes = [Probe(name, sql) for name, sql in load_queries(args.queries).items()] + read_triggers()
+    schema = connect('sqlite')
+    columns, indexes, rowid = read_schema(schema)
+    schema.close()
+    candidates = propose(probes, columns, indexes, rowid)
+
+    if args.list:
+        for candidate in candidates.values():
+            print(f"{create_index(candidate['table'], candidate['columns'])};  "
+                  f"-- {candidate['kind']}: {', '.join(candidate['statements'])}")
+        raise SystemExit
+
+    generator = build_dataset(scaled_counts(args.scale), seed=args.seed)
+    results = evaluate(generator, probes, candidates, args.runs, args.samples)
+    print(f"{'index':<58}{'before ms':>10}{'after ms':>10}{'speedup':>9}{'load +ms':>10}{'load':>8}  statements")
+    for r in results:
+        speedup = f"{r['speedup']:.2f}x" if r['speedup'] else '-'
+        load = f"{r['load_extra_seconds'] / r['load_seconds']:+.0%}" if r['load_seconds'] else '-'
+        extra = '-' if r['load_extra_seconds'] is None else f"{r['load_extra_seconds'] * 1000:+.1f}"
+        print(f"{index_name(r['table'], r['columns']):<58}{r['before_ms']:>10.3f}{r['after_ms']:>10.3f}"
+              f"{speedup:>9}{extra:>10}{load:>8}  {', '.join(r['measured']) or '-'}")
+        for name, ratio in r['side_effects'].items():
+            print(f"{'':<58}also {name}: {ratio:.2f}x")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'scale': args.scale, 'seed': args.seed, 'candidates': results}, f, indent=2)
+        print(f'Results written to {args.output}')
@@ -0,0 +1,277 @@
+import argparse
+import itertools
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmark_queries import percentile
+from db import add_connection_arguments, connect, connect_from_args
+from generate_data import build_dataset, scaled_counts
+from skew import parse_skew
+from value_pool import ean13
+
+# Concurrent ticket traffic against a loaded database, to see how the VIP cap
+# trigger, the review trigger and the UNIQUE constraints behave when many
+# transactions hit the same events at once (an on-sale burst).
+#
+# Each worker thread has its own connection and runs one transaction per
+# operation:
+#  - purchase: count the event's tickets, insert one if a seat is left
+#  - resale:   mark a not yet activated ticket for resale (is_resale)
+#  - review:   insert a review of a performance the visitor has a ticket for
+# Every attempt is timed, and failures are counted per operation and reason.
+
+OPERATIONS = ('purchase', 'resale', 'review')
+
+# EAN-13 numbers of the tickets sold here, apart from the generated ones (2...)
+EAN_PREFIX = 3 * 10 ** 11
+
+
+def classify(error):
+    """Reason a transaction failed, from the driver's error"""
+    code = getattr(error, 'errno', None) or (error.args[0] if error.args and isinstance(error.args[0], int) else None)
+    message = str(error).lower()
+    if code == 1213 or 'deadlock' in message:
+        return 'deadlock'
+    if code == 1205 or 'lock wait timeout' in message:
+        return 'lock_timeout'
+    if 'database is locked' in message or 'database is busy' in message:
+        return 'busy'
+    if code == 1062 or 'unique' in message or 'duplicate' in message:
+        return 'duplicate'
+    if code == 1644 or 'cannot' in message or 'check constraint' in message:
+        return 'rejected_by_trigger'
+    return 'error'
+
+
+class Workload:
+    """Random operations on the entities of a generated dataset.
+
+    A share 'hot_share' of the purchases goes to the 'hot_events' events
+    with the most seats, like an on-sale burst.
+    """
+
+    def __init__(self, generator, seed=42, hot_events=3, hot_share=0.8, vip_share=0.1):
+        self.rng = random.Random(seed)
+        self.hot_share = hot_share
+        self.vip_share = vip_share
+        capacities = {s['stage_id']: s['capacity'] for s in generator.stages}
+        self.capacity = {e['event_id']: capacities[e['stage_id']] for e in generator.events}
+        self.event_ids = sorted(self.capacity)
+        self.hot = sorted(self.event_ids, key=lambda eid: -self.capacity[eid])[:hot_events]
+        self.visitor_ids = list(generator.visitors.values('visitor_id'))
+        self.tickets = list(generator.tickets.rows(['ticket_id', 'visitor_id', 'event_id']))
+        self.performances = defaultdict(list)
+        for performance_id, event_id in generator.performances.rows(['performance_id', 'event_id']):
+            self.performances[event_id].append(performance_id)
+        self.purchase_date = generator.today.isoformat()
+        self.ean = itertools.count(1)
+
+    def make(self, mix, count):
+        """'count' operations, drawn with the weights of 'mix' {operation: weight}"""
+        kinds = self.rng.choices(list(mix), weights=list(mix.values()), k=count)
+        return [getattr(self, '_' + kind)() for kind in kinds]
+
+    def _purchase(self):
+        rng = self.rng
+        events = self.hot if self.hot and rng.random() < self.hot_share else self.event_ids
+        event_id = rng.choice(events)
+        vip = rng.random() < self.vip_share
+        return ('purchase', event_id, rng.choice(self.visitor_ids),
+                'VIP' if vip else rng.choice(['general', 'backstage']),
+                round(rng.uniform(200, 500) if vip else rng.uniform(50, 200), 2),
+                rng.choice(['credit_card', 'debit_card', 'bank_transfer']))
+
+    def _resale(self):
+        return ('resale', self.rng.choice(self.tickets)[0])
+
+    def _review(self):
+        rng = self.rng
+        _, visitor_id, event_id = rng.choice(self.tickets)
+        performances = self.performances.get(event_id)
+        if not performances:
+            return self._resale()
+        return ('review', visitor_id, rng.choice(performances)) + tuple(rng.randint(1, 5) for _ in range(5))
+
+
+class Runner:
+    """Runs operations in a thread pool, one database connection per thread"""
+
+    def __init__(self, open_database, workload):
+        self.open_database = open_database
+        self.workload = workload
+        self.local = threading.local()
+        self.databases = []
+        self.lock = threading.Lock()
+
+    def _database(self):
+        database = getattr(self.local, 'database', None)
+        if database is None:
+            database = self.local.database = self.open_database()
+            with self.lock:
+                self.databases.append(database)
+        return database
+
+    def run(self, operations, concurrency):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(self._timed, operations))
+        elapsed = time.perf_counter() - started
+        for database in self.databases:
+            database.close()
+        return results, elapsed
+
+    def _timed(self, operation):
+        database = self._database()
+        start = time.perf_counter()
+        outcome = 'ok'
+        cursor = database.connection.cursor()
+        try:
+            if database.engine == 'sqlite':
+                # take the write lock up front, as a MariaDB writer would lock rows
+                cursor.execute('BEGIN IMMEDIATE')
+            reason = getattr(self, '_' + operation[0])(database, cursor, *operation[1:])
+            if reason is None:
+                database.connection.commit()
+            else:
+                outcome = reason
+                database.connection.rollback()
+        except Exception as e:
+            outcome = classify(e)
+            try:
+                database.connection.rollback()
+            except Exception:
+                pass
+        finally:
+            cursor.close()
+        return operation[0], outcome, (time.perf_counter() - start) * 1000
+
+    def _purchase(self, database, cursor, event_id, visitor_id, category, price, method):
+        p = database.placeholder
+        lock = ' FOR UPDATE' if database.engine == 'mariadb' else ''
+        cursor.execute(f'SELECT COUNT(*) FROM ticket WHERE event_id = {p}{lock}', (event_id,))
+        if cursor.fetchone()[0] >= self.workload.capacity[event_id]:
+            return 'sold_out'
+        cursor.execute(
+            f'INSERT INTO ticket (event_id, visitor_id, ticket_category, price, purchase_date, '
+            f'payment_method, ean_code, activated) VALUES ({p}, {p}, {p}, {p}, {p}, {p}, {p}, {p})',
+            (event_id, visitor_id, category, price, self.workload.purchase_date, method,
+             ean13(EAN_PREFIX + next(self.workload.ean)), False))
+        return None
+
+    def _resale(self, database, cursor, ticket_id):
+        p = database.placeholder
+        cursor.execute(f'UPDATE ticket SET is_resale = TRUE '
+                       f'WHERE ticket_id = {p} AND activated = FALSE AND is_resale = FALSE', (ticket_id,))
+        return None if cursor.rowcount else 'not_listable'
+
+    def _review(self, database, cursor, visitor_id, performance_id, *scores):
+        p = database.placeholder
+        cursor.execute(
+            f'INSERT INTO review (visitor_id, performance_id, interpretation, lights_sound, '
+            f'stage_presence, organization, overall_impression) VALUES ({p}, {p}, {p}, {p}, {p}, {p}, {p})',
+            (visitor_id, performance_id) + scores)
+        return None
+
+
+def summarize(results, elapsed):
+    """Per operation: attempts, successes per second, latency percentiles, failures by reason"""
+    latencies = defaultdict(list)
+    outcomes = defaultdict(Counter)
+    for kind, outcome, latency in results:
+        latencies[kind].append(latency)
+        outcomes[kind][outcome] += 1
+    summary = {}
+    for kind in OPERATIONS:
+        if kind not in latencies:
+            continue
+        values = latencies[kind]
+        summary[kind] = {
+            'attempts': len(values),
+            'ok': outcomes[kind]['ok'],
+            'ok_per_sec': round(outcomes[kind]['ok'] / elapsed, 1),
+            'p50_ms': round(percentile(values, 50), 3),
+            'p95_ms': round(percentile(values, 95), 3),
+            'p99_ms': round(percentile(values, 99), 3),
+            'failures': {reason: n for reason, n in sorted(outcomes[kind].items()) if reason != 'ok'},
+        }
+    return summary
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        kind, weight = part.split('=')
+        if kind not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f'unknown operation {kind!r}, expected one of {OPERATIONS}')
+        mix[kind] = float(weight)
+    return mix
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Concurrent ticket purchase / resale / review load test')
+    parser.add_argument('--scale', type=float, default=1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--skew', type=parse_skew,
+                        help='generate with skewed popularity, e.g. 1.1 or events=1.2,visitors=0.8 (see generate_data.py)')
+    parser.add_argument('--operations', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16],
+                        help='worker threads; several values run one test each (default: 1 4 16)')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('purchase=0.7,resale=0.15,review=0.15'),
+                        help='operation weights (default purchase=0.7,resale=0.15,review=0.15)')
+    parser.add_argument('--hot-events', type=int, default=3, help='events most purchases go to')
+    parser.add_argument('--hot-share', type=float, default=0.8, help='share of purchases for the hot events')
+    parser.add_argument('--busy-timeout', type=float, default=5.0,
+                        help='seconds a SQLite transaction waits for the write lock')
+    parser.add_argument('--output', help='write the results as JSON')
+    add_connection_arguments(parser)
+    args = parser.parse_args()
+
+    generator = build_dataset(scaled_counts(args.scale), seed=args.seed, skew=args.skew)
+    report = {'engine': args.engine, 'scale': args.scale, 'skew': args.skew, 'operations': args.operations, 'runs': []}
+    workdir = tempfile.mkdtemp(prefix='load_test_')
+    try:
+        for concurrency in args.concurrency:
+            # Every run starts from the same data
+            if args.engine == 'sqlite':
+                path = os.path.join(workdir, f'festival_{concurrency}.db')
+                database = connect('sqlite', path)
+                database.execute('PRAGMA journal_mode = WAL')
+                database.load_tables(generator.tables())
+                database.add_triggers()
+                database.close()
+                open_database = lambda path=path: connect('sqlite', path, timeout=args.busy_timeout)
+            else:
+                database = connect_from_args(args)
+                database.clear()
+                database.load_tables(generator.tables())
+                database.close()
+                open_database = lambda: connect_from_args(args)
+
+            workload = Workload(generator, seed=args.seed, hot_events=args.hot_events, hot_share=args.hot_share)
+            operations = workload.make(args.mix, args.operations)
+            results, elapsed = Runner(open_database, workload).run(operations, concurrency)
+            summary = summarize(results, elapsed)
+            report['runs'].append({'concurrency': concurrency, 'seconds': round(elapsed, 3),
+                                   'operations': summary})
+
+            print(f'\nConcurrency {concurrency}: {len(results)} operations in {elapsed:.2f}s '
+                  f'({len(results) / elapsed:,.0f}/sec)')
+            print(f"{'operation':<10}{'attempts':>9}{'ok':>7}{'ok/sec':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}  failures")
+            for kind, s in summary.items():
+                failures = ', '.join(f'{reason} {n}' for reason, n in s['failures'].items()) or '-'
+                print(f"{kind:<10}{s['attempts']:>9}{s['ok']:>7}{s['ok_per_sec']:>9.1f}"
+                      f"{s['p50_ms']:>9.2f}{s['p95_ms']:>9.2f}{s['p99_ms']:>9.2f}  {failures}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'\nResults written to {args.output}')
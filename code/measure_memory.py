@@ -0,0 +1,57 @@
+import argparse
+import sys
+from array import array
+
+from generate_data import build_dataset, scaled_counts
+from record_store import Table
+
+# Compares the memory of the column store against the lists of dicts it
+# replaced, for every table the generator keeps in a record_store.Table.
+
+
+def deep_size(obj, seen=None):
+    """Bytes used by obj and everything it references, each object counted once"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(deep_size(item, seen) for item in obj)
+    elif isinstance(obj, (str, bytes, int, float, array)) or obj is None:
+        pass
+    elif hasattr(obj, '__dict__'):
+        size += deep_size(vars(obj), seen)
+    return size
+
+
+def measure(generator):
+    results = []
+    for table_name, rows in generator.tables():
+        if not isinstance(rows, Table) or not len(rows):
+            continue
+        # Functions (encoders, decoders) are shared per kind, not per table
+        columnar = deep_size(rows.columns)
+        dicts = deep_size(list(rows))
+        results.append((table_name, len(rows), columnar, dicts))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure generator memory: column store vs list of dicts')
+    parser.add_argument('--scale', type=float, default=1)
+    args = parser.parse_args()
+
+    generator = build_dataset(scaled_counts(args.scale))
+    total_columnar = total_dicts = 0
+    print(f"{'table':<22}{'rows':>10}{'columns (MB)':>15}{'dicts (MB)':>13}{'B/row':>8}{'dict B/row':>12}")
+    for table_name, rows, columnar, dicts in measure(generator):
+        total_columnar += columnar
+        total_dicts += dicts
+        print(f"{table_name:<22}{rows:>10}{columnar / 2**20:>15.2f}{dicts / 2**20:>13.2f}"
+              f"{columnar / rows:>8.0f}{dicts / rows:>12.0f}")
+    print(f"{'total':<32}{total_columnar / 2**20:>15.2f}{total_dicts / 2**20:>13.2f}"
+          f"   ({total_dicts / total_columnar:.1f}x smaller)")
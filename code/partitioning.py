@@ -0,0 +1,394 @@
+import argparse
+import os
+import re
+import time
+from collections import defaultdict
+
+from db import INSTALL_SQL, SQL_DIR
+from writers import DELIMITED_FORMATS, TABLE_COLUMNS, _TableWriter, delimited_lines, insert_statements, row_values
+
+# The year-partitioned variant of install.sql.
+#
+# event, performance, ticket and staff_assignment are partitioned by RANGE on
+# their festival year, one partition pYYYY per year and pmax for the years
+# after the last one. sql/install_partitioned.sql is generated from
+# install.sql by partitioned_install() ('python3 partitioning.py install');
+# the partition-aligned output of generate_data.py --partitioned is written
+# by PartitionedWriter, and 'add-year' / 'drop-year' print the statements that
+# extend the partitions or archive and drop a year.
+
+PARTITIONED_SQL = os.path.join(SQL_DIR, 'install_partitioned.sql')
+DEFAULT_YEARS = (2015, 2030)
+
+# install.sql table -> (partitioning column, RANGE expression)
+PARTITION_KEYS = {
+    'event': ('event_date', 'YEAR(event_date)'),
+    'performance': ('event_year', 'event_year'),
+    'ticket': ('event_year', 'event_year'),
+    'staff_assignment': ('assignment_date', 'YEAR(assignment_date)'),
+}
+
+# The generated tables with a partitioning column the generator does not keep:
+# the event's year is appended to their rows
+PARTITIONED_COLUMNS = {
+    'Performance': TABLE_COLUMNS['Performance'] + [('event_year', 'int')],
+    'Ticket': TABLE_COLUMNS['Ticket'] + [('event_year', 'int')],
+}
+
+# Generated table -> the column that decides its year: the partitioned tables
+# and the rows that belong to their events and performances
+YEAR_KEYS = {
+    'Event': 'event_id',
+    'Performance': 'event_id',
+    'performance_members': 'performance_id',
+    'Ticket': 'event_id',
+    'resale_interest': 'event_id',
+    'Review': 'performance_id',
+    'Staff_Assignment': 'event_id',
+}
+
+HEADER = """\
+-- Generated from install.sql by code/partitioning.py, do not edit: regenerate with
+--   cd code && python3 partitioning.py install --years {first} {last}
+--
+-- install.sql with event, performance, ticket and staff_assignment partitioned
+-- by RANGE on the festival year: partition pYYYY holds year YYYY, pmax every
+-- year after {last} (split it with 'partitioning.py add-year').
+--
+-- * performance and ticket get an event_year column, their event's year,
+--   which the trg_*_event_year triggers fill in when an insert leaves it out
+--   (a performance of a 31 December event can start after midnight, so
+--   YEAR(start_time) would not do).
+-- * Every unique key of a partitioned table has to contain the partitioning
+--   column, so the primary keys become (event_id, event_date), (performance_id,
+--   event_year), (ticket_id, event_year) and (assignment_id, assignment_date),
+--   and ticket's UNIQUE keys are per year ((visitor_id, event_id) already is,
+--   ean_code now is).
+-- * InnoDB partitioned tables can neither have foreign keys nor be referenced
+--   by them: the foreign keys from and to these four tables are dropped.
+--   Nothing checks those references any more; generate_data.py writes every
+--   parent row before its children.
+--
+"""
+
+EVENT_YEAR_TRIGGER = """\
+-- Partitioned install: fill in the event_year of a {table} inserted without
+-- one (the generated data has it, the application's inserts do not)
+CREATE TRIGGER trg_{table}_event_year
+BEFORE INSERT ON {table}
+FOR EACH ROW
+BEGIN
+  IF NEW.event_year = 0 THEN
+    SET NEW.event_year = (SELECT YEAR(e.event_date) FROM event e WHERE e.event_id = NEW.event_id);
+  END IF;
+END$$
+
+"""
+
+_CREATE_TABLE = re.compile(r'CREATE TABLE (\w+) \((.*?)\n\);', re.DOTALL)
+_CONSTRAINT = re.compile(r'(PRIMARY|UNIQUE|FOREIGN|CONSTRAINT|CHECK|KEY|INDEX)\b', re.IGNORECASE)
+
+
+def partition_clause(expression, first, last):
+    """PARTITION BY RANGE on 'expression' with one partition per year"""
+    partitions = [f'    PARTITION p{year} VALUES LESS THAN ({year + 1})' for year in range(first, last + 1)]
+    partitions.append('    PARTITION pmax VALUES LESS THAN MAXVALUE')
+    return f'PARTITION BY RANGE ({expression}) (\n' + ',\n'.join(partitions) + '\n)'
+
+
+def _partition_table(name, definitions):
+    # definitions: [comment lines, definition] pairs of a partitioned table
+    column, _ = PARTITION_KEYS[name]
+    row_id = None
+    result = []
+    for comments, definition in definitions:
+        text = definition.strip()
+        if text.upper().startswith('FOREIGN KEY'):
+            continue
+        primary = re.match(r'(\w+)\s+INT\s+AUTO_INCREMENT\s+PRIMARY\s+KEY$', text, re.IGNORECASE)
+        unique = re.match(r'UNIQUE\s*\((.*)\)$', text, re.IGNORECASE)
+        if primary:
+            row_id = primary.group(1)
+            text = f'{row_id} INT AUTO_INCREMENT'
+        elif text.upper().endswith(' UNIQUE'):
+            # column level UNIQUE -> a per year UNIQUE key after the columns
+            text = text[:-len(' UNIQUE')]
+            result.append([[], f'    UNIQUE ({text.split()[0]}, {column})'])
+        elif unique and column not in unique.group(1):
+            text = f'UNIQUE ({unique.group(1)}, {column})'
+        result.append([comments, '    ' + text])
+        if column == 'event_year' and text.startswith('event_id '):
+            result.append([[], '    event_year INT NOT NULL DEFAULT 0'])
+    if row_id is None:
+        raise ValueError(f'{name}: no AUTO_INCREMENT PRIMARY KEY to partition on')
+
+    # the keys go after the columns, the primary key first
+    columns = [d for d in result if not _CONSTRAINT.match(d[1].strip())]
+    keys = [d for d in result if _CONSTRAINT.match(d[1].strip())]
+    return columns + [[[], f'    PRIMARY KEY ({row_id}, {column})']] + keys
+
+
+def _rewrite_table(match, first, last):
+    name, body = match.group(1), match.group(2)
+    definitions, comments = [], []
+    for line in body.strip('\n').split('\n'):
+        if not line.strip() or line.strip().startswith('--'):
+            comments.append(line)
+        else:
+            definitions.append([comments, line.rstrip().rstrip(',').rstrip()])
+            comments = []
+
+    if name in PARTITION_KEYS:
+        definitions = _partition_table(name, definitions)
+    else:
+        references = '|'.join(PARTITION_KEYS)
+        kept = [d for d in definitions
+                if not re.search(rf'REFERENCES\s+({references})\s*\(', d[1], re.IGNORECASE)]
+        if len(kept) == len(definitions):
+            return match.group(0)
+        definitions = kept
+
+    lines = []
+    for i, (before, definition) in enumerate(definitions):
+        lines.extend(before)
+        lines.append(definition + (',' if i < len(definitions) - 1 else ''))
+    lines.extend(comments)
+    statement = f'CREATE TABLE {name} (\n' + '\n'.join(lines) + '\n)'
+    if name in PARTITION_KEYS:
+        statement += '\n' + partition_clause(PARTITION_KEYS[name][1], first, last)
+    return statement + ';'
+
+
+def partitioned_install(text, first=DEFAULT_YEARS[0], last=DEFAULT_YEARS[1]):
+    """The text of install.sql with the partitioned tables of PARTITION_KEYS"""
+    if first > last:
+        raise ValueError(f'no partition years from {first} to {last}')
+    found = {m.group(1) for m in _CREATE_TABLE.finditer(text)}
+    missing = set(PARTITION_KEYS) - found
+    if missing:
+        raise ValueError(f"install.sql has no CREATE TABLE {', '.join(sorted(missing))}")
+    text = _CREATE_TABLE.sub(lambda m: _rewrite_table(m, first, last), text)
+    triggers, delimiter, rest = text.partition('\nDELIMITER ;')
+    if not delimiter:
+        raise ValueError('install.sql has no DELIMITER ; after its triggers')
+    added = ''.join(EVENT_YEAR_TRIGGER.format(table=table)
+                    for table, (column, _) in PARTITION_KEYS.items() if column == 'event_year')
+    return HEADER.format(first=first, last=last) + triggers + '\n' + added + delimiter.lstrip('\n') + rest
+
+
+def write_install(output=PARTITIONED_SQL, first=DEFAULT_YEARS[0], last=DEFAULT_YEARS[1], install_sql=INSTALL_SQL):
+    with open(install_sql, encoding='utf-8') as f:
+        text = partitioned_install(f.read(), first, last)
+    with open(output, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return output
+
+
+def add_year_statements(year):
+    """Split year 'year' off pmax in every partitioned table"""
+    return [f'ALTER TABLE {table} REORGANIZE PARTITION pmax INTO (\n'
+            f'    PARTITION p{year} VALUES LESS THAN ({year + 1}),\n'
+            f'    PARTITION pmax VALUES LESS THAN MAXVALUE);'
+            for table in PARTITION_KEYS]
+
+
+# The unpartitioned tables with rows of a year: (table, the partitioned table
+# and the column they join on)
+YEAR_CHILDREN = [
+    ('review', 'performance', 'performance_id'),
+    ('performance_members', 'performance', 'performance_id'),
+    ('resale_queue', 'ticket', 'ticket_id'),
+    ('resale_interest', 'event', 'event_id'),
+]
+
+
+# The rule helper tables of install.sql with rows of a year: (table, the
+# partitioned table and the column they join on), or the year column of the
+# participation counts (their year is that of the event date, which falls in
+# its festival's year)
+YEAR_HELPERS = [
+    ('stage_schedule', 'performance', 'performance_id'),
+    ('artist_schedule', 'performance', 'performance_id'),
+    ('artist_participation', None, 'year'),
+    ('group_participation', None, 'year'),
+]
+
+
+def drop_year_statements(year, archive=False, summaries=False):
+    """Delete the rows of year 'year' and drop its partitions.
+
+    The rows of the unpartitioned tables that belong to the year are deleted
+    through the year's partitions; the partitions themselves are dropped,
+    which takes no longer than dropping a table. With 'archive' every table's
+    rows of the year are kept in a <table>_<year> table: the partitions are
+    swapped into theirs with EXCHANGE PARTITION, which moves no rows either.
+
+    Dropping a partition runs no triggers, so the year's rows are also
+    deleted from the rule helper tables and, with 'summaries' (sql/summary.sql
+    installed), from revenue_summary; the rating summaries follow the review
+    deletes through their triggers.
+    """
+    partition = f'p{year}'
+    statements = []
+    for child, parent, column in YEAR_CHILDREN:
+        source = f'{child} c JOIN {parent} PARTITION ({partition}) y ON c.{column} = y.{column}'
+        if archive:
+            statements.append(f'CREATE TABLE {child}_{year} AS SELECT c.* FROM {source};')
+        statements.append(f'DELETE c FROM {source};')
+    for helper, parent, column in YEAR_HELPERS:
+        if parent is None:
+            statements.append(f'DELETE FROM {helper} WHERE {column} = {year};')
+        else:
+            statements.append(f'DELETE h FROM {helper} h JOIN {parent} PARTITION ({partition}) y '
+                              f'ON h.{column} = y.{column};')
+    if summaries:
+        statements.append(f'DELETE FROM revenue_summary WHERE year = {year};')
+    for table in reversed(list(PARTITION_KEYS)):
+        if archive:
+            statements += [f'CREATE TABLE {table}_{year} LIKE {table};',
+                           f'ALTER TABLE {table}_{year} REMOVE PARTITIONING;',
+                           f'ALTER TABLE {table} EXCHANGE PARTITION {partition} WITH TABLE {table}_{year};']
+        statements.append(f'ALTER TABLE {table} DROP PARTITION {partition};')
+    return statements
+
+
+def row_years(table, rows, event_years, performance_years):
+    """The festival year of every row of 'table', None for the tables that
+    do not belong to a year ({event_id: year}, {performance_id: year})"""
+    key = YEAR_KEYS.get(table)
+    if key is None:
+        return None
+    years = event_years if key == 'event_id' else performance_years
+    return [years[value] for (value,) in row_values(table, rows, [key])]
+
+
+def generator_years(generator):
+    """({event_id: year}, {performance_id: year}) of a DataGenerator's rows"""
+    event_years = {e['event_id']: generator.festival_years[e['festival_id']] for e in generator.events}
+    performance_years = {pid: event_years[eid]
+                         for pid, eid in generator.performances.rows(['performance_id', 'event_id'])}
+    return event_years, performance_years
+
+
+def partitioned_values(table, rows, years):
+    """The rows of 'table' as value tuples in the order of its partitioned
+    columns: with its event's year appended for the PARTITIONED_COLUMNS"""
+    values = row_values(table, rows)
+    if table in PARTITIONED_COLUMNS:
+        values = (row + (year,) for row, year in zip(values, years))
+    return values
+
+
+class PartitionedWriter(_TableWriter):
+    """Write the rows of every festival year apart from the other rows.
+
+    The tables that belong to no year go to the 'common' part, the rows of a
+    year to the part of that year, and the rows of the partitioned tables
+    into the year's partition (INSERT / LOAD DATA ... PARTITION (pYYYY)).
+    Every part gets a load_<part>.sql script (sql: the INSERT statements
+    themselves, tsv/csv: LOAD DATA of the files in the <part> directory), so
+    a year can be loaded, and later dropped, on its own. Tables must be
+    written in foreign key order.
+    """
+
+    def __init__(self, directory, fmt='sql', batch_size=1000, verbose=True):
+        super().__init__(verbose)
+        self.directory = directory
+        self.fmt = fmt
+        self.batch_size = batch_size
+        self.scripts = {}   # part -> open sql script
+        self.files = defaultdict(list)  # part -> [(table, file name)] of tsv/csv
+        os.makedirs(directory, exist_ok=True)
+
+    def _script(self, part):
+        if part not in self.scripts:
+            self.scripts[part] = open(os.path.join(self.directory, f'load_{part}.sql'), 'w')
+        return self.scripts[part]
+
+    def write_table(self, table, rows, years=None):
+        """Write 'rows', split by 'years' (a year per row, see row_years())"""
+        started = time.perf_counter()
+        columns = PARTITIONED_COLUMNS.get(table, TABLE_COLUMNS[table])
+        if years is None:
+            parts = {'common': row_values(table, rows)}
+        else:
+            parts = defaultdict(list)
+            for row, year in zip(partitioned_values(table, rows, years), years):
+                parts[year].append(row)
+        partitioned = table.lower() in PARTITION_KEYS
+
+        count = 0
+        for part in sorted(parts, key=str):
+            partition = f'p{part}' if partitioned else None
+            if self.fmt == 'sql':
+                f = self._script(part)
+                for statement, size in insert_statements(table, parts[part], self.batch_size,
+                                                         columns=columns, partition=partition):
+                    f.write(statement)
+                    count += size
+            else:
+                name = f'{part}/{table.lower()}.{self.fmt}'
+                os.makedirs(os.path.join(self.directory, str(part)), exist_ok=True)
+                with open(os.path.join(self.directory, name), 'w', newline='') as f:
+                    for line in delimited_lines(table, parts[part], self.fmt, columns):
+                        f.write(line)
+                        count += 1
+                self.files[part].append((table, name, partition))
+        self._report(table, count, time.perf_counter() - started)
+        return count
+
+    def write_load_script(self, name='load_data.sql'):
+        """Write the per part LOAD DATA scripts (tsv/csv) and 'name', which
+        runs the common part and then every year in order. Run it from the
+        output directory with 'mariadb --local-infile=1'."""
+        clause = DELIMITED_FORMATS[self.fmt]['clause'] if self.fmt != 'sql' else None
+        for part, files in self.files.items():
+            f = self._script(part)
+            f.write(f'-- Bulk load of {part}, in foreign key order\n')
+            f.write('SET foreign_key_checks = 0;\n\n')
+            for table, file_name, partition in files:
+                target = f'{table} PARTITION ({partition})' if partition else table
+                columns = ', '.join(column for column, _ in PARTITIONED_COLUMNS.get(table, TABLE_COLUMNS[table]))
+                f.write(f"LOAD DATA LOCAL INFILE '{file_name}'\n"
+                        f"INTO TABLE {target}\n"
+                        f"{clause}\n"
+                        f"({columns});\n\n")
+            f.write('SET foreign_key_checks = 1;\n')
+        parts = sorted(self.scripts, key=lambda part: (part != 'common', str(part)))
+        self.close()
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as f:
+            f.write('-- The common tables, then one festival year at a time\n')
+            for part in parts:
+                f.write(f'SOURCE load_{part}.sql;\n')
+        return path
+
+    def close(self):
+        for f in self.scripts.values():
+            if not f.closed:
+                f.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='The year-partitioned install and its maintenance statements')
+    commands = parser.add_subparsers(dest='command', required=True)
+    install = commands.add_parser('install', help='generate sql/install_partitioned.sql from sql/install.sql')
+    install.add_argument('--years', type=int, nargs=2, metavar=('FIRST', 'LAST'), default=DEFAULT_YEARS,
+                         help=f'a partition per year from FIRST to LAST (default {DEFAULT_YEARS[0]} {DEFAULT_YEARS[1]})')
+    install.add_argument('--output', default=PARTITIONED_SQL)
+    add_year = commands.add_parser('add-year', help='print the statements adding the partitions of YEAR')
+    add_year.add_argument('year', type=int)
+    drop_year = commands.add_parser('drop-year', help='print the statements deleting YEAR and dropping its partitions')
+    drop_year.add_argument('year', type=int)
+    drop_year.add_argument('--archive', action='store_true',
+                           help="keep the year's rows in <table>_<year> tables")
+    drop_year.add_argument('--summaries', action='store_true',
+                           help='also delete the year from the sql/summary.sql tables')
+    args = parser.parse_args()
+
+    if args.command == 'install':
+        print(f'Partitioned install written to {write_install(args.output, *args.years)}')
+    elif args.command == 'add-year':
+        print('\n'.join(add_year_statements(args.year)))
+    else:
+        print('\n'.join(drop_year_statements(args.year, args.archive, args.summaries)))
@@ -0,0 +1,165 @@
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:        # not on Windows
+    resource = None
+
+# Per stage timings of a generate_data.py run.
+#
+# StageProfiler.attach(generator) wraps every generate_* and save_to_*
+# method of a DataGenerator, and records per method the calls, wall time,
+# rows produced (or written) and the process' peak memory.
+# Optionally each stage also runs under cProfile (one .prof file per stage,
+# and its most expensive functions in the report) and under tracemalloc
+# (peak of the Python allocations during the stage; slows the run down).
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in KB on Linux, in bytes on macOS
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _row_count(tables):
+    return sum(len(rows) for _, rows in tables)
+
+
+class StageProfiler:
+    """Wall time, rows, rows/sec and peak memory of every generation stage"""
+
+    def __init__(self, cprofile_dir=None, trace_memory=False, top=10):
+        self.cprofile_dir = cprofile_dir
+        self.trace_memory = trace_memory
+        self.top = top
+        self.stages = {}          # name -> stats, in the order of the first call
+        self.started = time.perf_counter()
+        self.depth = 0
+        if cprofile_dir:
+            os.makedirs(cprofile_dir, exist_ok=True)
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name):
+        """Time the block as stage 'name'; set ['rows'] of the yielded dict
+        to the rows it produced"""
+        record = {'rows': 0}
+        stats = self.stages.setdefault(name, {
+            'calls': 0, 'seconds': 0.0, 'rows': 0, 'peak_rss_mb': None,
+            'rss_growth_mb': None, 'traced_peak_mb': None})
+        # cProfile and tracemalloc follow the outermost stage only
+        outermost = self.depth == 0
+        self.depth += 1
+        profile = None
+        if outermost and self.cprofile_dir:
+            profile = cProfile.Profile()
+        if outermost and self.trace_memory:
+            tracemalloc.reset_peak()
+        rss_before = _peak_rss_mb()
+        start = time.perf_counter()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield record
+        finally:
+            if profile is not None:
+                profile.disable()
+            seconds = time.perf_counter() - start
+            self.depth -= 1
+            stats['calls'] += 1
+            stats['seconds'] += seconds
+            stats['rows'] += record['rows']
+            stats['peak_rss_mb'] = _peak_rss_mb()
+            if rss_before is not None:
+                stats['rss_growth_mb'] = round((stats['rss_growth_mb'] or 0)
+                                               + stats['peak_rss_mb'] - rss_before, 1)
+            if outermost and self.trace_memory:
+                peak = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+                stats['traced_peak_mb'] = max(stats['traced_peak_mb'] or 0, peak)
+            if profile is not None:
+                self._save_profile(name, stats, profile)
+
+    def _save_profile(self, name, stats, profile):
+        suffix = f"_{stats['calls']}" if stats['calls'] > 1 else ''
+        profile.dump_stats(os.path.join(self.cprofile_dir, f'{name}{suffix}.prof'))
+        output = io.StringIO()
+        pstats.Stats(profile, stream=output).sort_stats('cumulative').print_stats(self.top)
+        # keep the table rows of print_stats: "ncalls tottime ... function"
+        lines = output.getvalue().splitlines()
+        header = next((i for i, line in enumerate(lines) if line.lstrip().startswith('ncalls')), None)
+        if header is not None:
+            stats['profile_top'] = [line.strip() for line in lines[header + 1:] if line.strip()]
+
+    def attach(self, generator):
+        """Record every generate_* and save_to_* call of a DataGenerator"""
+        for name in dir(generator):
+            if name.startswith('generate_'):
+                setattr(generator, name, self._wrap_generate(generator, name))
+            elif name in ('save_to_sql', 'save_to_files', 'save_to_shards'):
+                setattr(generator, name, self._wrap_save(generator, name))
+        return generator
+
+    def _wrap_generate(self, generator, name):
+        method = getattr(generator, name)
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            with self.stage(name) as record:
+                before = _row_count(generator.tables())
+                result = method(*args, **kwargs)
+                record['rows'] = _row_count(generator.tables()) - before
+            return result
+        return wrapper
+
+    def _wrap_save(self, generator, name):
+        method = getattr(generator, name)
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            with self.stage(name) as record:
+                result = method(*args, **kwargs)
+                record['rows'] = _row_count(kwargs.get('tables') or generator.tables())
+            return result
+        return wrapper
+
+    def report(self, **info):
+        """The stages as a JSON-able dict; 'info' is added at the top level"""
+        stages = []
+        for name, stats in self.stages.items():
+            entry = dict(stats, name=name, seconds=round(stats['seconds'], 4))
+            entry['rows_per_sec'] = round(stats['rows'] / stats['seconds']) if stats['seconds'] else None
+            stages.append(entry)
+        return dict(info, created=datetime.now().isoformat(timespec='seconds'),
+                    total_seconds=round(time.perf_counter() - self.started, 3),
+                    peak_rss_mb=_peak_rss_mb(), stages=stages)
+
+    def write(self, path, **info):
+        report = self.report(**info)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        return report
+
+    def print_summary(self):
+        total = time.perf_counter() - self.started
+        print(f"\n{'stage':<30}{'calls':>6}{'seconds':>10}{'share':>7}{'rows':>11}{'rows/sec':>12}"
+              f"{'peak MB':>9}{'traced MB':>10}")
+        for name, stats in sorted(self.stages.items(), key=lambda item: -item[1]['seconds']):
+            rate = f"{stats['rows'] / stats['seconds']:,.0f}" if stats['seconds'] and stats['rows'] else '-'
+            peak = stats['peak_rss_mb'] if stats['peak_rss_mb'] is not None else '-'
+            traced = stats['traced_peak_mb'] if stats['traced_peak_mb'] is not None else '-'
+            print(f"{name:<30}{stats['calls']:>6}{stats['seconds']:>10.3f}{stats['seconds'] / total:>7.0%}"
+                  f"{stats['rows']:>11,}{rate:>12}{peak:>9}{traced:>10}")
+        print(f"{'total':<30}{'':>6}{total:>10.3f}")
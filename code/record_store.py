@@ -0,0 +1,162 @@
+from array import array
+from datetime import date, datetime, timedelta
+from itertools import islice
+
+from writers import TABLE_COLUMNS
+
+# Column-oriented storage for the large generated tables.
+#
+# A list of dicts costs several hundred bytes per row. A Table keeps one typed
+# array per column instead (ids, prices, dates and times as machine numbers,
+# categorical strings as small integer codes) and only builds a dict when a
+# row is read, so code written against the lists of dicts keeps working.
+
+NULL_INT = -2 ** 63
+
+
+class CategoricalColumn:
+    """Strings from a small set of values, stored as codes into that set"""
+
+    def __init__(self):
+        self.categories = []
+        self.index = {}
+        self.codes = array('B')
+
+    def append(self, value):
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.categories)
+            self.categories.append(value)
+            if code > 255 and self.codes.typecode == 'B':
+                self.codes = array('I', self.codes)
+        self.codes.append(code)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        return self.categories[self.codes[i]]
+
+    def __iter__(self):
+        categories = self.categories
+        return (categories[code] for code in self.codes)
+
+
+def _seconds(text):
+    hours, minutes, seconds = text.split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+
+def _datetime_seconds(text):
+    value = datetime.fromisoformat(text)
+    return value.toordinal() * 86400 + value.hour * 3600 + value.minute * 60 + value.second
+
+
+def _datetime_text(seconds):
+    day, seconds = divmod(seconds, 86400)
+    return (f'{date.fromordinal(day).isoformat()} '
+            f'{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}')
+
+
+# storage kind -> (new column, encode, decode); None means stored as is
+STORAGE_KINDS = {
+    'int': (lambda: array('q'), None, None),
+    'int?': (lambda: array('q'),
+             lambda v: NULL_INT if v is None else v,
+             lambda v: None if v == NULL_INT else v),
+    'float': (lambda: array('d'), None, None),
+    'bool': (lambda: array('b'), int, bool),
+    'str': (list, None, None),
+    'cat': (CategoricalColumn, None, None),
+    'date': (lambda: array('i'), date.toordinal, date.fromordinal),
+    'date_str': (lambda: array('i'),
+                 lambda v: date.fromisoformat(v).toordinal(),
+                 lambda v: date.fromordinal(v).isoformat()),
+    'datetime_str': (lambda: array('q'), _datetime_seconds, _datetime_text),
+    'time': (lambda: array('i'),
+             lambda v: int(v.total_seconds()),
+             lambda v: timedelta(seconds=v)),
+    'time_str': (lambda: array('i'), _seconds, lambda v: str(timedelta(seconds=v))),
+    'ean13': (lambda: array('q'), int, lambda v: '%013d' % v),
+}
+
+# Columns stored more compactly than their writer kind in TABLE_COLUMNS
+STORAGE_OVERRIDES = {
+    ('Performance', 'start_time'): 'datetime_str',
+    ('Performance', 'duration'): 'time_str',
+    ('Performance', 'type'): 'cat',
+    ('Visitor', 'first_name'): 'cat',
+    ('Visitor', 'last_name'): 'cat',
+    ('Ticket', 'ticket_category'): 'cat',
+    ('Ticket', 'purchase_date'): 'date_str',
+    ('Ticket', 'payment_method'): 'cat',
+    ('Ticket', 'ean_code'): 'ean13',
+    ('resale_interest', 'ticket_category'): 'cat',
+    ('resale_interest', 'expressed_on'): 'datetime_str',
+    ('Staff_Assignment', 'staff_role'): 'cat',
+}
+
+
+class Table:
+    """Rows of one table of install.sql, stored column by column.
+
+    Rows go in and come out as dicts keyed by column name; reading a row
+    decodes it, so prefer values() or rows() for scans over a few columns.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.names = []
+        self.columns = {}
+        self.encoders = {}
+        self.decoders = {}
+        for column, kind in TABLE_COLUMNS[name]:
+            new, encode, decode = STORAGE_KINDS[STORAGE_OVERRIDES.get((name, column), kind)]
+            self.names.append(column)
+            self.columns[column] = new()
+            self.encoders[column] = encode
+            self.decoders[column] = decode
+        self._append = [(self.columns[c].append, self.encoders[c], c) for c in self.names]
+
+    def append(self, row):
+        for append, encode, column in self._append:
+            append(row[column] if encode is None else encode(row[column]))
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def __len__(self):
+        return len(self.columns[self.names[0]])
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [dict(zip(self.names, values))
+                    for values in islice(self.rows(), *i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        row = {}
+        for column in self.names:
+            value = self.columns[column][i]
+            decode = self.decoders[column]
+            row[column] = value if decode is None else decode(value)
+        return row
+
+    def __iter__(self):
+        names = self.names
+        for values in self.rows():
+            yield dict(zip(names, values))
+
+    def values(self, column):
+        """Iterate over the decoded values of one column"""
+        decode = self.decoders[column]
+        if decode is None:
+            return iter(self.columns[column])
+        return map(decode, self.columns[column])
+
+    def rows(self, columns=None):
+        """Iterate over rows as tuples of the given columns (all by default)"""
+        return zip(*[self.values(column) for column in (columns or self.names)])
+
+    def __repr__(self):
+        return f'<Table {self.name}: {len(self)} rows>'
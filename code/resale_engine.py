@@ -0,0 +1,241 @@
+from collections import defaultdict, deque
+
+# Resale matching as listings and interest arrive.
+#
+# install.sql matches resale tickets with two procedures run every 30 seconds
+# by the event scheduler: check_resale_ticket() moves every ticket marked
+# is_resale into resale_queue, and match_all_interested_to_resale_tickets()
+# pairs the whole queue with the whole resale_interest table. Buyers wait for
+# the next run, and every run costs the size of the backlog.
+#
+# ResaleEngine keeps one order book per (event_id, ticket_category) in
+# memory and matches each listing or interest when it arrives, like the
+# triggers that came before the procedures: the oldest waiting interest gets
+# a new listing, and a new interest gets the oldest waiting listing
+# (lifo_listings=True gives it the newest one, as the procedure's ranking
+# does). Results reach the database in batches through a store object, see
+# SqlResaleStore.
+
+
+class Listing:
+    __slots__ = ('ticket_id', 'seller_id', 'event_id', 'ticket_category', 'listed_on', 'purchase_date')
+
+    def __init__(self, ticket_id, seller_id, event_id, ticket_category, listed_on, purchase_date=None):
+        self.ticket_id = ticket_id
+        self.seller_id = seller_id
+        self.event_id = event_id
+        self.ticket_category = ticket_category
+        self.listed_on = listed_on
+        # the seller's purchase date, which the store clears while the
+        # ticket is listed and gives back on a withdrawal
+        self.purchase_date = purchase_date
+
+
+class Interest:
+    __slots__ = ('interest_id', 'visitor_id', 'event_id', 'ticket_category', 'expressed_on')
+
+    def __init__(self, interest_id, visitor_id, event_id, ticket_category, expressed_on):
+        self.interest_id = interest_id
+        self.visitor_id = visitor_id
+        self.event_id = event_id
+        self.ticket_category = ticket_category
+        self.expressed_on = expressed_on
+
+
+class Match:
+    __slots__ = ('listing', 'interest', 'matched_on', 'listing_saved', 'interest_saved')
+
+    def __init__(self, listing, interest, matched_on, listing_saved, interest_saved):
+        self.listing = listing
+        self.interest = interest
+        self.matched_on = matched_on
+        # whether the listing / interest rows were written and must be deleted
+        self.listing_saved = listing_saved
+        self.interest_saved = interest_saved
+
+
+class ResaleEngine:
+    """In-memory resale order books with batched persistence.
+
+    'store' receives the changes in batches of 'batch_size' (see
+    SqlResaleStore for the methods it needs); without one the engine only
+    keeps the books. Times are 'YYYY-MM-DD HH:MM:SS' strings. Withdrawn
+    listings are dropped lazily when they reach the front of their book.
+    """
+
+    def __init__(self, store=None, batch_size=500, lifo_listings=False):
+        self.store = store
+        self.batch_size = batch_size
+        self.lifo_listings = lifo_listings
+        self.listings = defaultdict(deque)     # (event_id, category) -> Listing
+        self.interests = defaultdict(deque)    # (event_id, category) -> Interest
+        self.listed = {}                       # ticket id -> its Listing in a book
+
+        # Changes not yet written to the store. Entries that are matched
+        # before a flush never reach the waiting tables at all.
+        self.new_listings = {}                 # ticket id -> Listing
+        self.new_interests = {}                # interest id -> Interest
+        self.matches = []
+        self.pending = 0
+        self.match_count = 0
+
+    def restore(self):
+        """Fill the books with what is waiting in the store, oldest first"""
+        listings, interests = self.store.waiting()
+        for listing in listings:
+            self.listings[(listing.event_id, listing.ticket_category)].append(listing)
+            self.listed[listing.ticket_id] = listing
+        for interest in interests:
+            self.interests[(interest.event_id, interest.ticket_category)].append(interest)
+
+    def list_ticket(self, ticket_id, seller_id, event_id, ticket_category, listed_on):
+        """A ticket is offered for resale; returns the Match if a buyer was waiting"""
+        listing = Listing(ticket_id, seller_id, event_id, ticket_category, listed_on)
+        waiting = self.interests.get((event_id, ticket_category))
+        if waiting:
+            interest = waiting.popleft()
+            saved = self.new_interests.pop(interest.interest_id, None) is None
+            return self._match(listing, interest, listed_on, False, saved)
+        self.listings[(event_id, ticket_category)].append(listing)
+        self.listed[ticket_id] = listing
+        self.new_listings[ticket_id] = listing
+        self._changed()
+        return None
+
+    def express_interest(self, interest_id, visitor_id, event_id, ticket_category, expressed_on):
+        """A visitor wants a ticket; returns the Match if one was listed"""
+        interest = Interest(interest_id, visitor_id, event_id, ticket_category, expressed_on)
+        listing = self._take_listing((event_id, ticket_category))
+        if listing is not None:
+            saved = self.new_listings.pop(listing.ticket_id, None) is None
+            return self._match(listing, interest, expressed_on, saved, False)
+        self.interests[(event_id, ticket_category)].append(interest)
+        self.new_interests[interest_id] = interest
+        self._changed()
+        return None
+
+    def withdraw(self, ticket_id):
+        """Give a waiting listing back to its seller; False if it was not waiting"""
+        listing = self.listed.pop(ticket_id, None)
+        if listing is None:
+            return False
+        if self.new_listings.pop(ticket_id, None) is None and self.store is not None:
+            self.store.withdraw(listing)
+        return True
+
+    def _take_listing(self, key):
+        book = self.listings.get(key)
+        while book:
+            listing = book.pop() if self.lifo_listings else book.popleft()
+            # skip withdrawn listings
+            if self.listed.get(listing.ticket_id) is listing:
+                del self.listed[listing.ticket_id]
+                return listing
+        return None
+
+    def _match(self, listing, interest, matched_on, listing_saved, interest_saved):
+        # A counterpart still waiting to be written is never written at all
+        match = Match(listing, interest, matched_on, listing_saved, interest_saved)
+        self.matches.append(match)
+        self.match_count += 1
+        self._changed()
+        return match
+
+    def _changed(self):
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write the changes since the last flush to the store"""
+        if self.store is not None and self.pending:
+            self.store.save(list(self.new_listings.values()), list(self.new_interests.values()),
+                            self.matches)
+        self.new_listings = {}
+        self.new_interests = {}
+        self.matches = []
+        self.pending = 0
+
+
+class SqlResaleStore:
+    """Persists a ResaleEngine to the install.sql tables through a db.Database.
+
+    A waiting listing is a resale_queue row with its ticket taken off the
+    seller (as check_resale_ticket() does); a match moves the ticket to the
+    buyer and deletes the queue and interest rows, like
+    match_all_interested_to_resale_tickets(). The seller's purchase date is
+    kept on the Listing for a withdrawal; resale_queue has no column for it,
+    so listings restored by waiting() give the ticket back without one.
+    """
+
+    def __init__(self, database):
+        self.database = database
+        self.connection = database.connection
+        p = database.placeholder
+        self.insert_listing = (f'INSERT INTO resale_queue (ticket_id, listed_by, event_id, ticket_category, listed_on) '
+                               f'VALUES ({p}, {p}, {p}, {p}, {p})')
+        self.release_ticket = (f'UPDATE ticket SET visitor_id = NULL, purchase_date = NULL, is_resale = FALSE '
+                               f'WHERE ticket_id = {p}')
+        self.insert_interest = (f'INSERT INTO resale_interest (interest_id, interested_visitor_id, event_id, '
+                                f'ticket_category, expressed_on) VALUES ({p}, {p}, {p}, {p}, {p})')
+        self.sell_ticket = (f'UPDATE ticket SET visitor_id = {p}, purchase_date = {p}, is_resale = FALSE '
+                            f'WHERE ticket_id = {p}')
+        self.delete_listing = f'DELETE FROM resale_queue WHERE ticket_id = {p}'
+
+    def waiting(self):
+        """(listings, interests) waiting in the database, oldest first"""
+        listings = [Listing(*row) for row in self.database.execute(
+            'SELECT ticket_id, listed_by, event_id, ticket_category, listed_on '
+            'FROM resale_queue ORDER BY listed_on, resale_id')]
+        interests = [Interest(*row) for row in self.database.execute(
+            'SELECT interest_id, interested_visitor_id, event_id, ticket_category, expressed_on '
+            'FROM resale_interest ORDER BY expressed_on, interest_id')]
+        return listings, interests
+
+    def save(self, listings, interests, matches):
+        cursor = self.connection.cursor()
+        if listings:
+            self._read_purchase_dates(cursor, listings)
+            cursor.executemany(self.insert_listing, [
+                (l.ticket_id, l.seller_id, l.event_id, l.ticket_category, l.listed_on) for l in listings])
+            cursor.executemany(self.release_ticket, [(l.ticket_id,) for l in listings])
+        if interests:
+            cursor.executemany(self.insert_interest, [
+                (i.interest_id, i.visitor_id, i.event_id, i.ticket_category, i.expressed_on)
+                for i in interests])
+        if matches:
+            cursor.executemany(self.sell_ticket, [
+                (m.interest.visitor_id, m.matched_on[:10], m.listing.ticket_id) for m in matches])
+            # resale_queue has no index on ticket_id: one scan per batch
+            self._delete_in(cursor, 'resale_queue', 'ticket_id',
+                            [m.listing.ticket_id for m in matches if m.listing_saved])
+            self._delete_in(cursor, 'resale_interest', 'interest_id',
+                            [m.interest.interest_id for m in matches if m.interest_saved])
+        cursor.close()
+        self.connection.commit()
+
+    def _read_purchase_dates(self, cursor, listings, chunk=500):
+        # before release_ticket clears them
+        by_ticket = {listing.ticket_id: listing for listing in listings}
+        ids = list(by_ticket)
+        for i in range(0, len(ids), chunk):
+            part = ids[i:i + chunk]
+            placeholders = ', '.join([self.database.placeholder] * len(part))
+            cursor.execute(f'SELECT ticket_id, purchase_date FROM ticket WHERE ticket_id IN ({placeholders})', part)
+            for ticket_id, purchase_date in cursor.fetchall():
+                by_ticket[ticket_id].purchase_date = purchase_date
+
+    def _delete_in(self, cursor, table, column, ids, chunk=500):
+        for i in range(0, len(ids), chunk):
+            part = ids[i:i + chunk]
+            placeholders = ', '.join([self.database.placeholder] * len(part))
+            cursor.execute(f'DELETE FROM {table} WHERE {column} IN ({placeholders})', part)
+
+    def withdraw(self, listing):
+        p = self.database.placeholder
+        cursor = self.connection.cursor()
+        cursor.execute(self.delete_listing, (listing.ticket_id,))
+        cursor.execute(f'UPDATE ticket SET visitor_id = {p}, purchase_date = {p} WHERE ticket_id = {p}',
+                       (listing.seller_id, listing.purchase_date, listing.ticket_id))
+        cursor.close()
+        self.connection.commit()
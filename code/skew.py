@@ -0,0 +1,80 @@
+import random
+
+# Power-law (Zipf) popularity for the skewed workload mode.
+#
+# The item of popularity rank k (1 = most popular) gets the weight 1 / k**s.
+# s = 0 is the uniform default, around 1 a few headliner events sell out
+# first, a handful of artists play most of the performances and power users
+# buy many tickets; larger exponents concentrate the load further. The ranks
+# are a seeded shuffle of the items, so the hot items are not just the
+# lowest ids.
+
+SKEW_KINDS = ('events', 'artists', 'visitors')
+
+
+def parse_skew(text):
+    """'1.1' (every kind) or 'events=1.2,visitors=0.8' -> {kind: exponent}"""
+    if '=' not in text:
+        return dict.fromkeys(SKEW_KINDS, float(text))
+    skew = dict.fromkeys(SKEW_KINDS, 0.0)
+    for part in text.split(','):
+        kind, _, exponent = part.partition('=')
+        if kind not in skew:
+            raise ValueError(f"unknown skew '{kind}', expected one of {', '.join(SKEW_KINDS)}")
+        skew[kind] = float(exponent)
+    return skew
+
+
+def zipf_weights(items, exponent, seed):
+    """{item: weight} for 'items', ranked in a shuffle seeded by 'seed'"""
+    order = list(items)
+    random.Random(seed).shuffle(order)
+    return {item: rank ** -exponent for rank, item in enumerate(order, 1)}
+
+
+class WeightedSampler:
+    """Draw indexes 0..n-1 in proportion to their weights.
+
+    The weights sit in a Fenwick tree, so a draw and a weight change (e.g. to
+    0 for an event that sold out) both take O(log n).
+    """
+
+    def __init__(self, weights):
+        self.weights = list(weights)
+        n = len(self.weights)
+        self.tree = [0.0] + self.weights
+        for i in range(1, n + 1):
+            j = i + (i & -i)
+            if j <= n:
+                self.tree[j] += self.tree[i]
+        self.top = 1 << (n.bit_length() - 1) if n else 0
+
+    def total(self):
+        i, total = len(self.weights), 0.0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def set(self, index, weight):
+        delta = weight - self.weights[index]
+        self.weights[index] = weight
+        i = index + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def draw(self, rng):
+        """An index drawn by weight; the total weight must be positive"""
+        while True:
+            remaining = rng.random() * self.total()
+            position, step = 0, self.top
+            while step:
+                following = position + step
+                if following < len(self.tree) and self.tree[following] <= remaining:
+                    position = following
+                    remaining -= self.tree[following]
+                step >>= 1
+            # rounding in the tree can land on a zero weight; draw again
+            if position < len(self.weights) and self.weights[position] > 0:
+                return position
@@ -0,0 +1,257 @@
+import argparse
+import os
+import random
+import sys
+from collections import Counter
+
+from benchmark_queries import _normalize
+from db import SQL_DIR, add_connection_arguments, connect_from_args, sqlite_schema
+from generate_data import build_dataset, scaled_counts
+
+# The summary tables of sql/summary.sql (revenue per year and payment method,
+# review scores per artist and per visitor and artist) and a consistency
+# check of their contents against a full recomputation.
+#
+# On MariaDB the tables and their triggers come from running summary.sql. On
+# SQLite add_summaries() creates the tables from the same file and the
+# triggers from the translations below (SQLite has no procedures, so their
+# bodies are inlined, with ON CONFLICT for ON DUPLICATE KEY UPDATE).
+
+SUMMARY_SQL = os.path.join(SQL_DIR, 'summary.sql')
+
+# table -> query computing it from scratch; the same queries as
+# refresh_summaries() in summary.sql
+SUMMARIES = {
+    'revenue_summary':
+        """SELECT f.year, t.payment_method, COALESCE(SUM(t.price), 0) AS total_revenue, COUNT(*) AS tickets
+           FROM ticket t
+           JOIN event e ON t.event_id = e.event_id
+           JOIN festival f ON e.festival_id = f.festival_id
+           GROUP BY f.year, t.payment_method""",
+    'artist_rating_summary':
+        """SELECT pm.artist_id, COUNT(*) AS reviews, SUM(r.interpretation) AS interpretation_sum,
+                  SUM(r.lights_sound) AS lights_sound_sum, SUM(r.stage_presence) AS stage_presence_sum,
+                  SUM(r.organization) AS organization_sum, SUM(r.overall_impression) AS overall_impression_sum
+           FROM review r
+           JOIN performance_members pm ON r.performance_id = pm.performance_id
+           WHERE pm.artist_id IS NOT NULL
+           GROUP BY pm.artist_id""",
+    'visitor_artist_rating_summary':
+        """SELECT r.visitor_id, pm.artist_id, COUNT(*) AS reviews,
+                  SUM(r.interpretation + r.lights_sound + r.stage_presence + r.organization
+                      + r.overall_impression) AS total_score
+           FROM review r
+           JOIN performance_members pm ON r.performance_id = pm.performance_id
+           WHERE pm.artist_id IS NOT NULL AND r.visitor_id IS NOT NULL
+           GROUP BY r.visitor_id, pm.artist_id""",
+}
+
+# The count column: rows where it dropped to 0 are kept but mean "no group"
+COUNT_COLUMN = {'revenue_summary': 'tickets', 'artist_rating_summary': 'reviews',
+                'visitor_artist_rating_summary': 'reviews'}
+
+_RATINGS = ['interpretation', 'lights_sound', 'stage_presence', 'organization', 'overall_impression']
+
+# Statement templates of the SQLite triggers: {row} is NEW or OLD, {sign} 1 or -1
+_REVENUE = """INSERT INTO revenue_summary (year, payment_method, total_revenue, tickets)
+       SELECT f.year, {row}.payment_method, {sign} * COALESCE({row}.price, 0), {sign}
+       FROM event e JOIN festival f ON e.festival_id = f.festival_id
+       WHERE e.event_id = {row}.event_id
+       ON CONFLICT (year, payment_method) DO UPDATE SET
+           total_revenue = total_revenue + excluded.total_revenue, tickets = tickets + excluded.tickets;"""
+
+_ARTIST_UPDATE = ', '.join(f'{r}_sum = {r}_sum + excluded.{r}_sum' for r in _RATINGS)
+
+_REVIEW = f"""INSERT INTO artist_rating_summary (artist_id, reviews, {', '.join(r + '_sum' for r in _RATINGS)})
+       SELECT pm.artist_id, {{sign}}, {', '.join(f'{{sign}} * {{row}}.{r}' for r in _RATINGS)}
+       FROM performance_members pm
+       WHERE pm.performance_id = {{row}}.performance_id AND pm.artist_id IS NOT NULL
+       ON CONFLICT (artist_id) DO UPDATE SET reviews = reviews + excluded.reviews, {_ARTIST_UPDATE};
+     INSERT INTO visitor_artist_rating_summary (visitor_id, artist_id, reviews, total_score)
+       SELECT {{row}}.visitor_id, pm.artist_id, {{sign}}, {{sign}} * ({' + '.join('{row}.' + r for r in _RATINGS)})
+       FROM performance_members pm
+       WHERE pm.performance_id = {{row}}.performance_id AND pm.artist_id IS NOT NULL
+         AND {{row}}.visitor_id IS NOT NULL
+       ON CONFLICT (visitor_id, artist_id) DO UPDATE SET
+           reviews = reviews + excluded.reviews, total_score = total_score + excluded.total_score;"""
+
+_MEMBER = f"""INSERT INTO artist_rating_summary (artist_id, reviews, {', '.join(r + '_sum' for r in _RATINGS)})
+       SELECT {{row}}.artist_id, {{sign}} * COUNT(*), {', '.join(f'{{sign}} * SUM(r.{r})' for r in _RATINGS)}
+       FROM review r
+       WHERE r.performance_id = {{row}}.performance_id AND {{row}}.artist_id IS NOT NULL
+       GROUP BY r.performance_id
+       ON CONFLICT (artist_id) DO UPDATE SET reviews = reviews + excluded.reviews, {_ARTIST_UPDATE};
+     INSERT INTO visitor_artist_rating_summary (visitor_id, artist_id, reviews, total_score)
+       SELECT r.visitor_id, {{row}}.artist_id, {{sign}} * COUNT(*),
+              {{sign}} * SUM({' + '.join('r.' + r for r in _RATINGS)})
+       FROM review r
+       WHERE r.performance_id = {{row}}.performance_id AND {{row}}.artist_id IS NOT NULL
+         AND r.visitor_id IS NOT NULL
+       GROUP BY r.visitor_id
+       ON CONFLICT (visitor_id, artist_id) DO UPDATE SET
+           reviews = reviews + excluded.reviews, total_score = total_score + excluded.total_score;"""
+
+
+def _trigger(name, event, body, when=None):
+    when = f'WHEN {when} ' if when else ''
+    return f'CREATE TRIGGER IF NOT EXISTS {name} {event} FOR EACH ROW {when}BEGIN\n     {body}\n   END'
+
+
+def sqlite_summary_triggers():
+    """The triggers of summary.sql in SQLite syntax"""
+    old = lambda template: template.format(row='OLD', sign=-1)
+    new = lambda template: template.format(row='NEW', sign=1)
+    return [
+        _trigger('trg_revenue_summary_insert', 'AFTER INSERT ON ticket', new(_REVENUE)),
+        # resales only change the visitor
+        _trigger('trg_revenue_summary_update', 'AFTER UPDATE OF event_id, payment_method, price ON ticket',
+                 old(_REVENUE) + '\n     ' + new(_REVENUE),
+                 when='NOT (OLD.event_id IS NEW.event_id AND OLD.payment_method IS NEW.payment_method '
+                      'AND OLD.price IS NEW.price)'),
+        _trigger('trg_revenue_summary_delete', 'AFTER DELETE ON ticket', old(_REVENUE)),
+        _trigger('trg_rating_summary_insert', 'AFTER INSERT ON review', new(_REVIEW)),
+        _trigger('trg_rating_summary_update', 'AFTER UPDATE ON review', old(_REVIEW) + '\n     ' + new(_REVIEW)),
+        _trigger('trg_rating_summary_delete', 'AFTER DELETE ON review', old(_REVIEW)),
+        _trigger('trg_rating_summary_member_insert', 'AFTER INSERT ON performance_members', new(_MEMBER),
+                 when='NEW.artist_id IS NOT NULL'),
+        _trigger('trg_rating_summary_member_delete', 'AFTER DELETE ON performance_members', old(_MEMBER),
+                 when='OLD.artist_id IS NOT NULL'),
+        # the member templates skip a NULL artist_id of either side
+        _trigger('trg_rating_summary_member_update', 'AFTER UPDATE OF performance_id, artist_id ON performance_members',
+                 old(_MEMBER) + '\n     ' + new(_MEMBER),
+                 when='NOT (OLD.performance_id IS NEW.performance_id AND OLD.artist_id IS NEW.artist_id)'),
+    ]
+
+
+def refresh_summaries(database):
+    """Recompute every summary table from scratch"""
+    cursor = database.connection.cursor()
+    for table, query in SUMMARIES.items():
+        cursor.execute(f'DELETE FROM {table}')
+        cursor.execute(f'INSERT INTO {table} {query}')
+    cursor.close()
+    database.connection.commit()
+
+
+def add_summaries(database):
+    """Create the summary tables and triggers (SQLite) and fill the tables.
+
+    MariaDB gets them from sql/summary.sql; here they are only refreshed.
+    """
+    if database.engine == 'sqlite':
+        for statement in sqlite_schema(SUMMARY_SQL) + sqlite_summary_triggers():
+            database.connection.execute(statement)
+    refresh_summaries(database)
+
+
+def check_summaries(database):
+    """{table: (missing or wrong rows, unexpected rows)} of the tables that
+    differ from a full recomputation; empty when they are all consistent"""
+    differences = {}
+    for table, query in SUMMARIES.items():
+        want = Counter(tuple(map(_normalize, row)) for row in database.execute(query))
+        stored = database.execute(f'SELECT * FROM {table} WHERE {COUNT_COLUMN[table]} <> 0')
+        got = Counter(tuple(map(_normalize, row)) for row in stored)
+        if got != want:
+            differences[table] = (list(want - got), list(got - want))
+    return differences
+
+
+def apply_changes(database, count, seed=42):
+    """Random ticket, review and performance_members changes, for the
+    triggers to keep up with. Changes that break a constraint are skipped.
+
+    Returns {change: times applied}.
+    """
+    rng = random.Random(seed)
+    p = database.placeholder
+    ids = lambda sql: [row[0] for row in database.execute(sql)]
+    tickets = ids('SELECT ticket_id FROM ticket')
+    events = ids('SELECT event_id FROM event')
+    visitors = ids('SELECT visitor_id FROM visitor')
+    performances = ids('SELECT performance_id FROM performance')
+    artists = ids('SELECT artist_id FROM artist')
+    reviews = ids('SELECT review_id FROM review')
+    members = ids('SELECT performance_members_id FROM performance_members')
+    methods = ['credit_card', 'debit_card', 'bank_transfer']
+    scores = lambda: [rng.randint(1, 5) for _ in _RATINGS]
+
+    changes = {
+        'ticket_insert': lambda: (
+            f'INSERT INTO ticket (event_id, visitor_id, ticket_category, price, purchase_date, '
+            f'payment_method, ean_code) VALUES ({p}, {p}, {p}, {p}, {p}, {p}, {p})',
+            [rng.choice(events), rng.choice(visitors), 'general', round(rng.uniform(50, 200), 2),
+             '2025-01-01', rng.choice(methods), '%013d' % rng.randrange(10 ** 13)]),
+        'ticket_price': lambda: (f'UPDATE ticket SET price = {p}, payment_method = {p} WHERE ticket_id = {p}',
+                                 [round(rng.uniform(50, 500), 2), rng.choice(methods), rng.choice(tickets)]),
+        'ticket_event': lambda: (f'UPDATE ticket SET event_id = {p} WHERE ticket_id = {p}',
+                                 [rng.choice(events), rng.choice(tickets)]),
+        'ticket_resale': lambda: (f'UPDATE ticket SET visitor_id = {p} WHERE ticket_id = {p}',
+                                  [rng.choice(visitors), rng.choice(tickets)]),
+        'ticket_delete': lambda: (f'DELETE FROM ticket WHERE ticket_id = {p}', [rng.choice(tickets)]),
+        'review_insert': lambda: (
+            f"INSERT INTO review (visitor_id, performance_id, {', '.join(_RATINGS)}) "
+            f"VALUES ({', '.join([p] * (2 + len(_RATINGS)))})",
+            [rng.choice(visitors), rng.choice(performances)] + scores()),
+        'review_update': lambda: (
+            f"UPDATE review SET {', '.join(r + ' = ' + p for r in _RATINGS)} WHERE review_id = {p}",
+            scores() + [rng.choice(reviews)]),
+        'review_move': lambda: (f'UPDATE review SET performance_id = {p} WHERE review_id = {p}',
+                                [rng.choice(performances), rng.choice(reviews)]),
+        'review_delete': lambda: (f'DELETE FROM review WHERE review_id = {p}', [rng.choice(reviews)]),
+        'member_insert': lambda: (f'INSERT INTO performance_members (performance_id, artist_id) VALUES ({p}, {p})',
+                                  [rng.choice(performances), rng.choice(artists)]),
+        'member_update': lambda: (f'UPDATE performance_members SET artist_id = {p} WHERE performance_members_id = {p}',
+                                  [rng.choice(artists), rng.choice(members)]),
+        'member_delete': lambda: (f'DELETE FROM performance_members WHERE performance_members_id = {p}',
+                                  [rng.choice(members)]),
+    }
+    applied = Counter()
+    cursor = database.connection.cursor()
+    for name in rng.choices(list(changes), k=count):
+        sql, params = changes[name]()
+        try:
+            cursor.execute(sql, params)
+        except Exception:
+            # a UNIQUE or CHECK constraint (or install.sql trigger) said no
+            database.connection.rollback()
+            continue
+        database.connection.commit()
+        applied[name] += 1
+    cursor.close()
+    return applied
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check the summary tables of sql/summary.sql against '
+                                                 'a full recomputation')
+    parser.add_argument('--scale', type=float, default=1,
+                        help='SQLite: dataset to generate, load and summarize (default 1)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--changes', type=int, default=2000,
+                        help='SQLite: random ticket/review/member changes to apply before checking (default 2000)')
+    add_connection_arguments(parser)
+    args = parser.parse_args()
+
+    database = connect_from_args(args)
+    if args.engine == 'sqlite':
+        generator = build_dataset(scaled_counts(args.scale), seed=args.seed)
+        database.load_tables(generator.tables())
+        add_summaries(database)
+        applied = apply_changes(database, args.changes, args.seed)
+        print(f"Applied {sum(applied.values())} changes: "
+              + ', '.join(f'{name} {n}' for name, n in sorted(applied.items())))
+
+    differences = check_summaries(database)
+    database.close()
+    for table in SUMMARIES:
+        if table not in differences:
+            print(f'{table}: consistent')
+            continue
+        missing, unexpected = differences[table]
+        print(f'{table}: {len(missing)} rows missing or wrong, {len(unexpected)} unexpected')
+        for row in missing[:5]:
+            print(f'  expected {row}')
+        for row in unexpected[:5]:
+            print(f'  stored   {row}')
+    sys.exit(1 if differences else 0)
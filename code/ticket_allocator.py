@@ -0,0 +1,179 @@
+import math
+from array import array
+
+from skew import WeightedSampler
+
+# Weighted visitor draws per ticket before falling back to the shuffle, for
+# events whose likeliest visitors all hold a ticket already
+VISITOR_TRIES = 8
+
+
+class TicketAllocator:
+    """Capacity-aware allocation of visitors to event seats.
+
+    Replaces rejection sampling over random (visitor, event) pairs. Each
+    event keeps its remaining capacity and VIP quota in flat arrays and hands
+    out visitors through a lazy Fisher-Yates shuffle, so a visitor is never
+    drawn twice for the same event (UNIQUE(visitor_id, event_id)) and no draw
+    is ever rejected. Sales are drawn among the events that still have seats;
+    the purchase attempts that would have landed on sold-out events in between
+    become resale_interest rows, as before.
+
+    With 'event_weights' / 'visitor_weights' ({id: weight}, see skew.py)
+    events are picked and visitors buy in proportion to their weights
+    instead of uniformly.
+    """
+
+    def __init__(self, events, capacities, visitor_ids, tickets=(), rng=None,
+                 event_weights=None, visitor_weights=None):
+        # events: event ids; capacities: event id -> stage capacity
+        # tickets: existing (visitor_id, event_id, ticket_category) rows
+        self.event_ids = list(events)
+        self.index = {eid: i for i, eid in enumerate(self.event_ids)}
+        self.visitor_ids = visitor_ids
+        self.rng = rng
+        self.event_weights = event_weights
+        self.visitor_sampler = None
+        if visitor_weights:
+            self.visitor_sampler = WeightedSampler([visitor_weights[v] for v in visitor_ids])
+
+        n = len(self.event_ids)
+        self.remaining = array('i', (capacities[eid] for eid in self.event_ids))
+        # FLOOR(capacity * 0.10) as in trg_ticket_vip_insert
+        self.vip_left = array('i', (capacities[eid] // 10 for eid in self.event_ids))
+        self.drawn = array('i', bytes(4 * n))   # visitors handed out per event
+        self.swaps = {}                         # event -> sparse shuffle state
+        self.holders = {}                       # event -> visitors holding old tickets
+
+        for visitor_id, event_id, category in tickets:
+            i = self.index[event_id]
+            self.remaining[i] -= 1
+            if category == 'VIP':
+                self.vip_left[i] -= 1
+            self.holders.setdefault(i, set()).add(visitor_id)
+
+    def _next_visitor(self, i):
+        """Next visitor of event i in its shuffled order, None when exhausted"""
+        visitors = self.visitor_ids
+        if self.visitor_sampler is not None:
+            # weighted draws, remembered in the holders so the shuffle below
+            # skips them
+            holders = self.holders.setdefault(i, set())
+            for _ in range(VISITOR_TRIES):
+                visitor_id = visitors[self.visitor_sampler.draw(self.rng)]
+                if visitor_id not in holders:
+                    holders.add(visitor_id)
+                    return visitor_id
+        holders = self.holders.get(i, ())
+        swaps = self.swaps.setdefault(i, {})
+        while self.drawn[i] < len(visitors):
+            k = self.drawn[i]
+            j = self.rng.randrange(k, len(visitors))
+            picked = swaps.get(j, j)
+            swaps[j] = swaps.pop(k, k)
+            self.drawn[i] = k + 1
+            if visitors[picked] not in holders:
+                if self.visitor_sampler is not None:
+                    holders.add(visitors[picked])
+                return visitors[picked]
+        return None
+
+    def allocate(self, count):
+        """Sell up to 'count' tickets.
+
+        Returns (sales, interest): lists of (event_id, visitor_id) pairs in
+        purchase order.
+        """
+        if self.event_weights is not None:
+            return self._allocate_weighted(count)
+        rng = self.rng
+        n = len(self.event_ids)
+        open_events = [i for i in range(n) if self.remaining[i] > 0]
+        position = {i: p for p, i in enumerate(open_events)}
+        full_events = [i for i in range(n) if self.remaining[i] <= 0]
+
+        def close(i):
+            # swap-remove from the open events
+            p = position.pop(i)
+            last = open_events.pop()
+            if last != i:
+                open_events[p] = last
+                position[last] = p
+            full_events.append(i)
+
+        sales = []
+        interest = []
+        while len(sales) < count and open_events:
+            # Attempts that hit a sold-out event before this sale: geometric
+            # in the share of events that still have seats
+            p_open = len(open_events) / n
+            if p_open < 1.0:
+                misses = int(math.log(1.0 - rng.random()) / math.log(1.0 - p_open))
+                for _ in range(misses):
+                    if not full_events:
+                        break
+                    k = rng.randrange(len(full_events))
+                    visitor_id = self._next_visitor(full_events[k])
+                    if visitor_id is None:
+                        # nobody left to be interested in this event
+                        full_events[k] = full_events[-1]
+                        full_events.pop()
+                        continue
+                    interest.append((self.event_ids[full_events[k]], visitor_id))
+
+            i = open_events[rng.randrange(len(open_events))]
+            visitor_id = self._next_visitor(i)
+            if visitor_id is None:
+                close(i)
+                continue
+            sales.append((self.event_ids[i], visitor_id))
+            self.remaining[i] -= 1
+            if self.remaining[i] == 0:
+                close(i)
+        return sales, interest
+
+    def _allocate_weighted(self, count):
+        # allocate() with events picked by weight: the open and the sold-out
+        # events each get a sampler, an event moves over when it sells out
+        rng = self.rng
+        weights = [self.event_weights[eid] for eid in self.event_ids]
+        open_events = WeightedSampler(w if left > 0 else 0.0 for w, left in zip(weights, self.remaining))
+        full_events = WeightedSampler(w if left <= 0 else 0.0 for w, left in zip(weights, self.remaining))
+        open_count = sum(1 for left in self.remaining if left > 0)
+        full_count = len(weights) - open_count
+
+        sales = []
+        interest = []
+        while len(sales) < count and open_count:
+            # Attempts on sold-out events before this sale: geometric in the
+            # weight share of the events that still have seats
+            open_weight = open_events.total()
+            p_open = open_weight / (open_weight + full_events.total()) if full_count else 1.0
+            if p_open < 1.0:
+                misses = int(math.log(1.0 - rng.random()) / math.log(1.0 - p_open))
+                for _ in range(misses):
+                    if not full_count:
+                        break
+                    i = full_events.draw(rng)
+                    visitor_id = self._next_visitor(i)
+                    if visitor_id is None:
+                        full_events.set(i, 0.0)
+                        full_count -= 1
+                        continue
+                    interest.append((self.event_ids[i], visitor_id))
+
+            i = open_events.draw(rng)
+            visitor_id = self._next_visitor(i)
+            if visitor_id is not None:
+                sales.append((self.event_ids[i], visitor_id))
+                self.remaining[i] -= 1
+            if visitor_id is None or self.remaining[i] == 0:
+                open_events.set(i, 0.0)
+                open_count -= 1
+                full_events.set(i, weights[i])
+                full_count += 1
+        return sales, interest
+
+    def vip_quota(self, event_id):
+        """VIP tickets event_id can still sell"""
+        return max(0, self.vip_left[self.index[event_id]])
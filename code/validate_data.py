@@ -0,0 +1,237 @@
+import argparse
+import math
+import sys
+from collections import defaultdict
+
+from record_store import _datetime_seconds
+from writers import row_values, read_directory
+
+# Offline check of the business rules that install.sql enforces with row
+# triggers. Each trigger runs correlated subqueries per inserted row, which
+# makes a bulk load quadratic; here every rule is one pass over the data
+# after a sort (interval sweeps per stage/date and per artist, year sets per
+# artist), so the data can be checked before it is loaded with the
+# triggers off.
+#
+# The checks look at the final data rather than at one row at a time, so
+# they do not depend on the order the rows would be inserted in.
+
+
+def _seconds_of_day(text):
+    # TIME_TO_SEC() of a DATETIME/TIME string
+    clock = text.split(' ')[-1]
+    hours, minutes, seconds = clock.split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+
+def _duration_seconds(value):
+    if isinstance(value, str):
+        return _seconds_of_day(value)
+    return int(value.total_seconds())
+
+
+class Validator:
+    """Check generated data against the rules of the install.sql triggers.
+
+    'data' maps table names (as in install.sql / writers.TABLE_COLUMNS) to
+    rows: lists of dicts or record_store.Table objects.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.violations = defaultdict(list)   # rule -> messages
+
+        self.event_date = {}
+        self.event_stage = {}
+        for event_id, stage_id, event_date in self._rows('Event', ['event_id', 'stage_id', 'event_date']):
+            self.event_date[event_id] = event_date
+            self.event_stage[event_id] = stage_id
+
+        self.performances = {}   # id -> (event_id, stage_id, start, duration seconds)
+        for pid, event_id, stage_id, start, duration in self._rows(
+                'Performance', ['performance_id', 'event_id', 'stage_id', 'start_time', 'duration']):
+            self.performances[pid] = (event_id, stage_id, start, _duration_seconds(duration))
+
+    @classmethod
+    def from_generator(cls, generator):
+        return cls(dict(generator.tables()))
+
+    def _rows(self, table, columns):
+        return row_values(table, self.data.get(table, []), columns)
+
+    def _report(self, rule, message):
+        self.violations[rule].append(message)
+
+    def check_all(self):
+        self.check_performance_overlap()
+        self.check_four_years_in_row()
+        self.check_artist_overlap()
+        self.check_performance_breaks()
+        self.check_vip_cap()
+        self.check_ticket_review()
+        self.check_staff_ratios()
+        return self.violations
+
+    def check_performance_overlap(self):
+        """chk_performance_no_overlap_insert: no overlap on the same stage and date"""
+        by_stage_date = defaultdict(list)
+        for pid, (event_id, _, start, duration) in self.performances.items():
+            key = (self.event_stage[event_id], self.event_date[event_id])
+            # Like the trigger, on full datetimes (wall clock, as MariaDB
+            # compares them): a performance past midnight
+            # ends after one that starts before it
+            begin = _datetime_seconds(start)
+            by_stage_date[key].append((begin, begin + duration, pid))
+
+        for (stage_id, event_date), intervals in by_stage_date.items():
+            intervals.sort()
+            latest_end, latest = -1, None
+            for begin, end, pid in intervals:
+                if begin < latest_end:
+                    self._report('performance_overlap',
+                                 f'performance {pid} overlaps performance {latest} '
+                                 f'on stage {stage_id} on {event_date}')
+                if end > latest_end:
+                    latest_end, latest = end, pid
+
+    def check_four_years_in_row(self):
+        """chk_no_4yrs_in_row_*: an artist (or group) may not play 4 years in a row"""
+        years = defaultdict(set)
+        for pid, artist_id, group_id in self._rows(
+                'performance_members', ['performance_id', 'artist_id', 'group_id']):
+            year = self.event_date[self.performances[pid][0]].year
+            # Like the trigger, group rows are checked per artist when they
+            # name one
+            if artist_id is not None:
+                years[('artist', artist_id)].add(year)
+            elif group_id is not None:
+                years[('group', group_id)].add(year)
+
+        for (kind, performer_id), performer_years in years.items():
+            run = 1
+            ordered = sorted(performer_years)
+            for previous, year in zip(ordered, ordered[1:]):
+                run = run + 1 if year == previous + 1 else 1
+                if run == 4:
+                    self._report('four_years_in_row',
+                                 f'{kind} {performer_id} plays {year - 3}-{year}')
+
+    def check_artist_overlap(self):
+        """chk_no_artist_overlap_*: an artist is in one performance at a time"""
+        by_artist = defaultdict(set)
+        for pid, artist_id in self._rows('performance_members', ['performance_id', 'artist_id']):
+            if artist_id is not None:
+                by_artist[artist_id].add(pid)
+
+        for artist_id, pids in by_artist.items():
+            intervals = []
+            for pid in pids:
+                _, _, start, duration = self.performances[pid]
+                begin = _datetime_seconds(start)
+                intervals.append((begin, begin + duration, pid))
+            intervals.sort()
+            latest_end, latest = float('-inf'), None
+            for begin, end, pid in intervals:
+                if begin < latest_end:
+                    self._report('artist_overlap',
+                                 f'artist {artist_id} is in performances {latest} and {pid} at once')
+                if end > latest_end:
+                    latest_end, latest = end, pid
+
+    def check_performance_breaks(self):
+        """trg_performance_break_*: 5 to 30 minutes between consecutive performances"""
+        by_event_stage = defaultdict(list)
+        for pid, (event_id, stage_id, start, duration) in self.performances.items():
+            begin = _datetime_seconds(start)
+            by_event_stage[(event_id, stage_id)].append((begin, begin + duration, pid))
+
+        for (event_id, _), intervals in by_event_stage.items():
+            intervals.sort()
+            for (_, prev_end, prev), (begin, _, pid) in zip(intervals, intervals[1:]):
+                # TIMESTAMPDIFF(MINUTE, ...) truncates towards zero
+                minutes = int((begin - prev_end) / 60)
+                if minutes < 5 or minutes > 30:
+                    self._report('performance_break',
+                                 f'{minutes} min break between performances {prev} and {pid} '
+                                 f'of event {event_id}')
+
+    def check_vip_cap(self):
+        """trg_ticket_vip_insert: VIP tickets <= 10% of the stage capacity"""
+        capacity = dict(self._rows('Stage', ['stage_id', 'capacity']))
+        vip = defaultdict(int)
+        for event_id, category in self._rows('Ticket', ['event_id', 'ticket_category']):
+            if category == 'VIP':
+                vip[event_id] += 1
+        for event_id, count in vip.items():
+            max_vip = math.floor(capacity[self.event_stage[event_id]] * 0.10)
+            if count > max_vip:
+                self._report('vip_cap', f'event {event_id} has {count} VIP tickets, at most {max_vip} allowed')
+
+    def check_ticket_review(self):
+        """check_ticket_review: only visitors with an activated ticket review.
+
+        Like the trigger, a review without any ticket for the event passes.
+        """
+        activated = {}
+        for visitor_id, event_id, is_activated in self._rows(
+                'Ticket', ['visitor_id', 'event_id', 'activated']):
+            activated[(visitor_id, event_id)] = is_activated
+        for review_id, visitor_id, pid in self._rows(
+                'Review', ['review_id', 'visitor_id', 'performance_id']):
+            if activated.get((visitor_id, self.performances[pid][0])) is False:
+                self._report('review_ticket',
+                             f'review {review_id}: ticket of visitor {visitor_id} is not activated')
+
+    def check_staff_ratios(self):
+        """trg_staff_assignment_before_insert: >=2% support and >=5% security.
+
+        Checked for every event and role with assignments, as the trigger
+        fires on those only.
+        """
+        tickets = defaultdict(int)
+        for event_id, in self._rows('Ticket', ['event_id']):
+            tickets[event_id] += 1
+        assigned = defaultdict(int)
+        for event_id, role in self._rows('Staff_Assignment', ['event_id', 'staff_role']):
+            assigned[(event_id, role)] += 1
+        for (event_id, role), count in assigned.items():
+            ratio = {'support': 0.02, 'security': 0.05}.get(role)
+            if ratio is None:
+                continue
+            needed = math.ceil(tickets[event_id] * ratio)
+            if count < needed:
+                self._report('staff_ratio',
+                             f'event {event_id} has {count} {role} staff for '
+                             f'{tickets[event_id]} tickets, needs {needed}')
+
+
+def print_report(violations, limit=10):
+    if not violations:
+        print('No violations found')
+        return
+    for rule, messages in sorted(violations.items()):
+        print(f'{rule}: {len(messages)} violation(s)')
+        for message in messages[:limit]:
+            print(f'  {message}')
+        if len(messages) > limit:
+            print(f'  ... and {len(messages) - limit} more')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check generated data against the install.sql trigger rules')
+    parser.add_argument('directory', nargs='?',
+                        help='directory written by generate_data.py --format tsv/csv; '
+                             'without it a dataset is generated in memory')
+    parser.add_argument('--format', choices=['tsv', 'csv'], default='tsv')
+    parser.add_argument('--scale', type=float, default=1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--limit', type=int, default=10, help='violations to print per rule')
+    args = parser.parse_args()
+
+    if args.directory:
+        validator = Validator(read_directory(args.directory, args.format))
+    else:
+        from generate_data import build_dataset, scaled_counts
+        validator = Validator.from_generator(build_dataset(scaled_counts(args.scale), seed=args.seed))
+    print_report(validator.check_all(), args.limit)
+    sys.exit(1 if validator.violations else 0)
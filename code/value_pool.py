@@ -0,0 +1,66 @@
+import random
+
+# Faker values generated in bulk.
+#
+# A Faker call costs tens of microseconds, and fake.unique retries more and
+# more often as its set of seen values fills up. The sharded tables instead
+# draw their names, addresses, urls, ... from pools of Faker output built
+# once per process, and build the values that must be unique (emails,
+# EAN-13 codes) from the row ids.
+
+POOL_SIZE = 1000
+
+_faker = None
+_pools = {}      # (seed, size, provider) -> values
+
+
+def _get_faker():
+    # Faker is imported and set up only when a pool is first built
+    global _faker
+    if _faker is None:
+        from faker import Faker
+        _faker = Faker()
+    return _faker
+
+
+class ValuePool:
+    """Pools of values of Faker providers, drawn at random.
+
+    Pools depend only on (seed, size), so every worker process builds the
+    same ones and the output does not depend on the number of workers. The
+    object itself only holds those two numbers and is cheap to send to a
+    worker.
+    """
+
+    def __init__(self, seed, size=POOL_SIZE):
+        self.seed = seed
+        self.size = size
+
+    def values(self, provider):
+        """The pool of a Faker provider, e.g. 'name' or 'address'"""
+        key = (self.seed, self.size, provider)
+        pool = _pools.get(key)
+        if pool is None:
+            fake = _get_faker()
+            fake.seed_instance(random.Random(repr(key)).getrandbits(64))
+            generate = getattr(fake, provider)
+            pool = _pools[key] = [generate() for _ in range(self.size)]
+        return pool
+
+    def choice(self, rng, provider):
+        pool = self.values(provider)
+        return pool[rng.randrange(len(pool))]
+
+
+def unique_email(pool, rng, row_id):
+    """An email that is unique because it contains the row id"""
+    return f"{pool.choice(rng, 'user_name')}{row_id}@{pool.choice(rng, 'free_email_domain')}"
+
+
+def ean13(number):
+    """EAN-13 code of a 12 digit number: the number and its check digit"""
+    digits = '%012d' % number
+    if len(digits) != 12:
+        raise ValueError(f'{number} does not fit the 12 digits of an EAN-13 code')
+    total = sum(int(d) for d in digits[0::2]) + 3 * sum(int(d) for d in digits[1::2])
+    return digits + str(-total % 10)
@@ -0,0 +1,534 @@
+import csv
+import gzip
+import io
+import json
+import os
+import time
+from datetime import date, timedelta
+from itertools import islice
+from operator import itemgetter
+
+# Output writers for the generated data.
+#
+# Every table is described once here: its name in install.sql and its columns
+# with the kind of value the generator stores in them. The writers build
+# their per-column formatters from these descriptions once per table instead
+# of inspecting every value.
+
+TABLE_COLUMNS = {
+    'Location': [('location_id', 'int'), ('address', 'str'), ('latitude', 'float'),
+                 ('longitude', 'float'), ('city', 'str'), ('country', 'str'),
+                 ('continent', 'str')],
+    'Festival': [('festival_id', 'int'), ('location_id', 'int'), ('name', 'str'),
+                 ('year', 'int'), ('duration_days', 'int'), ('poster_image', 'str'),
+                 ('description', 'str')],
+    'Stage': [('stage_id', 'int'), ('festival_id', 'int'), ('name', 'str'),
+              ('description', 'str'), ('capacity', 'int'), ('image', 'str')],
+    'Equipment': [('equipment_id', 'int'), ('type', 'str'), ('description', 'str'),
+                  ('image', 'str')],
+    'Stage_Equipment': [('stage_id', 'int'), ('equipment_id', 'int'), ('quantity', 'int')],
+    'Artist_Group': [('group_id', 'int'), ('name', 'str'), ('formation_date', 'date'),
+                     ('website', 'str'), ('photo', 'str')],
+    'Artist': [('artist_id', 'int'), ('name', 'str'), ('stage_name', 'str'), ('dob', 'date'),
+               ('website', 'str'), ('instagram', 'str'), ('photo', 'str')],
+    'Artist_Group_Members': [('group_id', 'int'), ('artist_id', 'int')],
+    'Genre': [('genre_id', 'int'), ('name', 'str'), ('subgenre', 'str')],
+    'Artist_Genres': [('artist_id', 'int'), ('genre_id', 'int')],
+    'Event': [('event_id', 'int'), ('festival_id', 'int'), ('stage_id', 'int'),
+              ('event_date', 'date'), ('total_duration', 'time')],
+    'Performance': [('performance_id', 'int'), ('event_id', 'int'), ('start_time', 'str'),
+                    ('stage_id', 'int'), ('duration', 'str'), ('type', 'str')],
+    'performance_members': [('performance_id', 'int'), ('artist_id', 'int'),
+                            ('group_id', 'int?')],
+    'Staff': [('staff_id', 'int'), ('name', 'str'), ('age', 'int'), ('staff_role', 'str'),
+              ('experience_level', 'str')],
+    'Staff_Assignment': [('assignment_id', 'int'), ('staff_id', 'int'), ('event_id', 'int'),
+                         ('assignment_date', 'date'), ('staff_role', 'str')],
+    'Visitor': [('visitor_id', 'int'), ('first_name', 'str'), ('last_name', 'str'),
+                ('email', 'str'), ('phone', 'str'), ('age', 'int')],
+    'Ticket': [('ticket_id', 'int'), ('event_id', 'int'), ('visitor_id', 'int'),
+               ('ticket_category', 'str'), ('price', 'float'), ('purchase_date', 'str'),
+               ('payment_method', 'str'), ('ean_code', 'str'), ('activated', 'bool')],
+    'resale_interest': [('interested_visitor_id', 'int'), ('event_id', 'int'),
+                        ('ticket_category', 'str'), ('expressed_on', 'str')],
+    'Review': [('review_id', 'int'), ('visitor_id', 'int'), ('performance_id', 'int'),
+               ('interpretation', 'int'), ('lights_sound', 'int'), ('stage_presence', 'int'),
+               ('organization', 'int'), ('overall_impression', 'int')],
+}
+
+# The tables each table references with a foreign key in install.sql
+TABLE_REFERENCES = {
+    'Location': [],
+    'Festival': ['Location'],
+    'Stage': ['Festival'],
+    'Equipment': [],
+    'Stage_Equipment': ['Stage', 'Equipment'],
+    'Artist_Group': [],
+    'Artist': [],
+    'Artist_Group_Members': ['Artist_Group', 'Artist'],
+    'Genre': [],
+    'Artist_Genres': ['Artist', 'Genre'],
+    'Event': ['Festival', 'Stage'],
+    'Performance': ['Event', 'Stage'],
+    'performance_members': ['Performance', 'Artist', 'Artist_Group'],
+    'Staff': [],
+    'Staff_Assignment': ['Staff', 'Event'],
+    'Visitor': [],
+    'Ticket': ['Event', 'Visitor'],
+    'resale_interest': ['Visitor', 'Event'],
+    'Review': ['Visitor', 'Performance'],
+}
+
+# Tables loaded after others they have no foreign key to.
+# trg_staff_assignment_before_insert checks each row against the tickets
+# already sold, so an event that needs 2 or more staff of a role only passes
+# row by row while it has no tickets yet
+LOAD_AFTER = {
+    'Ticket': ['Staff_Assignment'],
+}
+
+
+def dependency_levels(tables):
+    """Group 'tables' into foreign key levels: level 0 references none of
+    them, every later level only references tables of earlier levels"""
+    level = {}
+    for table in sorted(tables, key=list(TABLE_COLUMNS).index):
+        level[table] = 1 + max((level[ref] for ref in TABLE_REFERENCES[table] + LOAD_AFTER.get(table, [])
+                                if ref in level), default=-1)
+    return [[table for table in level if level[table] == i] for i in range(max(level.values(), default=-1) + 1)]
+
+# MariaDB string literal escapes (see "String Literals" in the MariaDB docs)
+_SQL_ESCAPES = str.maketrans({
+    '\\': '\\\\',
+    "'": "\\'",
+    '\n': '\\n',
+    '\r': '\\r',
+    '\0': '\\0',
+    '\x1a': '\\Z',
+})
+
+
+def sql_quote(value):
+    """Quote a Python string as a MariaDB string literal"""
+    return "'" + value.translate(_SQL_ESCAPES) + "'"
+
+
+_SQL_FORMATTERS = {
+    'int': str,
+    'float': str,
+    'bool': str,
+    'str': sql_quote,
+    'date': lambda v: "'" + v.strftime('%Y-%m-%d') + "'",
+    'time': lambda v: "'" + str(v) + "'",
+}
+
+
+def _nullable(formatter, null):
+    return lambda v: null if v is None else formatter(v)
+
+
+def column_formatters(table, formatters, null, columns=None):
+    """Build one formatter per column of 'table' from a kind -> function map.
+
+    Kinds ending in '?' mark nullable columns, which are the only ones that
+    pay for the None check. 'columns' replaces the table's TABLE_COLUMNS
+    entry, e.g. for the extra columns of a partitioned install.
+    """
+    result = []
+    for _, kind in columns or TABLE_COLUMNS[table]:
+        if kind.endswith('?'):
+            result.append(_nullable(formatters[kind[:-1]], null))
+        else:
+            result.append(formatters[kind])
+    return result
+
+
+def row_values(table, rows, names=None):
+    """Iterate over the rows as tuples of the table's column values.
+
+    'rows' is either a list of row dicts or a record_store.Table, which can
+    hand out its columns without building a dict per row. 'names' selects
+    the columns (all of them by default).
+    """
+    if names is None:
+        names = [name for name, _ in TABLE_COLUMNS[table]]
+    if hasattr(rows, 'rows'):
+        return rows.rows(names)
+    if len(names) == 1:
+        getter = itemgetter(names[0])
+        return ((getter(row),) for row in rows)
+    return map(itemgetter(*names), rows)
+
+
+class _TableWriter:
+    """Per-table row counts and throughput shared by all writers"""
+
+    def __init__(self, verbose=True):
+        self.verbose = verbose
+        self.stats = {}
+
+    def _report(self, table, count, elapsed):
+        rate = count / elapsed if elapsed > 0 else 0.0
+        self.stats[table] = {'rows': count, 'seconds': elapsed, 'rows_per_sec': rate}
+        if self.verbose and count:
+            print(f"{table}: {count} rows in {elapsed:.3f}s ({rate:,.0f} rows/sec)")
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def insert_statements(table, values, batch_size=1000, columns=None, partition=None):
+    """Format row value tuples as multi-row INSERT statements of at most
+    'batch_size' rows: yields (statement, rows in it).
+
+    'columns' overrides the table's columns (see column_formatters);
+    'partition' names the partition the rows go to (INSERT ... PARTITION).
+    """
+    columns = columns or TABLE_COLUMNS[table]
+    formatters = column_formatters(table, _SQL_FORMATTERS, 'NULL', columns)
+    target = f'{table} PARTITION ({partition})' if partition else table
+    header = f"INSERT INTO {target} ({', '.join(name for name, _ in columns)}) VALUES\n"
+    batch = []
+    for row in values:
+        batch.append('(' + ', '.join([fmt(v) for fmt, v in zip(formatters, row)]) + ')')
+        if len(batch) >= batch_size:
+            yield header + ',\n'.join(batch) + ';\n\n', len(batch)
+            batch = []
+    if batch:
+        yield header + ',\n'.join(batch) + ';\n\n', len(batch)
+
+
+class SqlWriter(_TableWriter):
+    """Stream rows into a SQL script as batched multi-row INSERT statements.
+
+    Rows are formatted and written as they are consumed, so only one batch
+    of formatted rows is held in memory at a time. Keep 'batch_size' low
+    enough for a statement to stay under the server's max_allowed_packet.
+    """
+
+    def __init__(self, path, batch_size=1000, verbose=True):
+        super().__init__(verbose)
+        self.path = path
+        self.batch_size = batch_size
+        self.f = open(path, 'w')
+
+    def write_table(self, table, rows):
+        started = time.perf_counter()
+        count = 0
+        for statement, size in insert_statements(table, row_values(table, rows), self.batch_size):
+            self.f.write(statement)
+            count += size
+        self._report(table, count, time.perf_counter() - started)
+        return count
+
+    def close(self):
+        self.f.close()
+
+
+# LOAD DATA defaults: tab separated, backslash escapes, \N for NULL
+_TSV_ESCAPES = str.maketrans({
+    '\\': '\\\\',
+    '\t': '\\t',
+    '\n': '\\n',
+    '\r': '\\r',
+    '\0': '\\0',
+})
+
+_TSV_FORMATTERS = {
+    'int': str,
+    'float': str,
+    'bool': lambda v: '1' if v else '0',
+    'str': lambda v: v.translate(_TSV_ESCAPES),
+    'date': lambda v: v.strftime('%Y-%m-%d'),
+    'time': str,
+}
+
+# CSV with strings always enclosed in double quotes (doubled inside) and
+# the bare word NULL for NULL, which LOAD DATA reads back as NULL
+_CSV_FORMATTERS = dict(
+    _TSV_FORMATTERS,
+    str=lambda v: '"' + v.replace('"', '""') + '"',
+)
+
+DELIMITED_FORMATS = {
+    'tsv': {
+        'formatters': _TSV_FORMATTERS,
+        'null': '\\N',
+        'separator': '\t',
+        'clause': "FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n'",
+    },
+    'csv': {
+        'formatters': _CSV_FORMATTERS,
+        'null': 'NULL',
+        'separator': ',',
+        'clause': "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '' "
+                  "LINES TERMINATED BY '\\n'",
+    },
+}
+
+
+def delimited_lines(table, values, fmt='tsv', columns=None):
+    """Format row value tuples as the lines of a tsv/csv file"""
+    options = DELIMITED_FORMATS[fmt]
+    formatters = column_formatters(table, options['formatters'], options['null'], columns)
+    separator = options['separator']
+    for row in values:
+        yield separator.join([format_value(v) for format_value, v in zip(formatters, row)]) + '\n'
+
+
+class DelimitedWriter(_TableWriter):
+    """Write one delimited file per table plus a LOAD DATA script for them.
+
+    Tables must be written in foreign key order; the load script lists them
+    in the order they were written.
+    """
+
+    def __init__(self, directory, fmt='tsv', verbose=True):
+        super().__init__(verbose)
+        self.directory = directory
+        self.fmt = fmt
+        self.options = DELIMITED_FORMATS[fmt]
+        self.files = []
+        os.makedirs(directory, exist_ok=True)
+
+    def file_name(self, table):
+        return f'{table.lower()}.{self.fmt}'
+
+    def write_table(self, table, rows):
+        started = time.perf_counter()
+        name = self.file_name(table)
+        count = 0
+        with open(os.path.join(self.directory, name), 'w', newline='') as f:
+            for line in delimited_lines(table, row_values(table, rows), self.fmt):
+                f.write(line)
+                count += 1
+
+        self.files.append((table, name))
+        self._report(table, count, time.perf_counter() - started)
+        return count
+
+    def write_load_script(self, name='load_data.sql'):
+        """Write the LOAD DATA LOCAL INFILE script for the files written so far.
+
+        Run it from the output directory with 'mariadb --local-infile=1'.
+        Foreign key checks are switched off while loading since the files
+        already come in dependency order. Note that LOAD DATA still fires the
+        row triggers of install.sql.
+        """
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as f:
+            f.write('-- Bulk load of the generated data, in foreign key order\n')
+            f.write('SET foreign_key_checks = 0;\n\n')
+            for table, file_name in self.files:
+                columns = ', '.join(column for column, _ in TABLE_COLUMNS[table])
+                f.write(f"LOAD DATA LOCAL INFILE '{file_name}'\n"
+                        f"INTO TABLE {table}\n"
+                        f"{self.options['clause']}\n"
+                        f"({columns});\n\n")
+            f.write('SET foreign_key_checks = 1;\n')
+        return path
+
+
+COMPRESSION_SUFFIXES = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+SHARD_MANIFEST = 'manifest.json'
+
+
+def open_compressed(path, mode='r'):
+    """Open a text file for reading ('r') or writing ('w'), gzip or zstd
+    compressed if its name ends in .gz or .zst"""
+    if path.endswith('.gz'):
+        # level 6 like the gzip tool: level 9 costs a lot more for little gain
+        return gzip.open(path, mode + 't', compresslevel=6, newline='')
+    if path.endswith('.zst'):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError('zstd files need the zstandard package (pip install zstandard)')
+        if mode == 'w':
+            stream = zstandard.ZstdCompressor(level=3).stream_writer(open(path, 'wb'))
+        else:
+            stream = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'))
+        return io.TextIOWrapper(stream, newline='')
+    return open(path, mode, newline='')
+
+
+def _key_range(values, bounds):
+    # Pass the rows through, keeping the lowest and highest first column value
+    for row in values:
+        if bounds:
+            bounds[0] = min(bounds[0], row[0])
+            bounds[1] = max(bounds[1], row[0])
+        else:
+            bounds.extend((row[0], row[0]))
+        yield row
+
+
+class ShardedWriter(_TableWriter):
+    """Write every table as up to 'shards' files of consecutive rows, plus a
+    manifest.json describing them.
+
+    Rows come in primary key order, so every shard holds one key range. The
+    files are sql (INSERT statements), tsv or csv, compressed while they are
+    written with 'compression' ('gzip' or 'zstd'). The manifest groups the
+    tables into foreign key levels: all files of a level can be loaded over
+    parallel connections once the levels before it are in.
+    """
+
+    def __init__(self, directory, fmt='sql', shards=1, compression=None, batch_size=1000, verbose=True):
+        super().__init__(verbose)
+        self.directory = directory
+        self.fmt = fmt
+        self.shards = shards
+        self.compression = compression
+        self.batch_size = batch_size
+        self.tables = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def file_name(self, table, shard):
+        number = f'.{shard + 1:03d}' if self.shards > 1 else ''
+        return f'{table.lower()}{number}.{self.fmt}{COMPRESSION_SUFFIXES[self.compression]}'
+
+    def write_table(self, table, rows):
+        started = time.perf_counter()
+        total = len(rows)
+        count = min(self.shards, total)
+        values = iter(row_values(table, rows))
+        files = []
+        for shard in range(count):
+            size = total * (shard + 1) // count - total * shard // count
+            name = self.file_name(table, shard)
+            path = os.path.join(self.directory, name)
+            bounds = []
+            chunk = _key_range(islice(values, size), bounds)
+            with open_compressed(path, 'w') as f:
+                if self.fmt == 'sql':
+                    for statement, _ in insert_statements(table, chunk, self.batch_size):
+                        f.write(statement)
+                else:
+                    f.writelines(delimited_lines(table, chunk, self.fmt))
+            files.append({'file': name, 'rows': size, 'first_key': bounds[0], 'last_key': bounds[1],
+                          'bytes': os.path.getsize(path)})
+
+        self.tables[table] = files
+        self._report(table, total, time.perf_counter() - started)
+        return total
+
+    def write_manifest(self, name=SHARD_MANIFEST):
+        """Write the manifest of the tables written so far and return its path"""
+        levels = dependency_levels(self.tables)
+        manifest = {
+            'format': self.fmt,
+            'compression': self.compression,
+            'shards': self.shards,
+            'levels': levels,
+            'tables': {},
+        }
+        for level, tables in enumerate(levels):
+            for table in tables:
+                manifest['tables'][table] = {
+                    'level': level,
+                    'columns': [column for column, _ in TABLE_COLUMNS[table]],
+                    'key': TABLE_COLUMNS[table][0][0],
+                    'references': [ref for ref in TABLE_REFERENCES[table] if ref in self.tables],
+                    'rows': sum(f['rows'] for f in self.tables[table]),
+                    'files': self.tables[table],
+                }
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        return path
+
+
+# Reading the files back, e.g. to validate an export before loading it
+
+_TSV_UNESCAPES = {'\\': '\\', 't': '\t', 'n': '\n', 'r': '\r', '0': '\0'}
+
+
+def _tsv_unescape(text):
+    if '\\' not in text:
+        return text
+    out = []
+    chars = iter(text)
+    for c in chars:
+        out.append(_TSV_UNESCAPES.get(next(chars, ''), '') if c == '\\' else c)
+    return ''.join(out)
+
+
+def _parse_time(text):
+    hours, minutes, seconds = text.split(':')
+    return timedelta(hours=int(hours), minutes=int(minutes), seconds=int(seconds))
+
+
+_PARSERS = {
+    'int': int,
+    'float': float,
+    'bool': lambda v: v == '1',
+    'str': str,
+    'date': date.fromisoformat,
+    'time': _parse_time,
+}
+
+
+def read_table(directory, table, fmt='tsv'):
+    """Read a file written by DelimitedWriter back into a list of row dicts"""
+    return read_file(os.path.join(directory, f'{table.lower()}.{fmt}'), table, fmt)
+
+
+def read_file(path, table, fmt='tsv'):
+    """Read one tsv/csv file of 'table', compressed or not, into a list of row dicts"""
+    names = [name for name, _ in TABLE_COLUMNS[table]]
+    null = DELIMITED_FORMATS[fmt]['null']
+    parsers = [_PARSERS[kind.rstrip('?')] for _, kind in TABLE_COLUMNS[table]]
+    rows = []
+    with open_compressed(path) as f:
+        if fmt == 'tsv':
+            records = (_split_tsv(line) for line in f)
+        else:
+            records = csv.reader(f)
+        for record in records:
+            rows.append({
+                name: None if value == null else parse(value)
+                for name, parse, value in zip(names, parsers, record)
+            })
+    return rows
+
+
+def _split_tsv(line):
+    # \N is the NULL marker, not an escape sequence
+    return [value if value == '\\N' else _tsv_unescape(value)
+            for value in line.rstrip('\n').split('\t')]
+
+
+def read_manifest(directory):
+    """The manifest.json of a ShardedWriter output, or None"""
+    path = os.path.join(directory, SHARD_MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def read_directory(directory, fmt='tsv'):
+    """Read every table file found in an export directory: {table: rows}.
+
+    A sharded output (with a manifest.json) is read shard by shard, in the
+    format of its manifest.
+    """
+    manifest = read_manifest(directory)
+    if manifest is not None:
+        if manifest['format'] == 'sql':
+            raise ValueError(f'{directory} holds sql shards; only tsv/csv files can be read back')
+        return {table: [row for entry in info['files']
+                        for row in read_file(os.path.join(directory, entry['file']), table, manifest['format'])]
+                for table, info in manifest['tables'].items()}
+    data = {}
+    for table in TABLE_COLUMNS:
+        if os.path.exists(os.path.join(directory, f'{table.lower()}.{fmt}')):
+            data[table] = read_table(directory, table, fmt)
+    return data
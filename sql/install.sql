@@ -2,6 +2,10 @@ DROP SCHEMA if exists music_festival;
 CREATE SCHEMA music_festival;
 use music_festival;
 -- Drop tables if they exist (to avoid foreign key conflicts)
+DROP TABLE IF EXISTS Artist_Schedule;
+DROP TABLE IF EXISTS Stage_Schedule;
+DROP TABLE IF EXISTS Group_Participation;
+DROP TABLE IF EXISTS Artist_Participation;
 DROP TABLE IF EXISTS Staff_Assignment;
 DROP TABLE IF EXISTS Staff;
 DROP TABLE IF EXISTS Review;
@@ -161,7 +165,52 @@ CREATE TABLE performance_members (
 
 --  Εμφανίσεις ανά καλλιτέχνη και event
 CREATE INDEX idx_performance_artist ON performance_members(artist_id);
-CREATE INDEX idx_performance_event ON performance(event_id);
+CREATE INDEX idx_performance_event ON performance(event_id, stage_id, start_time);
+
+-- Helper tables for the performance rule triggers, kept up to date by the
+-- triggers on performance, performance_members and event. The rules are
+-- checked with index lookups on them instead of joins over the whole history.
+-- A load that creates the triggers after the data (bulk_loader.py) fills
+-- them with CALL rebuild_rule_helpers().
+
+-- Years an artist (or a group) plays, with the number of performance_members
+-- rows of that year
+CREATE TABLE artist_participation (
+    artist_id INT NOT NULL,
+    year INT NOT NULL,
+    performances INT NOT NULL,
+    PRIMARY KEY (artist_id, year)
+);
+
+CREATE TABLE group_participation (
+    group_id INT NOT NULL,
+    year INT NOT NULL,
+    performances INT NOT NULL,
+    PRIMARY KEY (group_id, year)
+);
+
+-- Performances by the stage and date of their event
+CREATE TABLE stage_schedule (
+    performance_id INT PRIMARY KEY,
+    event_id INT NOT NULL,
+    stage_id INT,
+    event_date DATE,
+    start_time DATETIME,
+    end_time DATETIME
+);
+
+-- Performances by artist
+CREATE TABLE artist_schedule (
+    performance_members_id INT PRIMARY KEY,
+    artist_id INT NOT NULL,
+    performance_id INT NOT NULL,
+    start_time DATETIME,
+    end_time DATETIME
+);
+
+CREATE INDEX idx_stage_schedule_slot ON stage_schedule(stage_id, event_date, start_time, end_time);
+CREATE INDEX idx_artist_schedule_slot ON artist_schedule(artist_id, start_time, end_time);
+CREATE INDEX idx_artist_schedule_performance ON artist_schedule(performance_id);
 
 
 CREATE TABLE visitor (
@@ -269,6 +318,13 @@ CREATE INDEX idx_staff_assignment_date ON staff_assignment(assignment_date);
 DELIMITER $$
 
 -- Overlapping performance on the same stage and date
+-- The rule triggers below look the performances up in the helper tables
+-- (stage_schedule, artist_schedule, artist_participation,
+-- group_participation) by index instead of joining performance_members,
+-- performance and event, so their cost does not grow with the history.
+-- A performance lasts at most 3 hours (the CHECK on duration), so only the
+-- performances that start in the 3 hours before the new one can still be
+-- running when it starts.
 CREATE TRIGGER chk_performance_no_overlap_insert
 BEFORE INSERT ON performance
 FOR EACH ROW
@@ -285,12 +341,12 @@ BEGIN
 
   -- Find how many existing performances overlap
   SELECT COUNT(*) INTO cnt
-    FROM performance p
-    JOIN Event ev ON p.event_id = ev.event_id
-   WHERE ev.stage_id    = v_stage
-     AND ev.event_date  = v_date
-     AND TIME_TO_SEC(NEW.start_time) < TIME_TO_SEC(p.start_time)  + TIME_TO_SEC(p.duration)
-     AND TIME_TO_SEC(p.start_time) < TIME_TO_SEC(NEW.start_time)  + TIME_TO_SEC(NEW.duration);
+    FROM stage_schedule s
+   WHERE s.stage_id    = v_stage
+     AND s.event_date  = v_date
+     AND s.start_time  > NEW.start_time - INTERVAL 3 HOUR
+     AND s.start_time  < ADDTIME(NEW.start_time, NEW.duration)
+     AND s.end_time    > NEW.start_time;
 
   IF cnt > 0 THEN
     SIGNAL SQLSTATE '45000'
@@ -316,12 +372,10 @@ BEGIN
   -- For individual artist
   IF NEW.artist_id IS NOT NULL THEN
     IF (
-      SELECT COUNT(DISTINCT YEAR(e2.event_date))
-        FROM performance_members pm2
-        JOIN performance p2 ON pm2.performance_id = p2.performance_id
-        JOIN event e2        ON p2.event_id         = e2.event_id
-       WHERE pm2.artist_id = NEW.artist_id
-         AND YEAR(e2.event_date) IN (v_year-1, v_year-2, v_year-3)
+      SELECT COUNT(*)
+        FROM artist_participation ap
+       WHERE ap.artist_id = NEW.artist_id
+         AND ap.year BETWEEN v_year - 3 AND v_year - 1
     ) = 3 THEN
       SIGNAL SQLSTATE '45000'
         SET MESSAGE_TEXT = 'An artist has already participated for 3 years in a row';
@@ -330,12 +384,10 @@ BEGIN
   -- For group
   ELSEIF NEW.group_id IS NOT NULL THEN
     IF (
-      SELECT COUNT(DISTINCT YEAR(e2.event_date))
-        FROM performance_members pm2
-        JOIN performance p2 ON pm2.performance_id = p2.performance_id
-        JOIN event e2        ON p2.event_id         = e2.event_id
-       WHERE pm2.group_id = NEW.group_id
-         AND YEAR(e2.event_date) IN (v_year-1, v_year-2, v_year-3)
+      SELECT COUNT(*)
+        FROM group_participation gp
+       WHERE gp.group_id = NEW.group_id
+         AND gp.year BETWEEN v_year - 3 AND v_year - 1
     ) = 3 THEN
       SIGNAL SQLSTATE '45000'
         SET MESSAGE_TEXT = 'A group has already participated for 3 years in a row';
@@ -349,6 +401,7 @@ BEFORE UPDATE ON performance_members
 FOR EACH ROW
 BEGIN
   DECLARE v_year INT;
+  DECLARE v_old_year INT;
 
   SELECT YEAR(e.event_date)
     INTO v_year
@@ -356,16 +409,20 @@ BEGIN
     JOIN event e ON p.event_id = e.event_id
    WHERE p.performance_id = NEW.performance_id;
 
--- For individual artist
+  SELECT YEAR(e.event_date)
+    INTO v_old_year
+    FROM performance p
+    JOIN event e ON p.event_id = e.event_id
+   WHERE p.performance_id = OLD.performance_id;
+
+-- For individual artist (a year only counts with a row besides the old one)
   IF NEW.artist_id IS NOT NULL THEN
     IF (
-      SELECT COUNT(DISTINCT YEAR(e2.event_date))
-        FROM performance_members pm2
-        JOIN performance p2 ON pm2.performance_id = p2.performance_id
-        JOIN event e2        ON p2.event_id         = e2.event_id
-       WHERE pm2.artist_id = NEW.artist_id
-         AND (pm2.performance_members_id <> OLD.performance_members_id)
-         AND YEAR(e2.event_date) IN (v_year-1, v_year-2, v_year-3)
+      SELECT COUNT(*)
+        FROM artist_participation ap
+       WHERE ap.artist_id = NEW.artist_id
+         AND ap.year BETWEEN v_year - 3 AND v_year - 1
+         AND ap.performances > IF(ap.artist_id <=> OLD.artist_id AND ap.year = v_old_year, 1, 0)
     ) = 3 THEN
       SIGNAL SQLSTATE '45000'
         SET MESSAGE_TEXT = 'An artist has already participated for 3 years in a row';
@@ -374,13 +431,11 @@ BEGIN
 -- For group
   ELSEIF NEW.group_id IS NOT NULL THEN
     IF (
-      SELECT COUNT(DISTINCT YEAR(e2.event_date))
-        FROM performance_members pm2
-        JOIN performance p2 ON pm2.performance_id = p2.performance_id
-        JOIN event e2        ON p2.event_id         = e2.event_id
-       WHERE pm2.group_id = NEW.group_id
-         AND (pm2.performance_members_id <> OLD.performance_members_id)
-         AND YEAR(e2.event_date) IN (v_year-1, v_year-2, v_year-3)
+      SELECT COUNT(*)
+        FROM group_participation gp
+       WHERE gp.group_id = NEW.group_id
+         AND gp.year BETWEEN v_year - 3 AND v_year - 1
+         AND gp.performances > IF(gp.group_id <=> OLD.group_id AND gp.year = v_old_year, 1, 0)
     ) = 3 THEN
       SIGNAL SQLSTATE '45000'
         SET MESSAGE_TEXT = 'A group has already participated for 3 years in a row';
@@ -411,13 +466,12 @@ BEGIN
     -- count any other performance for the same artist that overlaps in time
     SELECT COUNT(*) 
       INTO v_conflicts
-      FROM performance_members pm2
-      JOIN performance p2
-        ON pm2.performance_id = p2.performance_id
-     WHERE pm2.artist_id = NEW.artist_id
-       AND pm2.performance_id <> NEW.performance_id
-       AND p2.start_time     < v_end
-       AND ADDTIME(p2.start_time, p2.duration) > v_start;
+      FROM artist_schedule a
+     WHERE a.artist_id = NEW.artist_id
+       AND a.start_time     > v_start - INTERVAL 3 HOUR
+       AND a.start_time     < v_end
+       AND a.end_time       > v_start
+       AND a.performance_id <> NEW.performance_id;
 
     IF v_conflicts > 0 THEN
       SIGNAL SQLSTATE '45000'
@@ -450,13 +504,12 @@ BEGIN
     -- excluding the very row being updated
     SELECT COUNT(*)
       INTO v_conflicts
-      FROM performance_members pm2
-      JOIN performance p2
-        ON pm2.performance_id = p2.performance_id
-     WHERE pm2.artist_id = NEW.artist_id
-       AND pm2.performance_members_id <> OLD.performance_members_id
-       AND p2.start_time     < v_end
-       AND ADDTIME(p2.start_time, p2.duration) > v_start;
+      FROM artist_schedule a
+     WHERE a.artist_id = NEW.artist_id
+       AND a.start_time     > v_start - INTERVAL 3 HOUR
+       AND a.start_time     < v_end
+       AND a.end_time       > v_start
+       AND a.performance_members_id <> OLD.performance_members_id;
 
     IF v_conflicts > 0 THEN
       SIGNAL SQLSTATE '45000'
@@ -747,6 +800,7 @@ BEGIN
 END$$
 
 -- Checking the breaks for continues performances
+-- (the neighbours are found on idx_performance_event)
 -- BEFORE INSERT
 CREATE TRIGGER trg_performance_break_insert
 BEFORE INSERT ON performance
@@ -851,6 +905,237 @@ BEGIN
 END;
 $$
 
+-- Keeping the helper tables of the rule triggers up to date
+-- AFTER INSERT
+CREATE TRIGGER trg_performance_helpers_insert
+AFTER INSERT ON performance
+FOR EACH ROW
+BEGIN
+  INSERT INTO stage_schedule (performance_id, event_id, stage_id, event_date, start_time, end_time)
+  SELECT NEW.performance_id, e.event_id, e.stage_id, e.event_date,
+         NEW.start_time, ADDTIME(NEW.start_time, NEW.duration)
+    FROM event e
+   WHERE e.event_id = NEW.event_id;
+END$$
+
+-- AFTER UPDATE
+CREATE TRIGGER trg_performance_helpers_update
+AFTER UPDATE ON performance
+FOR EACH ROW
+BEGIN
+  DECLARE v_old_year INT;
+  DECLARE v_new_year INT;
+
+  DELETE FROM stage_schedule WHERE performance_id = OLD.performance_id;
+  INSERT INTO stage_schedule (performance_id, event_id, stage_id, event_date, start_time, end_time)
+  SELECT NEW.performance_id, e.event_id, e.stage_id, e.event_date,
+         NEW.start_time, ADDTIME(NEW.start_time, NEW.duration)
+    FROM event e
+   WHERE e.event_id = NEW.event_id;
+
+  UPDATE artist_schedule
+     SET performance_id = NEW.performance_id,
+         start_time     = NEW.start_time,
+         end_time       = ADDTIME(NEW.start_time, NEW.duration)
+   WHERE performance_id = OLD.performance_id;
+
+  -- Moving to an event of another year moves the members' participation
+  IF NOT (OLD.event_id <=> NEW.event_id) THEN
+    SELECT YEAR(event_date) INTO v_old_year FROM event WHERE event_id = OLD.event_id;
+    SELECT YEAR(event_date) INTO v_new_year FROM event WHERE event_id = NEW.event_id;
+    IF NOT (v_old_year <=> v_new_year) THEN
+      CALL move_participation(NULL, NEW.performance_id, v_old_year, v_new_year);
+    END IF;
+  END IF;
+END$$
+
+-- AFTER DELETE
+CREATE TRIGGER trg_performance_helpers_delete
+AFTER DELETE ON performance
+FOR EACH ROW
+BEGIN
+  DELETE FROM stage_schedule WHERE performance_id = OLD.performance_id;
+  DELETE FROM artist_schedule WHERE performance_id = OLD.performance_id;
+END$$
+
+-- AFTER UPDATE on event (a new date or stage for its performances)
+CREATE TRIGGER trg_event_helpers_update
+AFTER UPDATE ON event
+FOR EACH ROW
+BEGIN
+  IF NOT (OLD.stage_id <=> NEW.stage_id AND OLD.event_date <=> NEW.event_date) THEN
+    UPDATE stage_schedule
+       SET stage_id = NEW.stage_id, event_date = NEW.event_date
+     WHERE event_id = NEW.event_id;
+  END IF;
+
+  IF NOT (YEAR(OLD.event_date) <=> YEAR(NEW.event_date)) THEN
+    CALL move_participation(NEW.event_id, NULL, YEAR(OLD.event_date), YEAR(NEW.event_date));
+  END IF;
+END$$
+
+-- AFTER INSERT
+CREATE TRIGGER trg_performance_members_helpers_insert
+AFTER INSERT ON performance_members
+FOR EACH ROW
+BEGIN
+  DECLARE v_year INT;
+  DECLARE v_start DATETIME;
+  DECLARE v_end DATETIME;
+
+  SELECT YEAR(e.event_date), p.start_time, ADDTIME(p.start_time, p.duration)
+    INTO v_year, v_start, v_end
+    FROM performance p
+    LEFT JOIN event e ON p.event_id = e.event_id
+   WHERE p.performance_id = NEW.performance_id;
+
+  CALL add_participation(NEW.artist_id, NEW.group_id, v_year, 1);
+
+  IF NEW.artist_id IS NOT NULL THEN
+    INSERT INTO artist_schedule (performance_members_id, artist_id, performance_id, start_time, end_time)
+    VALUES (NEW.performance_members_id, NEW.artist_id, NEW.performance_id, v_start, v_end);
+  END IF;
+END$$
+
+-- AFTER UPDATE
+CREATE TRIGGER trg_performance_members_helpers_update
+AFTER UPDATE ON performance_members
+FOR EACH ROW
+BEGIN
+  DECLARE v_old_year INT;
+  DECLARE v_year INT;
+  DECLARE v_start DATETIME;
+  DECLARE v_end DATETIME;
+
+  SELECT YEAR(e.event_date)
+    INTO v_old_year
+    FROM performance p
+    LEFT JOIN event e ON p.event_id = e.event_id
+   WHERE p.performance_id = OLD.performance_id;
+
+  SELECT YEAR(e.event_date), p.start_time, ADDTIME(p.start_time, p.duration)
+    INTO v_year, v_start, v_end
+    FROM performance p
+    LEFT JOIN event e ON p.event_id = e.event_id
+   WHERE p.performance_id = NEW.performance_id;
+
+  CALL add_participation(OLD.artist_id, OLD.group_id, v_old_year, -1);
+  CALL add_participation(NEW.artist_id, NEW.group_id, v_year, 1);
+
+  DELETE FROM artist_schedule WHERE performance_members_id = OLD.performance_members_id;
+  IF NEW.artist_id IS NOT NULL THEN
+    INSERT INTO artist_schedule (performance_members_id, artist_id, performance_id, start_time, end_time)
+    VALUES (NEW.performance_members_id, NEW.artist_id, NEW.performance_id, v_start, v_end);
+  END IF;
+END$$
+
+-- AFTER DELETE
+CREATE TRIGGER trg_performance_members_helpers_delete
+AFTER DELETE ON performance_members
+FOR EACH ROW
+BEGIN
+  DECLARE v_year INT;
+
+  SELECT YEAR(e.event_date)
+    INTO v_year
+    FROM performance p
+    LEFT JOIN event e ON p.event_id = e.event_id
+   WHERE p.performance_id = OLD.performance_id;
+
+  CALL add_participation(OLD.artist_id, OLD.group_id, v_year, -1);
+  DELETE FROM artist_schedule WHERE performance_members_id = OLD.performance_members_id;
+END$$
+
+-- Procedures that maintain the helper tables of the rule triggers
+-- Count one more (p_delta = 1) or one less (p_delta = -1) performance of
+-- an artist and/or group in a year
+CREATE PROCEDURE add_participation(IN p_artist_id INT, IN p_group_id INT, IN p_year INT, IN p_delta INT)
+BEGIN
+  IF p_year IS NOT NULL AND p_artist_id IS NOT NULL THEN
+    INSERT INTO artist_participation (artist_id, year, performances)
+    VALUES (p_artist_id, p_year, p_delta)
+    ON DUPLICATE KEY UPDATE performances = performances + p_delta;
+
+    DELETE FROM artist_participation
+     WHERE artist_id = p_artist_id AND year = p_year AND performances <= 0;
+  END IF;
+
+  IF p_year IS NOT NULL AND p_group_id IS NOT NULL THEN
+    INSERT INTO group_participation (group_id, year, performances)
+    VALUES (p_group_id, p_year, p_delta)
+    ON DUPLICATE KEY UPDATE performances = performances + p_delta;
+
+    DELETE FROM group_participation
+     WHERE group_id = p_group_id AND year = p_year AND performances <= 0;
+  END IF;
+END $$
+
+-- Move the members of a performance (or of every performance of an event,
+-- when p_performance_id is NULL) from one year to another
+CREATE PROCEDURE move_participation(IN p_event_id INT, IN p_performance_id INT, IN p_old_year INT, IN p_new_year INT)
+BEGIN
+  DECLARE done INT DEFAULT FALSE;
+  DECLARE v_artist_id INT;
+  DECLARE v_group_id INT;
+  DECLARE members CURSOR FOR
+    SELECT pm.artist_id, pm.group_id
+      FROM performance_members pm
+      JOIN performance p ON pm.performance_id = p.performance_id
+     WHERE p.performance_id = p_performance_id
+        OR (p_performance_id IS NULL AND p.event_id = p_event_id);
+  DECLARE CONTINUE HANDLER FOR NOT FOUND SET done = TRUE;
+
+  OPEN members;
+  move_loop: LOOP
+    FETCH members INTO v_artist_id, v_group_id;
+    IF done THEN
+      LEAVE move_loop;
+    END IF;
+    CALL add_participation(v_artist_id, v_group_id, p_old_year, -1);
+    CALL add_participation(v_artist_id, v_group_id, p_new_year, 1);
+  END LOOP;
+  CLOSE members;
+END $$
+
+-- Refill the helper tables from performance, performance_members and event,
+-- after a load that created the triggers after the data
+CREATE PROCEDURE rebuild_rule_helpers()
+BEGIN
+  DELETE FROM artist_participation;
+  DELETE FROM group_participation;
+  DELETE FROM stage_schedule;
+  DELETE FROM artist_schedule;
+
+  INSERT INTO artist_participation (artist_id, year, performances)
+  SELECT pm.artist_id, YEAR(e.event_date), COUNT(*)
+    FROM performance_members pm
+    JOIN performance p ON pm.performance_id = p.performance_id
+    JOIN event e       ON p.event_id        = e.event_id
+   WHERE pm.artist_id IS NOT NULL AND e.event_date IS NOT NULL
+   GROUP BY pm.artist_id, YEAR(e.event_date);
+
+  INSERT INTO group_participation (group_id, year, performances)
+  SELECT pm.group_id, YEAR(e.event_date), COUNT(*)
+    FROM performance_members pm
+    JOIN performance p ON pm.performance_id = p.performance_id
+    JOIN event e       ON p.event_id        = e.event_id
+   WHERE pm.group_id IS NOT NULL AND e.event_date IS NOT NULL
+   GROUP BY pm.group_id, YEAR(e.event_date);
+
+  INSERT INTO stage_schedule (performance_id, event_id, stage_id, event_date, start_time, end_time)
+  SELECT p.performance_id, e.event_id, e.stage_id, e.event_date,
+         p.start_time, ADDTIME(p.start_time, p.duration)
+    FROM performance p
+    JOIN event e ON p.event_id = e.event_id;
+
+  INSERT INTO artist_schedule (performance_members_id, artist_id, performance_id, start_time, end_time)
+  SELECT pm.performance_members_id, pm.artist_id, pm.performance_id,
+         p.start_time, ADDTIME(p.start_time, p.duration)
+    FROM performance_members pm
+    JOIN performance p ON pm.performance_id = p.performance_id
+   WHERE pm.artist_id IS NOT NULL;
+END $$
+
 -- Procedures and event to implement the resale queue
 CREATE PROCEDURE check_resale_ticket()
 BEGIN
@@ -0,0 +1,12 @@
+-- Q01 on sql/install_partitioned.sql: ticket carries its event's year, so the
+-- revenue per year needs neither Event nor Festival
+SELECT 
+    t.event_year AS year,
+    t.payment_method,
+    SUM(t.price) AS total_revenue
+FROM 
+    Ticket t
+GROUP BY 
+    t.event_year, t.payment_method
+ORDER BY 
+    t.event_year, t.payment_method;
@@ -0,0 +1,35 @@
+-- Q02 on sql/install_partitioned.sql: the year is also given on the
+-- partitioning columns, so only the 2023 partitions of Event and Performance are read
+SELECT 
+    a.artist_id,
+    a.name,
+    a.stage_name,
+    g.name AS genre_name,
+    CASE 
+        WHEN pm.artist_id IS NOT NULL THEN 'Ναι'
+        ELSE 'Όχι'
+    END AS συμμετοχή_φέτος
+FROM 
+    Artist a
+JOIN 
+    Artist_Genres ag ON a.artist_id = ag.artist_id
+JOIN 
+    Genre g ON ag.genre_id = g.genre_id
+LEFT JOIN (
+    SELECT 
+        DISTINCT artist_id
+    FROM 
+        Performance_members pm
+    JOIN 
+		performance p ON p.performance_id = pm.performance_id    
+    JOIN 
+        Event e ON p.event_id = e.event_id
+    JOIN 
+        Festival f ON e.festival_id = f.festival_id
+    WHERE 
+        f.year = 2023
+        AND e.event_date BETWEEN '2023-01-01' AND '2023-12-31'
+        AND p.event_year = 2023
+) pm ON a.artist_id = pm.artist_id
+WHERE 
+    g.name = 'Rock';
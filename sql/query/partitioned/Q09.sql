@@ -0,0 +1,27 @@
+-- Q09 on sql/install_partitioned.sql: the year is also given on the
+-- partitioning columns of Ticket and Performance, so all three tables read
+-- only their 2024 partition
+SELECT 
+    v.visitor_id,
+    v.first_name,
+    v.last_name,
+    COUNT(DISTINCT p.performance_id) AS παραστάσεις
+FROM 
+    Visitor v
+JOIN 
+    Ticket t 
+  ON v.visitor_id = t.visitor_id
+JOIN 
+    Performance p 
+  ON t.event_id = p.event_id
+JOIN 
+    Event e 
+  ON p.event_id = e.event_id
+WHERE 
+    e.event_date BETWEEN '2024-01-01' AND '2024-12-31'
+    AND t.event_year = 2024
+    AND p.event_year = 2024
+GROUP BY 
+    v.visitor_id, v.first_name, v.last_name
+HAVING 
+    COUNT(DISTINCT p.performance_id) > 3;
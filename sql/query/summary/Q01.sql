@@ -0,0 +1,11 @@
+-- Q01 on revenue_summary (sql/summary.sql): one row per year and payment method
+SELECT 
+    year,
+    payment_method,
+    total_revenue
+FROM 
+    revenue_summary
+WHERE 
+    tickets > 0
+ORDER BY 
+    year, payment_method;
@@ -0,0 +1,14 @@
+-- Q04 on artist_rating_summary (sql/summary.sql): the averages are sums / count
+SELECT 
+    a.artist_id,
+    a.name AS artist_name,
+    a.stage_name,
+    ROUND(1.0 * s.interpretation_sum / s.reviews, 2) AS μέσος_όρος_ερμηνείας,
+    ROUND(1.0 * s.overall_impression_sum / s.reviews, 2) AS μέσος_όρος_συνολικής_εντύπωσης
+FROM 
+    Artist a
+JOIN 
+    artist_rating_summary s ON a.artist_id = s.artist_id
+WHERE 
+    a.artist_id = 30  -- Αντικαταστήστε με το επιθυμητό artist_id
+    AND s.reviews > 0;
@@ -0,0 +1,20 @@
+-- Q06 without the aggregation: a visitor reviews a performance once
+-- (UNIQUE (visitor_id, performance_id)), so every group of the original
+-- query is a single review and its averages are that review's scores
+-- (AVG of one INT is that value as a DECIMAL with 4 places, rounded as before)
+SELECT
+  v.visitor_id,
+  v.first_name,
+  v.last_name,
+  p.performance_id,
+  e.event_date,
+  ROUND(CAST(r.interpretation AS DECIMAL(10,4)), 2)       AS avg_interpretation,
+  ROUND(CAST(r.overall_impression AS DECIMAL(10,4)), 2)    AS avg_overall
+FROM Visitor v
+JOIN Review r 
+  ON v.visitor_id = r.visitor_id
+JOIN Performance p 
+  ON r.performance_id = p.performance_id
+JOIN Event e 
+  ON p.event_id = e.event_id
+WHERE v.visitor_id = 101;   -- ή όποιο άλλο ID θες
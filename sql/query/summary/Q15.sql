@@ -0,0 +1,16 @@
+-- Q15 on visitor_artist_rating_summary (sql/summary.sql); ties on the
+-- total score are broken by visitor and artist id
+SELECT 
+    v.first_name         AS visitor_first_name,
+    v.last_name          AS visitor_last_name,
+    a.name               AS artist_name,
+    s.total_score
+FROM visitor_artist_rating_summary s
+JOIN Visitor v 
+  ON s.visitor_id = v.visitor_id
+JOIN Artist a 
+  ON s.artist_id = a.artist_id
+WHERE s.reviews > 0
+ORDER BY 
+    s.total_score DESC, s.visitor_id, s.artist_id
+LIMIT 5;
@@ -0,0 +1,251 @@
+use music_festival;
+-- Summary tables for the dashboard queries (sql/query/summary).
+-- Run after install.sql; the triggers keep the tables current on every
+-- ticket, review and performance_members change, and refresh_summaries()
+-- recomputes them from scratch (it is called at the end of this file, so the
+-- data may be loaded before or after).
+-- Moving an event to another festival or changing a festival's year is not
+-- tracked: CALL refresh_summaries() after doing so.
+
+DROP TABLE IF EXISTS revenue_summary;
+DROP TABLE IF EXISTS artist_rating_summary;
+DROP TABLE IF EXISTS visitor_artist_rating_summary;
+
+-- Q01: revenue per festival year and payment method
+CREATE TABLE IF NOT EXISTS revenue_summary (
+    year INT NOT NULL,
+    payment_method VARCHAR(20) NOT NULL,
+    total_revenue DECIMAL(12,2) NOT NULL DEFAULT 0,
+    tickets INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (year, payment_method)
+);
+
+-- Q04: review scores per artist, one count per performance_members row
+-- (as the join of the original query counts them)
+CREATE TABLE IF NOT EXISTS artist_rating_summary (
+    artist_id INT PRIMARY KEY,
+    reviews INT NOT NULL DEFAULT 0,
+    interpretation_sum INT NOT NULL DEFAULT 0,
+    lights_sound_sum INT NOT NULL DEFAULT 0,
+    stage_presence_sum INT NOT NULL DEFAULT 0,
+    organization_sum INT NOT NULL DEFAULT 0,
+    overall_impression_sum INT NOT NULL DEFAULT 0
+);
+
+-- Q15: total score a visitor gave an artist
+CREATE TABLE IF NOT EXISTS visitor_artist_rating_summary (
+    visitor_id INT NOT NULL,
+    artist_id INT NOT NULL,
+    reviews INT NOT NULL DEFAULT 0,
+    total_score INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (visitor_id, artist_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_visitor_artist_score ON visitor_artist_rating_summary(total_score);
+
+DELIMITER $$
+
+DROP PROCEDURE IF EXISTS refresh_summaries $$
+CREATE PROCEDURE refresh_summaries()
+BEGIN
+    DELETE FROM revenue_summary;
+    INSERT INTO revenue_summary (year, payment_method, total_revenue, tickets)
+    SELECT f.year, t.payment_method, COALESCE(SUM(t.price), 0), COUNT(*)
+    FROM ticket t
+    JOIN event e ON t.event_id = e.event_id
+    JOIN festival f ON e.festival_id = f.festival_id
+    GROUP BY f.year, t.payment_method;
+
+    DELETE FROM artist_rating_summary;
+    INSERT INTO artist_rating_summary (artist_id, reviews, interpretation_sum, lights_sound_sum,
+                                       stage_presence_sum, organization_sum, overall_impression_sum)
+    SELECT pm.artist_id, COUNT(*), SUM(r.interpretation), SUM(r.lights_sound),
+           SUM(r.stage_presence), SUM(r.organization), SUM(r.overall_impression)
+    FROM review r
+    JOIN performance_members pm ON r.performance_id = pm.performance_id
+    WHERE pm.artist_id IS NOT NULL
+    GROUP BY pm.artist_id;
+
+    DELETE FROM visitor_artist_rating_summary;
+    INSERT INTO visitor_artist_rating_summary (visitor_id, artist_id, reviews, total_score)
+    SELECT r.visitor_id, pm.artist_id, COUNT(*),
+           SUM(r.interpretation + r.lights_sound + r.stage_presence + r.organization + r.overall_impression)
+    FROM review r
+    JOIN performance_members pm ON r.performance_id = pm.performance_id
+    WHERE pm.artist_id IS NOT NULL AND r.visitor_id IS NOT NULL
+    GROUP BY r.visitor_id, pm.artist_id;
+END $$
+
+-- Revenue: add a ticket's price to its year and payment method
+DROP PROCEDURE IF EXISTS add_ticket_revenue $$
+CREATE PROCEDURE add_ticket_revenue(IN p_event_id INT, IN p_payment_method VARCHAR(20),
+                                    IN p_price DECIMAL(8,2), IN p_sign INT)
+BEGIN
+    INSERT INTO revenue_summary (year, payment_method, total_revenue, tickets)
+    SELECT f.year, p_payment_method, p_sign * COALESCE(p_price, 0), p_sign
+    FROM event e
+    JOIN festival f ON e.festival_id = f.festival_id
+    WHERE e.event_id = p_event_id
+    ON DUPLICATE KEY UPDATE
+        total_revenue = total_revenue + VALUES(total_revenue),
+        tickets = tickets + VALUES(tickets);
+END $$
+
+DROP TRIGGER IF EXISTS trg_revenue_summary_insert $$
+CREATE TRIGGER trg_revenue_summary_insert
+AFTER INSERT ON ticket
+FOR EACH ROW
+BEGIN
+    CALL add_ticket_revenue(NEW.event_id, NEW.payment_method, NEW.price, 1);
+END $$
+
+-- Resales only change the visitor: skip them
+DROP TRIGGER IF EXISTS trg_revenue_summary_update $$
+CREATE TRIGGER trg_revenue_summary_update
+AFTER UPDATE ON ticket
+FOR EACH ROW
+BEGIN
+    IF NOT (OLD.event_id <=> NEW.event_id AND OLD.payment_method <=> NEW.payment_method
+            AND OLD.price <=> NEW.price) THEN
+        CALL add_ticket_revenue(OLD.event_id, OLD.payment_method, OLD.price, -1);
+        CALL add_ticket_revenue(NEW.event_id, NEW.payment_method, NEW.price, 1);
+    END IF;
+END $$
+
+DROP TRIGGER IF EXISTS trg_revenue_summary_delete $$
+CREATE TRIGGER trg_revenue_summary_delete
+AFTER DELETE ON ticket
+FOR EACH ROW
+BEGIN
+    CALL add_ticket_revenue(OLD.event_id, OLD.payment_method, OLD.price, -1);
+END $$
+
+-- Ratings: add (p_sign = 1) or remove (-1) one review for every artist of
+-- its performance
+DROP PROCEDURE IF EXISTS add_review_rating $$
+CREATE PROCEDURE add_review_rating(IN p_visitor_id INT, IN p_performance_id INT,
+                                   IN p_interpretation INT, IN p_lights_sound INT, IN p_stage_presence INT,
+                                   IN p_organization INT, IN p_overall_impression INT, IN p_sign INT)
+BEGIN
+    INSERT INTO artist_rating_summary (artist_id, reviews, interpretation_sum, lights_sound_sum,
+                                       stage_presence_sum, organization_sum, overall_impression_sum)
+    SELECT pm.artist_id, p_sign, p_sign * p_interpretation, p_sign * p_lights_sound,
+           p_sign * p_stage_presence, p_sign * p_organization, p_sign * p_overall_impression
+    FROM performance_members pm
+    WHERE pm.performance_id = p_performance_id AND pm.artist_id IS NOT NULL
+    ON DUPLICATE KEY UPDATE
+        reviews = reviews + VALUES(reviews),
+        interpretation_sum = interpretation_sum + VALUES(interpretation_sum),
+        lights_sound_sum = lights_sound_sum + VALUES(lights_sound_sum),
+        stage_presence_sum = stage_presence_sum + VALUES(stage_presence_sum),
+        organization_sum = organization_sum + VALUES(organization_sum),
+        overall_impression_sum = overall_impression_sum + VALUES(overall_impression_sum);
+
+    IF p_visitor_id IS NOT NULL THEN
+        INSERT INTO visitor_artist_rating_summary (visitor_id, artist_id, reviews, total_score)
+        SELECT p_visitor_id, pm.artist_id, p_sign,
+               p_sign * (p_interpretation + p_lights_sound + p_stage_presence + p_organization + p_overall_impression)
+        FROM performance_members pm
+        WHERE pm.performance_id = p_performance_id AND pm.artist_id IS NOT NULL
+        ON DUPLICATE KEY UPDATE
+            reviews = reviews + VALUES(reviews),
+            total_score = total_score + VALUES(total_score);
+    END IF;
+END $$
+
+-- An artist joining (p_sign = 1) or leaving (-1) a performance gains or
+-- loses all of its reviews
+DROP PROCEDURE IF EXISTS add_member_ratings $$
+CREATE PROCEDURE add_member_ratings(IN p_performance_id INT, IN p_artist_id INT, IN p_sign INT)
+BEGIN
+    INSERT INTO artist_rating_summary (artist_id, reviews, interpretation_sum, lights_sound_sum,
+                                       stage_presence_sum, organization_sum, overall_impression_sum)
+    SELECT p_artist_id, p_sign * COUNT(*), p_sign * SUM(r.interpretation), p_sign * SUM(r.lights_sound),
+           p_sign * SUM(r.stage_presence), p_sign * SUM(r.organization), p_sign * SUM(r.overall_impression)
+    FROM review r
+    WHERE r.performance_id = p_performance_id
+    HAVING COUNT(*) > 0
+    ON DUPLICATE KEY UPDATE
+        reviews = reviews + VALUES(reviews),
+        interpretation_sum = interpretation_sum + VALUES(interpretation_sum),
+        lights_sound_sum = lights_sound_sum + VALUES(lights_sound_sum),
+        stage_presence_sum = stage_presence_sum + VALUES(stage_presence_sum),
+        organization_sum = organization_sum + VALUES(organization_sum),
+        overall_impression_sum = overall_impression_sum + VALUES(overall_impression_sum);
+
+    INSERT INTO visitor_artist_rating_summary (visitor_id, artist_id, reviews, total_score)
+    SELECT r.visitor_id, p_artist_id, p_sign * COUNT(*),
+           p_sign * SUM(r.interpretation + r.lights_sound + r.stage_presence + r.organization + r.overall_impression)
+    FROM review r
+    WHERE r.performance_id = p_performance_id AND r.visitor_id IS NOT NULL
+    GROUP BY r.visitor_id
+    ON DUPLICATE KEY UPDATE
+        reviews = reviews + VALUES(reviews),
+        total_score = total_score + VALUES(total_score);
+END $$
+
+DROP TRIGGER IF EXISTS trg_rating_summary_insert $$
+CREATE TRIGGER trg_rating_summary_insert
+AFTER INSERT ON review
+FOR EACH ROW
+BEGIN
+    CALL add_review_rating(NEW.visitor_id, NEW.performance_id, NEW.interpretation, NEW.lights_sound,
+                           NEW.stage_presence, NEW.organization, NEW.overall_impression, 1);
+END $$
+
+DROP TRIGGER IF EXISTS trg_rating_summary_update $$
+CREATE TRIGGER trg_rating_summary_update
+AFTER UPDATE ON review
+FOR EACH ROW
+BEGIN
+    CALL add_review_rating(OLD.visitor_id, OLD.performance_id, OLD.interpretation, OLD.lights_sound,
+                           OLD.stage_presence, OLD.organization, OLD.overall_impression, -1);
+    CALL add_review_rating(NEW.visitor_id, NEW.performance_id, NEW.interpretation, NEW.lights_sound,
+                           NEW.stage_presence, NEW.organization, NEW.overall_impression, 1);
+END $$
+
+DROP TRIGGER IF EXISTS trg_rating_summary_delete $$
+CREATE TRIGGER trg_rating_summary_delete
+AFTER DELETE ON review
+FOR EACH ROW
+BEGIN
+    CALL add_review_rating(OLD.visitor_id, OLD.performance_id, OLD.interpretation, OLD.lights_sound,
+                           OLD.stage_presence, OLD.organization, OLD.overall_impression, -1);
+END $$
+
+DROP TRIGGER IF EXISTS trg_rating_summary_member_insert $$
+CREATE TRIGGER trg_rating_summary_member_insert
+AFTER INSERT ON performance_members
+FOR EACH ROW
+BEGIN
+    IF NEW.artist_id IS NOT NULL THEN
+        CALL add_member_ratings(NEW.performance_id, NEW.artist_id, 1);
+    END IF;
+END $$
+
+DROP TRIGGER IF EXISTS trg_rating_summary_member_delete $$
+CREATE TRIGGER trg_rating_summary_member_delete
+AFTER DELETE ON performance_members
+FOR EACH ROW
+BEGIN
+    IF OLD.artist_id IS NOT NULL THEN
+        CALL add_member_ratings(OLD.performance_id, OLD.artist_id, -1);
+    END IF;
+END $$
+
+DROP TRIGGER IF EXISTS trg_rating_summary_member_update $$
+CREATE TRIGGER trg_rating_summary_member_update
+AFTER UPDATE ON performance_members
+FOR EACH ROW
+BEGIN
+    IF OLD.artist_id IS NOT NULL THEN
+        CALL add_member_ratings(OLD.performance_id, OLD.artist_id, -1);
+    END IF;
+    IF NEW.artist_id IS NOT NULL THEN
+        CALL add_member_ratings(NEW.performance_id, NEW.artist_id, 1);
+    END IF;
+END $$
+
+DELIMITER ;
+
+CALL refresh_summaries();
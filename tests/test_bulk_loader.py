@@ -0,0 +1,106 @@
+import os
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import unittest
+
+CODE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'code')
+sys.path.insert(0, CODE_DIR)
+
+from bulk_loader import BulkLoader, memory_tasks
+from db import RULE_HELPER_TABLES, Database, install_phases, sqlite_statement
+from generate_data import build_dataset, scaled_counts
+
+# Generate a scale 1 dataset, load it into SQLite the way bulk_loader.py does
+# and check the rows and the triggers created after them.
+
+
+class BulkLoaderRoundTrip(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.directory.name, 'music_festival.db')
+        cls.data = dict(build_dataset(scaled_counts(1), seed=42, workers=1).tables())
+
+        phases = install_phases()
+        setup = Database.sqlite(cls.path, install_sql=None)
+        loader = BulkLoader(lambda: Database.sqlite(cls.path, install_sql=None), 'sqlite')
+        try:
+            loader.pre_data(setup, [sqlite_statement(s) for s in phases['pre_data']
+                                    if re.match(r'CREATE\s+TABLE', s, re.I)])
+            loader.load(memory_tasks(cls.data))
+            loader.post_data([sqlite_statement(s) for s in phases['post_data']])
+            loader.constraints(phases['constraints'])
+        finally:
+            loader.close()
+        cls.database = Database.sqlite(cls.path, install_sql=None)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.database.close()
+        cls.directory.cleanup()
+
+    def count(self, table):
+        return self.database.execute(f'SELECT COUNT(*) FROM {table}')[0][0]
+
+    def test_default_run(self):
+        # the offline check passes, so the default run loads the data
+        path = os.path.join(self.directory.name, 'cli.db')
+        result = subprocess.run([sys.executable, os.path.join(CODE_DIR, 'bulk_loader.py'), '--path', path],
+                                capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+        self.assertIn('No violations found', result.stdout)
+
+    def test_row_counts(self):
+        for table, rows in self.data.items():
+            self.assertEqual(self.count(table), len(rows), table)
+
+    def test_rule_helpers_filled(self):
+        for table in RULE_HELPER_TABLES:
+            self.assertGreater(self.count(table), 0, table)
+
+    def test_review_trigger(self):
+        # a review by the holder of a ticket that was never activated
+        ticket = self.database.execute(
+            'SELECT t.visitor_id, p.performance_id FROM ticket t '
+            'JOIN performance p ON p.event_id = t.event_id '
+            'WHERE t.activated = 0 LIMIT 1')
+        self.assertTrue(ticket)
+        visitor_id, performance_id = ticket[0]
+        with self.assertRaisesRegex(sqlite3.IntegrityError, 'not activated'):
+            self.database.execute(
+                'INSERT INTO review (review_id, visitor_id, performance_id, interpretation, '
+                'lights_sound, stage_presence, organization, overall_impression) '
+                'VALUES (?, ?, ?, 5, 5, 5, 5, 5)',
+                (self.count('review') + 1, visitor_id, performance_id))
+        self.database.connection.rollback()
+
+    def test_vip_trigger(self):
+        # VIP tickets up to 10% of the stage capacity, then one more
+        event_id, capacity, vip = self.database.execute(
+            "SELECT e.event_id, s.capacity, "
+            "(SELECT COUNT(*) FROM ticket t WHERE t.event_id = e.event_id AND t.ticket_category = 'VIP') "
+            "FROM event e JOIN stage s ON e.stage_id = s.stage_id ORDER BY s.capacity LIMIT 1")[0]
+        # one ticket per visitor and event
+        visitors = [row[0] for row in self.database.execute(
+            'SELECT visitor_id FROM visitor WHERE visitor_id NOT IN '
+            '(SELECT visitor_id FROM ticket WHERE event_id = ?) ORDER BY visitor_id', (event_id,))]
+        allowed = int(capacity * 0.10) - vip
+        self.assertGreater(len(visitors), allowed)
+        ticket_id = self.database.execute('SELECT MAX(ticket_id) FROM ticket')[0][0]
+        insert = ("INSERT INTO ticket (ticket_id, event_id, visitor_id, ticket_category, price, "
+                  "purchase_date, payment_method, ean_code, activated) "
+                  "VALUES (?, ?, ?, 'VIP', 100, '2024-01-01', 'credit_card', ?, 0)")
+        for visitor_id in visitors[:allowed]:
+            ticket_id += 1
+            self.database.execute(insert, (ticket_id, event_id, visitor_id, f'{ticket_id:013d}'))
+        with self.assertRaisesRegex(sqlite3.IntegrityError, 'VIP'):
+            self.database.execute(insert, (ticket_id + 1, event_id, visitors[allowed], f'{ticket_id + 1:013d}'))
+        self.database.connection.rollback()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import os
+import sys
+import tempfile
+import unittest
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'code'))
+
+from dataset_cache import DatasetCache, cache_key, parse_size
+
+# Keys change with everything that decides an output and with nothing else;
+# stored outputs come back byte for byte, damaged ones are caught.
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def read_tree(path):
+    files = {}
+    for root, _, names in os.walk(path):
+        for name in names:
+            with open(os.path.join(root, name), encoding='utf-8') as f:
+                files[os.path.relpath(os.path.join(root, name), path)] = f.read()
+    return files
+
+
+class CacheKeys(unittest.TestCase):
+
+    def test_parse_size(self):
+        self.assertEqual(parse_size('500M'), 500 * 2 ** 20)
+        self.assertEqual(parse_size('2gb'), 2 * 2 ** 30)
+        self.assertEqual(parse_size('1.5K'), 1536)
+        self.assertEqual(parse_size(1048576), 1048576)
+
+    def test_key(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            previous = os.path.join(tmp, 'load_data')
+            write(os.path.join(previous, 'ticket.tsv'), '1\t2\n')
+
+            def key(**changes):
+                params = dict(seed=42, counts={'visitors': 10}, fmt='tsv', previous=[previous],
+                              today=date(2025, 1, 1))
+                return cache_key(**dict(params, **changes))[0]
+
+            self.assertEqual(key(), key())
+            for changes in [{'seed': 1}, {'counts': {'visitors': 11}}, {'fmt': 'csv'}, {'today': date(2025, 1, 2)},
+                            {'skew': 'zipf'}, {'partitioned': True}, {'previous': None}]:
+                with self.subTest(changes=changes):
+                    self.assertNotEqual(key(**changes), key())
+            # an earlier output counts by its contents, not its path
+            before = key()
+            moved = os.path.join(tmp, 'moved')
+            os.rename(previous, moved)
+            self.assertEqual(key(previous=[moved]), before)
+            write(os.path.join(moved, 'ticket.tsv'), '1\t3\n')
+            self.assertNotEqual(key(previous=[moved]), before)
+
+
+class StoredOutputs(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = DatasetCache(os.path.join(self.tmp.name, 'cache'))
+        self.source = os.path.join(self.tmp.name, 'load_data')
+        write(os.path.join(self.source, 'visitor.tsv'), 'a\tb\n' * 100)
+        write(os.path.join(self.source, 'year', 'ticket.tsv'), '1\t2\n')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        self.cache.put('k', self.source)
+        destination = os.path.join(self.tmp.name, 'copy')
+        self.assertTrue(self.cache.get('k', destination))
+        self.assertEqual(read_tree(destination), read_tree(self.source))
+        self.assertFalse(self.cache.get('other', destination))
+
+        single = os.path.join(self.source, 'visitor.tsv')
+        self.cache.put('file', single)
+        self.assertTrue(self.cache.get('file', os.path.join(self.tmp.name, 'visitor.tsv')))
+        self.assertEqual(read_tree(self.tmp.name)['visitor.tsv'], 'a\tb\n' * 100)
+
+    def test_damaged_entries(self):
+        self.cache.put('k', self.source)
+        stored = os.path.join(self.cache.directory, 'k', 'data')
+        write(os.path.join(stored, 'year', 'ticket.tsv'), '1\t3\n')
+        self.assertEqual(self.cache.verify(), {'k': ['year/ticket.tsv: checksum mismatch']})
+        # a truncated file is caught by get() itself and drops the entry
+        write(os.path.join(stored, 'visitor.tsv'), 'a\tb\n')
+        self.assertFalse(self.cache.get('k', os.path.join(self.tmp.name, 'copy')))
+        self.assertEqual(self.cache.entries(), [])
+
+    def test_evicts_least_recently_used(self):
+        for n, key in enumerate(['a', 'b', 'c']):
+            self.cache.put(key, self.source)
+            manifest = self.cache._manifest(key)
+            manifest['last_used'] = n
+            self.cache._write_manifest(self.cache._entry(key), manifest)
+        size = self.cache.entries()[0]['bytes']
+        self.cache.get('a', os.path.join(self.tmp.name, 'copy'))
+        self.assertEqual(self.cache.evict(2 * size), ['b'])
+        self.assertEqual(sorted(m['key'] for m in self.cache.entries()), ['a', 'c'])
+        # the entry being stored is kept even when it alone is over the limit
+        self.cache.max_bytes = size - 1
+        self.cache.put('d', self.source)
+        self.assertEqual([m['key'] for m in self.cache.entries()], ['d'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import math
+import os
+import sys
+import unittest
+from collections import Counter
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'code'))
+
+from generate_data import DataGenerator, build_dataset, build_next_year, scaled_counts
+from validate_data import Validator
+
+# Generated data must pass every trigger rule that validate_data.py checks,
+# at any scale and seed, and for the years added on top with --previous.
+
+
+class GeneratedDataFollowsTheRules(unittest.TestCase):
+
+    def assertValid(self, data):
+        violations = Validator(data).check_all()
+        self.assertEqual({rule: messages[:3] for rule, messages in violations.items()}, {})
+
+    def test_scales(self):
+        for scale, seed in [(0.5, 1), (1, 42), (5, 7), (10, 42)]:
+            with self.subTest(scale=scale, seed=seed):
+                generator = build_dataset(scaled_counts(scale), seed=seed)
+                self.assertValid(dict(generator.tables()))
+
+    def test_next_years(self):
+        data = dict(build_dataset(scaled_counts(2), seed=42).tables())
+        for _ in range(3):
+            data = dict(build_next_year(data, scaled_counts(2), seed=42).tables())
+            with self.subTest(year=max(f['year'] for f in data['Festival'])):
+                self.assertValid(data)
+
+    def test_staff_rows_pass_the_trigger_in_load_order(self):
+        # replay trg_staff_assignment_before_insert over the rows in the order
+        # they are written; few staff, so that some have to be hired
+        counts = dict(scaled_counts(5), staff=5)
+        generator = build_dataset(counts, seed=42)
+        self.assertGreater(len(generator.staff), 5)
+        sold, assigned = Counter(), Counter()
+        for table, rows in generator.tables():
+            if table == 'Ticket':
+                sold.update(event_id for event_id, in rows.rows(['event_id']))
+            elif table == 'Staff_Assignment':
+                for event_id, role in rows.rows(['event_id', 'staff_role']):
+                    ratio = {'security': 0.05, 'support': 0.02}.get(role)
+                    assigned[(event_id, role)] += 1
+                    if ratio:
+                        self.assertGreaterEqual(assigned[(event_id, role)], math.ceil(sold[event_id] * ratio))
+        self.assertValid(dict(generator.tables()))
+
+    def test_same_output_for_any_number_of_workers(self):
+        tables = [dict((table, list(rows)) for table, rows in
+                       build_dataset(scaled_counts(1), seed=7, workers=workers).tables())
+                  for workers in (1, 3)]
+        self.assertEqual(tables[0], tables[1])
+
+    def test_festival_years_follow_today(self):
+        # the years come from the generator's reference date, not the clock
+        generator = DataGenerator()
+        generator.today = date(2031, 3, 1)
+        generator.generate_locations(10)
+        generator.generate_festivals(10)
+        years = sorted(f['year'] for f in generator.festivals)
+        self.assertEqual(years, list(range(2023, 2031)) + [2032, 2033])
+
+
+if __name__ == '__main__':
+    unittest.main()
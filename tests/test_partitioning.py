@@ -0,0 +1,33 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'code'))
+
+from db import RULE_HELPER_TABLES
+from partitioning import drop_year_statements
+
+# Dropping a year's partitions runs no triggers: the statements have to
+# delete the year from the tables the triggers would have kept current.
+
+
+class DropYear(unittest.TestCase):
+
+    def test_helper_tables_before_the_drop(self):
+        statements = drop_year_statements(2018)
+        first_drop = next(i for i, s in enumerate(statements) if 'DROP PARTITION' in s)
+        for table in RULE_HELPER_TABLES:
+            with self.subTest(table=table):
+                deletes = [i for i, s in enumerate(statements)
+                           if s.startswith('DELETE') and f' {table} ' in s]
+                self.assertTrue(deletes)
+                self.assertLess(max(deletes), first_drop)
+
+    def test_summaries(self):
+        self.assertFalse([s for s in drop_year_statements(2018) if 'revenue_summary' in s])
+        self.assertIn('DELETE FROM revenue_summary WHERE year = 2018;',
+                      drop_year_statements(2018, archive=True, summaries=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'code'))
+
+from benchmark_queries import QUERY_DIR, load_queries
+from db import Database
+from generate_data import build_dataset, scaled_counts
+from summary_tables import add_summaries, apply_changes, check_summaries
+
+# The summary tables of sql/summary.sql must match a full recomputation after
+# any ticket, review or performance_members change, and the rewritten
+# queries of sql/query/summary must return what the originals do.
+
+
+class SummaryTables(unittest.TestCase):
+
+    def setUp(self):
+        self.database = Database.sqlite()
+        self.database.load_tables(build_dataset(scaled_counts(1), seed=42).tables())
+        add_summaries(self.database)
+
+    def tearDown(self):
+        self.database.close()
+
+    def test_member_update(self):
+        # move a reviewed performance's member to another artist
+        member_id, artist_id = self.database.execute(
+            'SELECT pm.performance_members_id, pm.artist_id FROM performance_members pm '
+            'WHERE pm.performance_id IN (SELECT performance_id FROM review) LIMIT 1')[0]
+        other = self.database.execute('SELECT MAX(artist_id) FROM artist WHERE artist_id <> ?', (artist_id,))[0][0]
+        self.database.execute('UPDATE performance_members SET artist_id = ? WHERE performance_members_id = ?',
+                              (other, member_id))
+        self.database.connection.commit()
+        self.assertEqual(check_summaries(self.database), {})
+
+    def test_random_changes(self):
+        applied = apply_changes(self.database, 2000)
+        self.assertGreater(applied['member_update'], 0)
+        self.assertEqual(check_summaries(self.database), {})
+
+    def test_queries_match_the_originals(self):
+        originals = load_queries()
+        for name, sql in load_queries(os.path.join(QUERY_DIR, 'summary')).items():
+            with self.subTest(query=name):
+                # repr: 4 and 4.0 print differently
+                want = sorted(tuple(map(repr, row)) for row in self.database.execute(originals[name]))
+                got = sorted(tuple(map(repr, row)) for row in self.database.execute(sql))
+                self.assertEqual(got, want)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import random
+import sys
+import unittest
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'code'))
+
+from ticket_allocator import TicketAllocator
+
+# The allocator never oversells an event, never sells a visitor two tickets
+# for the same event and keeps the VIP quota of trg_ticket_vip_insert, with
+# and without skewed weights.
+
+
+class Allocation(unittest.TestCase):
+
+    def allocators(self, events, capacities, visitor_ids, tickets=()):
+        yield 'uniform', TicketAllocator(events, capacities, visitor_ids, tickets, rng=random.Random(1))
+        yield 'weighted', TicketAllocator(
+            events, capacities, visitor_ids, tickets, rng=random.Random(1),
+            event_weights={eid: eid for eid in events},
+            visitor_weights={vid: 1 + vid % 5 for vid in visitor_ids})
+
+    def test_capacity_and_uniqueness(self):
+        capacities = {1: 5, 2: 30, 3: 100}
+        tickets = [(1, 1, 'general'), (2, 1, 'general'), (3, 2, 'VIP')]
+        for name, allocator in self.allocators(list(capacities), capacities, list(range(1, 61)), tickets):
+            with self.subTest(allocator=name):
+                sales, interest = allocator.allocate(1000)
+                pairs = sales + [(eid, vid) for vid, eid, _ in tickets]
+                self.assertEqual(len(pairs), len(set(pairs)))
+                sold = Counter(eid for eid, _ in pairs)
+                # 5 and 30 seats sell out, 60 visitors fill 60 of the 100
+                self.assertEqual(sold, {1: 5, 2: 30, 3: 60})
+                self.assertLessEqual({eid for eid, _ in interest}, {1, 2, 3})
+
+    def test_count(self):
+        capacities = {1: 50, 2: 50}
+        for name, allocator in self.allocators([1, 2], capacities, list(range(1, 101))):
+            with self.subTest(allocator=name):
+                sales, _ = allocator.allocate(70)
+                self.assertEqual(len(sales), 70)
+                self.assertEqual(len(allocator.allocate(70)[0]), 30)
+
+    def test_interest_only_on_sold_out_events(self):
+        capacities = {1: 2, 2: 200}
+        allocator = TicketAllocator([1, 2], capacities, list(range(1, 301)), rng=random.Random(3))
+        sales, interest = allocator.allocate(150)
+        self.assertEqual(len(sales), 150)
+        self.assertTrue(interest)
+        self.assertEqual({eid for eid, _ in interest}, {1})
+        buyers = {vid for eid, vid in sales if eid == 1}
+        self.assertFalse(buyers & {vid for _, vid in interest})
+
+    def test_vip_quota(self):
+        # FLOOR(capacity * 0.10), less the VIP tickets already sold
+        capacities = {1: 25, 2: 9, 3: 40}
+        tickets = [(1, 3, 'VIP'), (2, 3, 'VIP'), (3, 3, 'VIP'), (4, 3, 'VIP'), (5, 3, 'VIP')]
+        allocator = TicketAllocator([1, 2, 3], capacities, list(range(1, 11)), tickets, rng=random.Random(1))
+        self.assertEqual([allocator.vip_quota(eid) for eid in (1, 2, 3)], [2, 0, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import sys
+import unittest
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'code'))
+
+from validate_data import Validator
+
+# Every check of validate_data.py against a small hand-made dataset: clean as
+# given, and with one rule broken at a time.
+
+
+def performance(pid, event_id, start, duration, stage_id=1):
+    return {'performance_id': pid, 'event_id': event_id, 'start_time': start, 'stage_id': stage_id,
+            'duration': duration, 'type': 'warm up'}
+
+
+def ticket(ticket_id, event_id, visitor_id, category='general', activated=True):
+    return {'ticket_id': ticket_id, 'event_id': event_id, 'visitor_id': visitor_id,
+            'ticket_category': category, 'price': 50.0, 'purchase_date': '2024-01-01',
+            'payment_method': 'credit_card', 'ean_code': f'{ticket_id:013d}', 'activated': activated}
+
+
+def dataset():
+    # two stages, an event on each on the same day, two performances with
+    # a 15 minute break on stage 1 and one on stage 2; 1 VIP ticket allowed
+    return {
+        'Stage': [{'stage_id': 1, 'capacity': 10}, {'stage_id': 2, 'capacity': 10}],
+        'Event': [{'event_id': 1, 'stage_id': 1, 'event_date': date(2024, 7, 1)},
+                  {'event_id': 2, 'stage_id': 2, 'event_date': date(2024, 7, 1)}],
+        'Performance': [performance(1, 1, '2024-07-01 18:00:00', '1:00:00'),
+                        performance(2, 1, '2024-07-01 19:15:00', '1:00:00'),
+                        performance(3, 2, '2024-07-01 18:00:00', '2:00:00', stage_id=2)],
+        'performance_members': [{'performance_id': 1, 'artist_id': 1, 'group_id': None},
+                                {'performance_id': 2, 'artist_id': 2, 'group_id': None},
+                                {'performance_id': 3, 'artist_id': 3, 'group_id': None}],
+        'Ticket': [ticket(1, 1, 1, 'VIP'), ticket(2, 1, 2, activated=False)],
+        'Review': [{'review_id': 1, 'visitor_id': 1, 'performance_id': 1}],
+        'Staff_Assignment': [{'event_id': 1, 'staff_role': 'security'},
+                             {'event_id': 1, 'staff_role': 'support'}],
+    }
+
+
+class ValidatorChecks(unittest.TestCase):
+
+    def violations(self, data):
+        return {rule: len(messages) for rule, messages in Validator(data).check_all().items()}
+
+    def test_clean(self):
+        self.assertEqual(self.violations(dataset()), {})
+
+    def test_performance_overlap(self):
+        data = dataset()
+        data['Performance'][1]['start_time'] = '2024-07-01 18:30:00'
+        self.assertEqual(self.violations(data), {'performance_overlap': 1, 'performance_break': 1})
+
+    def test_overlap_past_midnight(self):
+        # compared as full datetimes, not as times of day
+        data = dataset()
+        data['Performance'][0]['start_time'] = '2024-07-01 23:30:00'
+        data['Performance'][1]['start_time'] = '2024-07-02 00:10:00'
+        self.assertEqual(self.violations(data), {'performance_overlap': 1, 'performance_break': 1})
+
+    def test_performance_breaks(self):
+        for start, minutes in [('19:03:00', 3), ('19:45:00', 45)]:
+            with self.subTest(minutes=minutes):
+                data = dataset()
+                data['Performance'][1]['start_time'] = f'2024-07-01 {start}'
+                self.assertEqual(self.violations(data), {'performance_break': 1})
+
+    def test_artist_overlap(self):
+        # the artist of stage 1 also plays on stage 2 at the same time
+        data = dataset()
+        data['performance_members'][2]['artist_id'] = 1
+        self.assertEqual(self.violations(data), {'artist_overlap': 1})
+
+    def test_four_years_in_row(self):
+        data = dataset()
+        for year in (2021, 2022, 2023):
+            event_id = len(data['Event']) + 1
+            data['Event'].append({'event_id': event_id, 'stage_id': 1, 'event_date': date(year, 7, 1)})
+            data['Performance'].append(performance(event_id + 10, event_id, f'{year}-07-01 18:00:00', '1:00:00'))
+            data['performance_members'].append({'performance_id': event_id + 10, 'artist_id': 1, 'group_id': 5})
+        self.assertEqual(self.violations(data), {'four_years_in_row': 1})
+
+    def test_vip_cap(self):
+        data = dataset()
+        data['Ticket'].append(ticket(3, 1, 3, 'VIP'))
+        self.assertEqual(self.violations(data), {'vip_cap': 1})
+
+    def test_review_ticket(self):
+        data = dataset()
+        # visitor 3 has no ticket, which the trigger lets through
+        data['Review'].append({'review_id': 2, 'visitor_id': 3, 'performance_id': 1})
+        self.assertEqual(self.violations(data), {})
+        data['Review'].append({'review_id': 3, 'visitor_id': 2, 'performance_id': 2})
+        self.assertEqual(self.violations(data), {'review_ticket': 1})
+
+    def test_staff_ratios(self):
+        # 21 tickets need 2 security staff (5%) and 1 support (2%)
+        data = dataset()
+        data['Ticket'] += [ticket(i, 1, i) for i in range(3, 22)]
+        self.assertEqual(self.violations(data), {'staff_ratio': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()